@@ -0,0 +1,55 @@
+"""執行緒 → asyncio 的通知橋。
+
+StatusHub、MJPEG 編碼器、觸控中斷都在自己的執行緒上產生新資料；async 版服務層（asgi.py）
+的訂閱者是 coroutine，不能在 threading.Condition 上等。每個訂閱者在這裡登記一個
+asyncio.Event，producer 呼叫 notify_all() 時，每個 event loop 只排一次 callback
+把該 loop 上的 event 全部 set（幾千個觀看者也只寫一次 self-pipe）。
+"""
+import asyncio
+import threading
+
+
+class AsyncNotifier:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}  # loop → set(asyncio.Event)
+
+    def add(self) -> asyncio.Event:
+        """在目前的 event loop 登記一個 event（要在 coroutine 裡呼叫），用完要 discard()。"""
+        loop = asyncio.get_running_loop()
+        ev = asyncio.Event()
+        with self._lock:
+            self._waiters.setdefault(loop, set()).add(ev)
+        return ev
+
+    def discard(self, ev: asyncio.Event):
+        with self._lock:
+            for loop, evs in list(self._waiters.items()):
+                evs.discard(ev)
+                if not evs:
+                    del self._waiters[loop]
+
+    def notify_all(self):
+        """任何執行緒都可以呼叫。"""
+        with self._lock:
+            targets = [(loop, tuple(evs)) for loop, evs in self._waiters.items()]
+        for loop, evs in targets:
+            try:
+                loop.call_soon_threadsafe(_set_all, evs)
+            except RuntimeError:
+                # loop 已經關了
+                pass
+
+
+def _set_all(evs):
+    for ev in evs:
+        ev.set()
+
+
+async def wait_event(ev: asyncio.Event, timeout: float) -> bool:
+    """等 ev 被 set，逾時回傳 False。"""
+    try:
+        await asyncio.wait_for(ev.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
@@ -1,22 +1,67 @@
+import fcntl
 import os
+import signal
+import sys
+import tempfile
+import threading
 import time
 import uuid
-import subprocess
-from datetime import datetime, date
-
-from dotenv import load_dotenv
-from flask import Flask, jsonify, request, send_from_directory
-from flask_cors import CORS
-import threading
+from urllib.parse import urlencode
+
+from startup import Startup
+
+# 啟動計時：每個元件 import / 初始化花多久，/ready 看得到
+startup = Startup()
+
+with startup.step("import flask"):
+    from dotenv import load_dotenv
+    from flask import Flask, Response, g, jsonify, request, send_file
+    from flask_cors import CORS
+
+# 模擬模式：假 GPIO / I2C / DHT22 / 相機要在 import sensors、pump、camera 之前裝好
+SIMULATE = os.getenv("SIMULATE", "0") == "1"
+if SIMULATE:
+    with startup.step("simulator"):
+        import simulator
+        simulator.install()
+
+with startup.step("import sensors"):
+    import sampler
+    from sampler import start_sampler, stop_sampler, get_snapshot, add_listener
+    from sensors import dht_reader, bh1750_reader, touch_detector, read_sensors, close_reads
+
+with startup.step("import camera"):
+    # 很重的東西（picamera2、simplejpeg / numpy、cv2、PIL）都延到第一次用或背景暖機才載入
+    from camera import (
+        QUALITY_TIERS,
+        SNAPSHOT_MAX_AGE_MS,
+        camera_service,
+        jpeg_codec,
+        mjpeg_stream,
+        negotiate_stream,
+        snapshots,
+        stream_stats,
+    )
 
-from sensors import read_all_sensors
-from pump import init_pump, pulse_pump, cleanup
+with startup.step("import services"):
+    from push import StatusHub
+    import history
+    from pump import init_pump, pulse_pump, cleanup
+    from pump_jobs import PumpExecutor, new_job_id
+    from ledger import WateringLedger
+    from auto_water import AutoWaterScheduler
+    from photo_store import PhotoStore, parse_photo_path
+    from camera_fallback import CaptureBreaker, PlaceholderCache
+    from game import GameEngine
+    from status_cache import STATUS_MIMETYPES, StatusCache, encode_body, negotiate_format
+    import metrics
 
 load_dotenv()
 
 # ===== 環境設定 =====
-SENSOR_MOCK = os.getenv("MOCK_SENSORS", "1") == "1"
-PUMP_MOCK = os.getenv("PUMP_MOCK", "1") == "1"
+# 模擬模式預設走真的 driver 路徑（讀假硬體），才量得到真實的讀值 / 幫浦開銷
+SENSOR_MOCK = os.getenv("MOCK_SENSORS", "0" if SIMULATE else "1") == "1"
+PUMP_MOCK = os.getenv("PUMP_MOCK", "0" if SIMULATE else "1") == "1"
 
 API_KEY = os.getenv("WATER_API_KEY", "CHANGE_ME")
 PUMP_PIN = int(os.getenv("PUMP_PIN", "17"))
@@ -26,52 +71,351 @@ COOLDOWN = float(os.getenv("COOLDOWN_SEC", "60"))
 
 # ===== Flask =====
 app = Flask(__name__)
-CORS(app)
+# 跨網域的前端也要讀得到 /status 的 ETag 與時間 header
+STATUS_EXPOSE_HEADERS = ["ETag", "X-Status-Now", "X-Status-Sampled-At"]
+CORS(app, expose_headers=STATUS_EXPOSE_HEADERS)
+
+
+@app.before_request
+def _start_timer():
+    g.t0 = time.perf_counter()
+
+
+@app.after_request
+def _observe_latency(resp):
+    # label 用路由樣板（/photos/<path:filename>）不用實際路徑，序列數才不會無限長
+    t0 = g.get("t0")
+    if t0 is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.REQUEST_SECONDS.labels(method=request.method, route=route, status=resp.status_code).observe(
+            time.perf_counter() - t0
+        )
+    return resp
+
+
+# 相機 / 幫浦 / GPIO 只能由一個行程擁有：同時開兩份（或 gunicorn 開多個 worker）時第二份直接失敗
+HW_LOCK_PATH = os.getenv("HW_LOCK", "/tmp/smartplant-hw.lock")
+
+
+def _acquire_hw_lock(path: str):
+    f = open(path, "a+")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.seek(0)
+        owner = f.read().strip() or "?"
+        f.close()
+        raise RuntimeError(f"hardware is owned by another process (pid {owner}), lock={path}")
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    return f
+
+
+with startup.step("hw_lock"):
+    _hw_lock = _acquire_hw_lock(HW_LOCK_PATH)
 
 # 存照片的資料夾（你前端會用 /photos/<filename> 來讀）
-PHOTOS_DIR = os.path.join(os.path.dirname(__file__), "photos")
+PHOTOS_DIR = os.getenv("PHOTOS_DIR", os.path.join(os.path.dirname(__file__), "photos"))
 os.makedirs(PHOTOS_DIR, exist_ok=True)
+# 照片索引、縮圖、容量上限都交給 photo_store
+with startup.step("photo_store"):
+    photo_store = PhotoStore(PHOTOS_DIR)
 
-# ===== Picamera2 單例與鎖 =====
-PICAM = None  # type: Picamera2 | None
-CAP_LOCK = threading.Lock()
+# ===== 相機：全部交給 camera.py 的 camera_service（唯一擁有 Picamera2） =====
 
-daily_sec = 0.0
-last_day = date.today()
-last_water_at: datetime | None = None
+# 澆水額度（cooldown / 每日上限）記在只追加的帳本檔，重開機也不會歸零
+LEDGER_PATH = os.getenv("WATER_LEDGER", os.path.join(os.path.dirname(__file__), "water_ledger.jsonl"))
+with startup.step("ledger"):
+    ledger = WateringLedger(LEDGER_PATH, daily_limit=DAILY_LIMIT, cooldown=COOLDOWN)
 
-ok, msg = init_pump(PUMP_PIN, mock=PUMP_MOCK, active_low=True)
+# 幫浦一定要同步初始化（確保繼電器是 OFF）
+with startup.step("pump"):
+    ok, msg = init_pump(PUMP_PIN, mock=PUMP_MOCK, active_low=True)
 print(f"[DEBUG] init_pump ok={ok} msg={msg} mock={PUMP_MOCK}", flush=True)
 
+# 感測器改由背景執行緒取樣，/status 只讀最新快照（第一輪讀值在背景，/ready 會等它）
+with startup.step("sampler"):
+    start_sampler(mock=SENSOR_MOCK)
+startup.require("sensors", sampler.warmed_up)
+# 歷史資料從快照定期記錄到 SQLite
+with startup.step("history"):
+    history.start_history()
+
+# /status 欄位名稱 → 感測器欄位名稱
+STATUS_FIELDS = {
+    "humidity": "soil_dry",  # true=乾、false=濕（DO 腳方向在 sensors.SOIL_DRY_LEVEL 設定）
+    "temperature": "temp_c",
+    "light": "lux",
+    "env_humi": "humi_pct",
+    "touch": "touch",
+}
+
+
+def _status_payload() -> dict:
+    # now / sampled_at 每次都在變，不放這裡（見 _status_fresh）
+    snap = get_snapshot()
+    stale = set(snap.stale_fields())
+    last_water_at = ledger.last_water_at
+    body = {name: snap.values[field] for name, field in STATUS_FIELDS.items()}
+    body.update(
+        {
+            "daily_sec": round(ledger.today_total(), 1),
+            "last_water_at": last_water_at.strftime("%Y-%m-%d %H:%M:%S") if last_water_at else None,
+            # 哪些欄位過期了（取樣時間在 sampled_at）
+            "stale": [name for name, field in STATUS_FIELDS.items() if field in stale],
+            # 最近一筆澆水工作（queued / running / done / failed）
+            "pump": pump_executor.latest(),
+            # 最新觸控事件編號：變大代表有新的 tap（詳細見 /touch/events）
+            "touch_seq": touch_detector.cursor,
+            # 遊戲狀態版本：變了就用 /game?since=<舊版本> 拿差異
+            "game_version": game.version,
+        }
+    )
+    return body
+
+
+def _status_fresh() -> dict:
+    """每個 /status 回應都重算：每個欄位的取樣時間（epoch 秒）與現在時間，前端用來算 age。"""
+    snap = get_snapshot()
+    return {
+        "sampled_at": {name: snap.sampled_at.get(field) for name, field in STATUS_FIELDS.items()},
+        "now": time.time(),
+    }
+
+
+# 情緒 / 愛心 / 連續天數：每個事件在後端算一次，前端只負責畫（見 game.py）
+with startup.step("game"):
+    game = GameEngine()
+
+
+def _status_key():
+    # 會讓 /status 快取內容改變的東西（now / sampled_at 由 _status_fresh 每次重算，不算在內）
+    snap = get_snapshot()
+    return (
+        snap.version,
+        snap.stale_fields(),
+        ledger.today_total(),
+        ledger.last_water_at,
+        pump_executor.latest(),
+        touch_detector.cursor,
+        game.version,
+    )
+
+
+# /status 有變才重組、序列化一次；ETag / ?since= / MessagePack 都從這份來
+status_cache = StatusCache(_status_payload, _status_key, _status_fresh)
+metrics.counter_func("smartplant_status_builds_total", "/status payloads built and serialised", lambda: status_cache.builds)
+metrics.counter_func("smartplant_status_cache_hits_total", "/status requests served from the cached payload", lambda: status_cache.hits)
+
+
+def status_response(accept: str, since: str | None, if_none_match: str):
+    """/status 的回應（Flask 和 asgi 共用）：回傳 (status code, body, mimetype, headers)。"""
+    fmt = negotiate_format(accept)
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept"}
+    if since is not None:
+        try:
+            delta = status_cache.since(int(since))
+        except ValueError:
+            return 400, encode_body({"ok": False, "error": "bad_version"}, "json"), "application/json", headers
+        return 200, encode_body(delta, fmt), STATUS_MIMETYPES[fmt], headers
+    entry = status_cache.get()
+    fresh = _status_fresh()
+    headers["ETag"] = entry.etag(fmt)
+    # 304 沒有 body：時間放在 header（瀏覽器會更新快取裡的 header），不會停在快取當時
+    headers["X-Status-Now"] = repr(fresh["now"])
+    headers["X-Status-Sampled-At"] = encode_body(fresh["sampled_at"], "json").decode()
+    # If-None-Match 用 weak 比較：W/"v" 或 "v" 都算
+    if headers["ETag"][2:] in if_none_match:
+        return 304, b"", None, headers
+    return 200, entry.encoded(fmt, fresh), STATUS_MIMETYPES[fmt], headers
+
+
+# 幫浦由單一 actuator 執行緒依序執行
+PUMP_PULSE_SECONDS = metrics.histogram(
+    "smartplant_pump_pulse_seconds", "Actual pump pulse duration", ("result",), buckets=metrics.PUMP_BUCKETS
+)
+
+
+def _pulse(sec: float):
+    # 開幫浦前確定預扣紀錄已經 fsync（多筆排隊時只 fsync 一次）
+    ledger.sync()
+    t0 = time.perf_counter()
+    ok, msg = pulse_pump(sec)
+    PUMP_PULSE_SECONDS.labels(result="ok" if ok else "error").observe(time.perf_counter() - t0)
+    return ok, msg
+
+
+pump_executor = PumpExecutor(_pulse)
+pump_executor.start()
+
+# 觸控改用 GPIO 中斷
+if not SENSOR_MOCK:
+    touch_detector.start()
+
+# 遊戲引擎吃感測器 / 觸控 / 澆水事件
+add_listener(game.on_snapshot)
+game.on_snapshot(get_snapshot())  # 第一輪取樣可能已經發佈過了
+touch_detector.add_listener(game.on_touch_event)
+pump_executor.add_listener(game.on_water_job)
+game.start()
 
-def reset_if_new_day():
-    global daily_sec, last_day
-    if date.today() != last_day:
-        daily_sec = 0.0
-        last_day = date.today()
+# /status/stream：感測值有變才推（單一 producer，所有訂閱者共用同一份資料）
+# payload 會讀 ledger / pump_executor / touch_detector / game，全部建好才接上、才啟動
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT_SEC", "15"))
+status_hub = StatusHub(status_cache.current, heartbeat=STREAM_HEARTBEAT)
+add_listener(status_hub.poke)
+pump_executor.add_listener(status_hub.poke)
+touch_detector.add_listener(status_hub.poke)
+game.add_listener(status_hub.poke)
+status_hub.start()
+metrics.gauge_func("smartplant_sse_subscribers", "Open /status/stream connections", lambda: status_hub.subscribers)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus 文字格式：感測器讀值、拍照 / 編碼、幫浦、各路由延遲、幀數。"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/ready")
+def ready():
+    """啟動進度：每個元件花多久、背景暖機做完沒。全部好了 200，否則 503。"""
+    report = startup.report()
+    return jsonify({"ok": report["ready"], **report}), 200 if report["ready"] else 503
 
 
 @app.get("/status")
 def status():
-    reset_if_new_day()
-    data = read_all_sensors(mock=SENSOR_MOCK)
-    return jsonify(
-        {
-            "humidity": data["soil_pct"],
-            "temperature": data["temp_c"],
-            "light": data["lux"],
-            "env_humi": data["humi_pct"],
-            "touch": data["touch"],
-            "daily_sec": round(daily_sec, 1),
-            "last_water_at": last_water_at.strftime("%Y-%m-%d %H:%M:%S") if last_water_at else None,
-        }
+    """目前狀態。帶 If-None-Match 且沒變 → 304；?since=<version> 只回變過的欄位；
+    Accept: application/msgpack 回 MessagePack（有裝 msgpack 的話）。
+    """
+    code, body, mimetype, headers = status_response(
+        request.headers.get("Accept", ""), request.args.get("since"), request.headers.get("If-None-Match", "")
     )
+    return Response(body, status=code, mimetype=mimetype, headers=headers)
+
+
+@app.get("/sensors/read")
+def sensors_read():
+    """不看快照、現在就讀一次（各組同時讀，最多等 deadline_ms），每個欄位附 ok / stale / timeout。"""
+    try:
+        deadline = max(50.0, min(float(request.args.get("deadline_ms", "500")), 5000.0)) / 1000
+    except ValueError:
+        return jsonify({"ok": False, "error": "bad_deadline"}), 400
+    return jsonify({"ok": True, "deadline_ms": int(deadline * 1000), **read_sensors(mock=SENSOR_MOCK, deadline=deadline)})
+
+
+@app.get("/status/stream")
+def status_stream():
+    """Server-Sent Events：event=status，data 跟 /status 一樣的 JSON。"""
+    resp = Response(status_hub.subscribe(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+@app.get("/touch/events")
+def touch_events():
+    """/touch/events?since=<cursor>&wait=<秒>
+    回傳 seq > since 的觸控事件（tap / double_tap / long_press）與新的 cursor；
+    wait>0 時沒有新事件會 long-poll 最多 wait 秒（上限 25 秒）。
+    """
+    try:
+        since = int(request.args.get("since", "0"))
+        wait = max(0.0, min(float(request.args.get("wait", "0")), 25.0))
+    except ValueError:
+        return jsonify({"ok": False, "error": "bad_cursor"}), 400
+    return jsonify({"ok": True, **touch_detector.events_since(since, wait=wait)})
+
+
+@app.get("/game")
+def game_state():
+    """/game?since=<version>&wait=<秒>
+    沒帶 since 回整份狀態；帶了就只回 since 之後變過的欄位（full=False）。
+    wait>0 時沒有變化會 long-poll 最多 wait 秒（上限 25 秒）。
+    """
+    if "since" not in request.args:
+        return jsonify({"ok": True, **game.snapshot()})
+    try:
+        since = int(request.args["since"])
+        wait = max(0.0, min(float(request.args.get("wait", "0")), 25.0))
+    except ValueError:
+        return jsonify({"ok": False, "error": "bad_version"}), 400
+    return jsonify({"ok": True, **game.since(since, wait=wait)})
+
+
+@app.post("/game/insects")
+def game_insects():
+    """招蜂引蝶：三顆愛心都拿到、今天還沒叫過才會成功（409 + 原因）。"""
+    ok, err = game.call_insects()
+    if not ok:
+        return jsonify({"ok": False, "error": err}), 409
+    return jsonify({"ok": True, **game.snapshot()})
+
+
+@app.get("/sensors/health")
+def sensors_health():
+    """感測器 driver 的統計（讀取次數 / 失敗次數 / 延遲），不會觸發硬體讀取。"""
+    return jsonify({"ok": True, "dht22": dht_reader.stats(), "bh1750": bh1750_reader.stats()})
+
+
+@app.get("/history")
+def get_history():
+    """/history?field=temperature&from=<epoch>&to=<epoch>&step=<秒>
+    field 可用 /status 的名稱（humidity / temperature / light / env_humi）。
+    from 預設 24 小時前、to 預設現在、step 不給就自動（最多約 500 個點）。
+    """
+    name = request.args.get("field", "")
+    field = STATUS_FIELDS.get(name, name)
+    if field not in history.HISTORY_FIELDS:
+        return jsonify({"ok": False, "error": "bad_field"}), 400
+    try:
+        end = float(request.args.get("to", time.time()))
+        start = float(request.args.get("from", end - 86400))
+        step = request.args.get("step")
+        step = float(step) if step else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "bad_range"}), 400
+    if start >= end:
+        return jsonify({"ok": False, "error": "bad_range"}), 400
+
+    data = history.query(field, start, end, step)
+    data["field"] = name
+    return jsonify({"ok": True, **data})
+
+
+def _record_result(job: dict):
+    """工作結束寫進帳本；失敗會退回預扣的秒數（cooldown 仍然保留）。"""
+    ledger.finish(job["id"], ok=job["status"] == "done")
+    if job["status"] == "failed":
+        status_hub.poke()
+
+
+def _start_watering(sec: float, source: str = "manual"):
+    """預扣額度並排入幫浦佇列，回傳 (ok, error, job)。手動 /water 和自動排程都走這裡。"""
+    # 檢查 cooldown / 每日上限與預扣額度在帳本的同一把鎖裡完成，併發請求不會同時通過
+    job_id = new_job_id()
+    ok, err = ledger.reserve(sec, job_id, source=source)
+    if not ok:
+        return False, err, None
+    return True, None, pump_executor.submit(sec, on_done=_record_result, job_id=job_id)
+
+
+def _auto_water(sec: float):
+    ok, err, job = _start_watering(sec, source="auto")
+    return ok, err, job["id"] if job else None
+
+
+# 自動澆水：看 sampler 的土壤快照，預設 off（AUTO_WATER_MODE=dry_run / on）
+auto_water = AutoWaterScheduler(_auto_water)
+auto_water.start()
 
 
 @app.post("/water")
 def water():
-    global daily_sec, last_water_at
-
+    """排一個澆水工作並立刻回傳 job id（202）；進度用 /water/<job_id> 或 /status/stream 看。"""
     key = request.values.get("api_key") or request.headers.get("x-api-key")
     if key != API_KEY:
         return jsonify({"ok": False, "error": "unauthorized"}), 401
@@ -82,135 +426,116 @@ def water():
     except Exception:
         sec = 2.0
 
-    reset_if_new_day()
+    ok, err, job = _start_watering(sec)
+    if not ok:
+        return jsonify({"ok": False, "error": err}), 429
+
+    return jsonify(
+        {
+            "ok": True,
+            "message": f"queued {sec}s",
+            "job_id": job["id"],
+            "status": job["status"],
+            "daily_sec": round(ledger.today_total(), 1),
+            "mock": PUMP_MOCK,
+        }
+    ), 202
 
-    if last_water_at and (datetime.now() - last_water_at).total_seconds() < COOLDOWN:
-        return jsonify({"ok": False, "error": "cooldown"}), 429
 
-    if daily_sec + sec > DAILY_LIMIT:
-        return jsonify({"ok": False, "error": "daily_limit"}), 429
+@app.get("/auto_water")
+def auto_water_status():
+    return jsonify({"ok": True, **auto_water.status()})
 
-    ok, msg = pulse_pump(sec)
-    if not ok:
-        return jsonify({"ok": False, "error": msg}), 500
 
-    daily_sec += sec
-    last_water_at = datetime.now()
+@app.post("/auto_water")
+def auto_water_config():
+    """切換自動澆水：mode=off|dry_run|on、policy=gentle|normal|thirsty（需要 api_key）。"""
+    key = request.values.get("api_key") or request.headers.get("x-api-key")
+    if key != API_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    try:
+        auto_water.configure(mode=request.values.get("mode"), policy=request.values.get("policy"))
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify({"ok": True, **auto_water.status()})
 
-    return jsonify(
-        {"ok": True, "message": f"watered {sec}s", "daily_sec": round(daily_sec, 1), "mock": PUMP_MOCK}
-    )
+
+@app.get("/water/history")
+def water_history():
+    """澆水紀錄：?from=&to=（epoch 秒，預設最近 7 天）&limit=，含每日總秒數。"""
+    try:
+        end = float(request.args.get("to", time.time()))
+        start = float(request.args.get("from", end - 7 * 86400))
+        limit = max(1, min(int(request.args.get("limit", "200")), 1000))
+    except ValueError:
+        return jsonify({"ok": False, "error": "bad_range"}), 400
+    if start >= end:
+        return jsonify({"ok": False, "error": "bad_range"}), 400
+    return jsonify({"ok": True, "from": start, "to": end, "daily_limit": DAILY_LIMIT, **ledger.history(start, end, limit)})
+
+
+@app.get("/water/<job_id>")
+def water_job(job_id):
+    job = pump_executor.get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "not_found"}), 404
+    return jsonify({"ok": True, "job": job})
+
+
+# 相機壞掉時：連續失敗就先不碰硬體（斷路器），佔位圖從記憶體給、不寫檔
+capture_breaker = CaptureBreaker()
+placeholders = PlaceholderCache()
+PLACEHOLDER_CACHE_CONTROL = "public, max-age=86400"
 
 
 def _do_capture(path: str):
-    """Capture a JPEG to `path` using Picamera2 singleton with locking."""
-    # Small helper for logging
-    def _log(msg: str):
-        print(f"[CAPTURE] {msg}", flush=True)
-
-    # Try a couple of attempts with short backoff to avoid transient device/DRM hiccups
-    # Keep total wait under ~1.5s to ensure frontend doesn't hang when hardware is unhappy
-    attempts = 2
-    delay_sec = 0.4
-    # Preferred: Picamera2 via singleton
-    try:
-        from picamera2 import Picamera2
-        global PICAM
-        with CAP_LOCK:
-            for i in range(attempts):
-                try:
-                    _log(f"Picamera2 singleton try {i+1}/{attempts}")
-                    if PICAM is None:
-                        _log("Creating Picamera2 singleton")
-                        PICAM = Picamera2()
-                        PICAM.configure(PICAM.create_still_configuration())
-                        PICAM.start()
-                        time.sleep(delay_sec)
-
-                    # capture
-                    PICAM.capture_file(path)
-                    if not os.path.exists(path):
-                        raise RuntimeError("picamera2 did not create file")
-                    _log("Picamera2 capture success")
-                    return
-                except Exception as e:
-                    _log(f"Picamera2 capture error: {e}")
-                    # hard reset: stop and close, then recreate cleanly
-                    try:
-                        _log("Resetting camera: stop/close and re-init")
-                        if PICAM:
-                            try:
-                                PICAM.stop()
-                            except Exception:
-                                pass
-                            try:
-                                # Picamera2.close() releases resources fully
-                                PICAM.close()
-                            except Exception:
-                                pass
-                        PICAM = None
-                        # small backoff before re-init
-                        time.sleep(delay_sec)
-                        PICAM = Picamera2()
-                        PICAM.configure(PICAM.create_still_configuration())
-                        PICAM.start()
-                        time.sleep(delay_sec)
-                    except Exception as e2:
-                        _log(f"Reset failed: {e2}")
-                    time.sleep(delay_sec)
-        # If Picamera2 is present but failed at runtime, fall back below
-        print("[WARN] Picamera2 present but capture failed; fallback to libcamera-still", flush=True)
-    except ImportError:
-        # Picamera2 not importable; will fallback to libcamera-still
-        print("[WARN] picamera2 not importable, fallback to libcamera-still", flush=True)
-
-    # Fallback: libcamera-still via subprocess (available on Raspberry Pi OS)
-    # -o path : output file
-    # --autofocus : try AF if supported; safe to omit on fixed-focus modules
-    # -t 500 : short preview time in ms
-    # --width/--height can be omitted to let libcamera pick defaults
-    try:
-        cmd = [
-            "libcamera-still",
-            "-o", path,
-            "-t", "500",
-            "--immediate",  # capture immediately without lengthy preview
-            "-q", "90",      # jpeg quality
-        ]
-        # Run with a timeout to avoid hanging
-        print(f"[DEBUG] running fallback: {' '.join(cmd)}", flush=True)
-        subprocess.run(cmd, check=True, timeout=10, capture_output=True)
-        if not os.path.exists(path):
-            raise RuntimeError("libcamera-still did not create file")
-        _log("libcamera-still capture success")
-    except FileNotFoundError:
-        # libcamera-still command not found and Picamera2 import previously failed
-        raise FileNotFoundError("neither picamera2 nor libcamera-still is available")
-    except subprocess.TimeoutExpired as te:
-        raise RuntimeError(f"libcamera-still timeout: {te}")
-    except subprocess.CalledProcessError as cpe:
-        err = cpe.stderr.decode() if getattr(cpe, 'stderr', None) else str(cpe)
-        raise RuntimeError(f"libcamera-still failed: {err}")
-
-
-def _write_placeholder_jpeg(path: str, text: str = "camera unavailable"):
-    """Write a small placeholder JPEG so frontend can still display something."""
+    """Capture a full-resolution JPEG to `path` through the shared camera service."""
+    capture_breaker.call(camera_service.capture_still, path)
+
+
+def _capture_photo() -> str:
+    """拍一張存進 photo_store（含縮小版），回傳 full 的路徑。失敗丟例外。"""
+    path = photo_store.new_path()
+    _do_capture(path)
+    photo_store.add(path)
+    return path
+
+
+def _capture_preview() -> bytes:
+    """預覽用（即時畫面不能用時的退路）：拍一張但不進相簿，回傳 JPEG bytes。失敗丟例外。"""
+    fd, path = tempfile.mkstemp(suffix=".jpg", prefix="preview_")
+    os.close(fd)
     try:
-        from PIL import Image, ImageDraw, ImageFont
-        img = Image.new("RGB", (800, 600), color=(240, 240, 240))
-        draw = ImageDraw.Draw(img)
-        msg = f"{text}"
-        draw.text((20, 20), msg, fill=(0, 0, 0))
-        img.save(path, format="JPEG", quality=85)
-    except Exception:
-        # Fallback: write a tiny embedded JPEG (1x1 white pixel)
-        import base64
-        tiny_jpeg_b64 = (
-            
-            "\/9j\/4AAQSkZJRgABAQAAAQABAAD\/2wCEAAkGBxISEBUREBIVFhUVFRUVFRUVFRUVFRUWFhUVFRUYHSggGBolGxUVITEhJSkrLi4uFx8zODMtNygtLisBCgoKDg0OGxAQGy0lHyUtLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLf\/AABEIAAEAAQMBIgACEQEDEQH\/xAAWAAEBAQAAAAAAAAAAAAAAAAADAgT\/EAB0QAQADAQEAAwAAAAAAAAAAAAECAxEEEiExQZH\/2gAMAwEAAhEDEQA\/AKuAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAf\/9k="
-        )
-        with open(path, "wb") as f:
-            f.write(base64.b64decode(tiny_jpeg_b64))
+        _do_capture(path)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def placeholder_url(text: str) -> str:
+    """佔位圖的網址（只帶訊息的 key，由 /camera/placeholder.jpg 從快取給）。"""
+    return "/camera/placeholder.jpg?" + urlencode({"key": placeholders.issue(text)})
+
+
+def _placeholder_response(text: str, cache_control: str = PLACEHOLDER_CACHE_CONTROL):
+    jpeg, etag = placeholders.get(text)
+    if etag in request.headers.get("If-None-Match", ""):
+        resp = Response(status=304)
+    else:
+        resp = Response(jpeg, mimetype="image/jpeg")
+    resp.headers["ETag"] = f'"{etag}"'
+    resp.headers["Cache-Control"] = cache_control
+    return resp
+
+
+@app.get("/camera/placeholder.jpg")
+def camera_placeholder():
+    # 只畫 placeholder_url() 發過的訊息，不接受任意 text
+    text = placeholders.text(request.args.get("key", ""))
+    if text is None:
+        return jsonify({"ok": False, "error": "not_found"}), 404
+    return _placeholder_response(text)
 
 
 @app.route("/camera/capture", methods=["GET", "POST"])
@@ -219,17 +544,13 @@ def camera_capture():
     if key != API_KEY:
         return jsonify({"ok": False, "error": "unauthorized"}), 401
 
-    filename = f"photo_{int(time.time())}_{uuid.uuid4().hex[:6]}.jpg"
-    path = os.path.join(PHOTOS_DIR, filename)
-
     try:
-        _do_capture(path)
+        path = _capture_photo()
+        # 只有真的按拍照才算每日任務（預覽 / mode=still 不算）
+        game.on_photo()
     except (FileNotFoundError, RuntimeError) as e:
-        # Write a placeholder so frontend still works; include error details in JSON for visibility
-        placeholder_name = f"placeholder_{int(time.time())}_{uuid.uuid4().hex[:6]}.jpg"
-        path = os.path.join(PHOTOS_DIR, placeholder_name)
-        _write_placeholder_jpeg(path, text=str(e))
-        url = f"/photos/{os.path.basename(path)}"
+        # Point the frontend at a placeholder (rendered once, served from memory); include error details in JSON
+        url = placeholder_url(str(e))
         if request.method == "GET":
             from flask import redirect
             # Redirect to placeholder but use 302
@@ -237,48 +558,106 @@ def camera_capture():
         return jsonify({"ok": True, "url": url, "placeholder": True, "error": str(e)})
 
     # On GET return a redirect so browsers can open the image URL directly;
-    # on POST return a JSON with the photo URL.
-    url = f"/photos/{filename}"
+    # on POST return a JSON with the photo URL (plus thumb / medium renditions).
+    photo_id = os.path.basename(path)[:-4]
+    url = photo_store.url(photo_id)
     if request.method == "GET":
         from flask import redirect
 
         return redirect(url)
-    return jsonify({"ok": True, "url": url})
+    return jsonify(
+        {
+            "ok": True,
+            "url": url,
+            "thumb_url": photo_store.url(photo_id, "thumb"),
+            "medium_url": photo_store.url(photo_id, "medium"),
+        }
+    )
 
 
 @app.get('/camera/stream')
 def camera_stream():
     """Return a single JPEG frame inline (no redirect).
     This is friendlier to some <img> clients that don't follow redirects reliably.
+    ?mode=mjpeg 改回傳 multipart MJPEG 即時預覽（相機的 lores stream），
+    可帶 fps=（1~30）、w=（寬度，會對到 1、1/2、1/4 大小）、q=（JPEG 畫質）協商，
+    客戶端跟不上時伺服器會自動降檔。
+    預設（snapshot）直接回記憶體裡最新一幀的 JPEG（預覽大小，最多 max_age_ms 毫秒舊，可帶 q=），
+    同時進來的請求共用同一次編碼；?mode=still 才照舊拍一張全尺寸照片（會存進相簿）。
     """
     key = request.args.get("api_key") or request.headers.get("x-api-key")
     if key != API_KEY:
         return jsonify({"ok": False, "error": "unauthorized"}), 401
 
-    filename = f"photo_{int(time.time())}_{uuid.uuid4().hex[:6]}.jpg"
-    path = os.path.join(PHOTOS_DIR, filename)
+    if request.args.get("mode") == "mjpeg":
+        camera_service.start()
+        if camera_service.state == "unavailable":
+            return jsonify(ok=False, error="no_camera_tool", detail=camera_service.last_error), 500
+        opts = negotiate_stream(request.args.get("fps"), request.args.get("w"), request.args.get("q"))
+        return Response(
+            mjpeg_stream(**opts),
+            mimetype="multipart/x-mixed-replace; boundary=frame"
+        )
 
+    # 沒有 picamera2 就沒有即時畫面，直接走拍照（libcamera-still）
+    if request.args.get("mode") != "still" and camera_service.state != "unavailable":
+        try:
+            max_age = float(request.args.get("max_age_ms", SNAPSHOT_MAX_AGE_MS)) / 1000
+            quality = QUALITY_TIERS[negotiate_stream(quality=request.args.get("q"))["tier"]]
+            jpeg, ts = capture_breaker.call(snapshots.get, max_age, quality)
+        except ValueError:
+            return jsonify({"ok": False, "error": "bad_max_age"}), 400
+        except (FileNotFoundError, RuntimeError) as e:
+            # 相機不能用：退回原本的拍照流程（最後會是佔位圖）
+            print(f"[DEBUG] snapshot fallback: {e}", flush=True)
+        else:
+            resp = Response(jpeg, mimetype="image/jpeg")
+            resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+            resp.headers["Pragma"] = "no-cache"
+            resp.headers["X-Frame-Age-Ms"] = str(int((time.time() - ts) * 1000))
+            return resp
+
+    # mode=still 才存進相簿；snapshot 不能用時的退路只是預覽，不留檔
     try:
-        _do_capture(path)
+        if request.args.get("mode") == "still":
+            resp = send_file(_capture_photo(), mimetype="image/jpeg")
+        else:
+            resp = Response(_capture_preview(), mimetype="image/jpeg")
     except (FileNotFoundError, RuntimeError) as e:
-        # fallback to placeholder image
-        placeholder_name = f"placeholder_{int(time.time())}_{uuid.uuid4().hex[:6]}.jpg"
-        path = os.path.join(PHOTOS_DIR, placeholder_name)
-        _write_placeholder_jpeg(path, text=str(e))
+        # fallback to placeholder image (from memory, nothing written to disk)
+        return _placeholder_response(str(e), "no-store, no-cache, must-revalidate, max-age=0")
 
     # Inline return the image bytes, set no-store headers to avoid caching
-    from flask import send_file
-    resp = send_file(path, mimetype="image/jpeg")
     resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     resp.headers["Pragma"] = "no-cache"
     return resp
 
 
+_picamera2_found = None
+
+
+def _picamera2_installed() -> bool:
+    global _picamera2_found
+    if _picamera2_found is None:
+        import importlib.util
+
+        # 已經 import 過（或是模擬器的假模組）就不用找；find_spec 遇到沒有 __spec__ 的模組會丟 ValueError
+        if "picamera2" in sys.modules:
+            _picamera2_found = True
+        else:
+            try:
+                _picamera2_found = importlib.util.find_spec("picamera2") is not None
+            except (ImportError, ValueError):
+                _picamera2_found = False
+    return _picamera2_found
+
+
 @app.get("/camera/health")
 def camera_health():
     """Simple health check for camera availability and environment.
     Returns whether API key auth would pass (not required here), Picamera2 importable,
-    and whether singleton is initialized. Does not touch the sensor to avoid conflicts.
+    whether the camera service is running, and its metrics (fps / captures / restarts).
+    Does not touch the sensor to avoid conflicts.
     """
     info = {
         "api_key_set": bool(API_KEY and API_KEY != "CHANGE_ME"),
@@ -286,15 +665,16 @@ def camera_health():
         "singleton_initialized": False,
         "photos_dir_writable": False,
     }
-    # Picamera2 import test
-    try:
-        from picamera2 import Picamera2  # noqa: F401
-        info["picamera2_import"] = True
-    except Exception:
-        info["picamera2_import"] = False
+    # Picamera2 import test（只找模組、不真的 import，import 由相機執行緒做）
+    info["picamera2_import"] = _picamera2_installed()
 
-    # Singleton state
-    info["singleton_initialized"] = PICAM is not None
+    # Camera service state
+    info["singleton_initialized"] = camera_service.picam2 is not None
+    info["service"] = camera_service.stats()
+    info["stream"] = stream_stats()
+    info["snapshot"] = snapshots.stats()
+    info["breaker"] = capture_breaker.stats()
+    info["placeholders"] = placeholders.stats()
 
     # Photos dir writable
     try:
@@ -310,31 +690,99 @@ def camera_health():
     return jsonify({"ok": True, "camera": info})
 
 
+@app.get("/photos")
+def list_photos():
+    """/photos?limit=50&before=<ts>：最新的在前（從索引讀，不掃目錄）；placeholders=1 連佔位圖一起列。"""
+    try:
+        limit = max(1, min(int(request.args.get("limit", "50")), 500))
+        before = request.args.get("before")
+        before = float(before) if before else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "bad_query"}), 400
+    photos = photo_store.list(limit, before, include_placeholders=request.args.get("placeholders") == "1")
+    return jsonify({"ok": True, "photos": photos, **photo_store.stats()})
+
+
+# 照片寫好就不會變：ETag 固定、瀏覽器可以快取一年
+PHOTO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
 @app.get("/photos/<path:filename>")
 def get_photo(filename):
-    return send_from_directory(PHOTOS_DIR, filename)
+    """/photos/<id>.jpg（原圖）、/photos/medium/<id>.jpg、/photos/thumb/<id>.jpg。"""
+    photo_id, rendition = parse_photo_path(filename)
+    entry = photo_store.get(photo_id) if photo_id else None
+    if entry is None:
+        return jsonify({"ok": False, "error": "not_found"}), 404
+    path = photo_store.ensure(photo_id, rendition)
+    resp = send_file(
+        path,
+        mimetype="image/jpeg",
+        etag=photo_store.etag(photo_id, rendition),
+        last_modified=entry["ts"],
+        conditional=True,
+    )
+    resp.headers["Cache-Control"] = PHOTO_CACHE_CONTROL
+    return resp
+
+
+def _warm_codecs():
+    # 第一次拍照 / 縮圖 / 串流不用再等這些大模組載入
+    jpeg_codec()
+    from PIL import Image  # noqa: F401
+
+
+def start_services():
+    """開相機、暖好大模組（dev server 的 __main__、gunicorn 的 post_worker_init、asgi 的 lifespan 都呼叫）。
+
+    全部在背景做，不阻塞 port 開始 listen；進度看 /ready。
+    """
+    camera_service.start()
+    startup.background("codecs", _warm_codecs)
+
+
+# 相機開完（或確定沒有相機）才算 ready
+startup.require("camera", lambda: camera_service.state not in ("stopped", "starting"))
+
+
+_shutdown_lock = threading.Lock()
+_shut_down = False
+
+
+def shutdown():
+    """關掉所有背景執行緒與硬體（可重複呼叫，只會做一次）。"""
+    global _shut_down
+    with _shutdown_lock:
+        if _shut_down:
+            return
+        _shut_down = True
+    print("[DEBUG] shutting down...", flush=True)
+    auto_water.stop()
+    # 排隊中的澆水退回額度、等正在開的幫浦關掉，才能關帳本和 GPIO
+    pump_executor.stop()
+    game.stop()
+    history.stop_history()
+    stop_sampler()
+    close_reads()
+    touch_detector.stop()
+    dht_reader.close()
+    camera_service.stop()
+    ledger.close()
+    cleanup()
+    _hw_lock.close()
+
+
+startup.done_importing()
 
 
 if __name__ == "__main__":
+    # 開發用：Flask 內建 server。正式上線用 gunicorn -c gunicorn.conf.py app:app
     try:
         print("[DEBUG] routes:", [r.rule for r in app.url_map.iter_rules()], flush=True)
         print("[DEBUG] app starting...", flush=True)
-        # Initialize camera singleton early (best-effort)
-        try:
-            from picamera2 import Picamera2
-            print("[DEBUG] initializing camera singleton", flush=True)
-            PICAM = Picamera2()
-            PICAM.configure(PICAM.create_still_configuration())
-            PICAM.start()
-            time.sleep(0.3)
-            print("[DEBUG] camera initialized", flush=True)
-        except Exception as e:
-            print(f"[WARN] camera init skipped: {e}", flush=True)
-        app.run(host="0.0.0.0", port=8000)
+        start_services()
+        # systemctl stop / kill 送 SIGTERM 時也要走 finally 關幫浦
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        app.run(host="0.0.0.0", port=int(os.getenv("PORT", "8000")), threaded=True)
     finally:
-        try:
-            if PICAM:
-                PICAM.stop()
-        except Exception:
-            pass
-        cleanup()
\ No newline at end of file
+        shutdown()
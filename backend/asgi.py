@@ -0,0 +1,323 @@
+"""asyncio 版的服務層（Starlette + uvicorn），和 app.py 用同一組單例與路由。
+
+  cd backend
+  uvicorn asgi:app --host 0.0.0.0 --port 8000
+
+- import app 時相機、幫浦、取樣器、帳本就初始化好了（同樣會拿 HW_LOCK，只能有一個行程）
+- 長連線 / 熱門路由改成原生 async：/status、/status/stream、/touch/events、/game、
+  /camera/stream、/camera/capture、/photos/*。閒置的 SSE / MJPEG 觀看者只是 coroutine，不佔 OS 執行緒
+- 會阻塞的硬體工作（拍照）丟到有上限的 HW_EXECUTOR；沒有 picamera2 時 libcamera-still
+  用 asyncio.create_subprocess_exec 跑
+- 感測器本來就由 sampler 的背景執行緒讀（每組一條），請求路徑不碰 I2C / GPIO
+- 其他路由（/water、/history、/auto_water…）原封不動交給 Flask app（a2wsgi 的 WSGIMiddleware，自己的 threadpool；starlette 內建的已經 deprecated）
+"""
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from email.utils import formatdate
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as core
+import metrics
+from aio_bridge import AsyncNotifier, wait_event
+from camera import (
+    QUALITY_TIERS,
+    SNAPSHOT_MAX_AGE_MS,
+    amjpeg_stream,
+    camera_service,
+    capture_libcamera_async,
+    negotiate_stream,
+    snapshots,
+)
+from photo_store import parse_photo_path
+
+# 阻塞的硬體呼叫最多同時幾個（Pi 4 四核，相機一次也只能拍一張）
+HW_WORKERS = int(os.getenv("ASYNC_HW_WORKERS", "4"))
+HW_EXECUTOR = ThreadPoolExecutor(max_workers=HW_WORKERS, thread_name_prefix="hw")
+
+# 觸控中斷 → 叫醒 long-poll 的 coroutine
+_touch_notify = AsyncNotifier()
+core.touch_detector.add_listener(lambda _event: _touch_notify.notify_all())
+_game_notify = AsyncNotifier()
+core.game.add_listener(lambda _diff: _game_notify.notify_all())
+
+
+async def run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(HW_EXECUTOR, fn, *args)
+
+
+def _api_key(request) -> str | None:
+    return request.query_params.get("api_key") or request.headers.get("x-api-key")
+
+
+async def _capture(path: str):
+    if camera_service.state != "unavailable":
+        await run_blocking(core._do_capture, path)
+        return
+    # libcamera-still 在 event loop 上跑，斷路器要自己記
+    core.capture_breaker.check()
+    try:
+        await capture_libcamera_async(path)
+    except Exception as e:
+        core.capture_breaker.failed(e)
+        raise
+    core.capture_breaker.succeeded()
+
+
+async def _capture_or_error():
+    """拍一張存進 photo_store。回傳 (full 路徑, None)；失敗回傳 (None, error)（佔位圖由呼叫端給）。"""
+    path = core.photo_store.new_path()
+    try:
+        await _capture(path)
+    except (FileNotFoundError, RuntimeError) as e:
+        return None, str(e)
+    await run_blocking(core.photo_store.add, path)
+    return path, None
+
+
+async def _preview_or_error():
+    """預覽用：拍一張但不進相簿。回傳 (JPEG bytes, None)；失敗回傳 (None, error)。"""
+    fd, path = tempfile.mkstemp(suffix=".jpg", prefix="preview_")
+    os.close(fd)
+    try:
+        await _capture(path)
+        return await run_blocking(_read_file, path), None
+    except (FileNotFoundError, RuntimeError) as e:
+        return None, str(e)
+    finally:
+        os.remove(path)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _placeholder(text: str, request, cache_control: str = core.PLACEHOLDER_CACHE_CONTROL):
+    jpeg, etag = core.placeholders.get(text)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": cache_control}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(jpeg, media_type="image/jpeg", headers=headers)
+
+
+async def status(request):
+    code, body, media_type, headers = core.status_response(
+        request.headers.get("accept", ""), request.query_params.get("since"), request.headers.get("if-none-match", "")
+    )
+    return Response(body, status_code=code, media_type=media_type, headers=headers)
+
+
+async def status_stream(request):
+    return StreamingResponse(
+        core.status_hub.asubscribe(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def touch_events(request):
+    try:
+        since = int(request.query_params.get("since", "0"))
+        wait = max(0.0, min(float(request.query_params.get("wait", "0")), 25.0))
+    except ValueError:
+        return JSONResponse({"ok": False, "error": "bad_cursor"}, status_code=400)
+    ev = _touch_notify.add()
+    try:
+        ev.clear()
+        res = core.touch_detector.events_since(since)
+        if not res["events"] and wait > 0:
+            await wait_event(ev, wait)
+            res = core.touch_detector.events_since(since)
+    finally:
+        _touch_notify.discard(ev)
+    return JSONResponse({"ok": True, **res})
+
+
+async def game_state(request):
+    if "since" not in request.query_params:
+        return JSONResponse({"ok": True, **core.game.snapshot()})
+    try:
+        since = int(request.query_params["since"])
+        wait = max(0.0, min(float(request.query_params.get("wait", "0")), 25.0))
+    except ValueError:
+        return JSONResponse({"ok": False, "error": "bad_version"}, status_code=400)
+    ev = _game_notify.add()
+    try:
+        ev.clear()
+        res = core.game.since(since)
+        if not res["state"] and wait > 0:
+            await wait_event(ev, wait)
+            res = core.game.since(since)
+    finally:
+        _game_notify.discard(ev)
+    return JSONResponse({"ok": True, **res})
+
+
+async def camera_capture(request):
+    key = _api_key(request)
+    if key is None and request.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+        # 不用 request.form()（要另外裝 python-multipart），api_key 自己從 body 拿
+        key = parse_qs((await request.body()).decode()).get("api_key", [None])[0]
+    if key != core.API_KEY:
+        return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+
+    path, err = await _capture_or_error()
+    if not err:
+        # 只有真的按拍照才算每日任務（預覽 / mode=still 不算）
+        core.game.on_photo()
+    else:
+        url = core.placeholder_url(err)
+        if request.method == "GET":
+            return RedirectResponse(url, status_code=302)
+        return JSONResponse({"ok": True, "url": url, "placeholder": True, "error": err})
+    photo_id = os.path.basename(path)[:-4]
+    url = core.photo_store.url(photo_id)
+    if request.method == "GET":
+        return RedirectResponse(url, status_code=302)
+    return JSONResponse(
+        {
+            "ok": True,
+            "url": url,
+            "thumb_url": core.photo_store.url(photo_id, "thumb"),
+            "medium_url": core.photo_store.url(photo_id, "medium"),
+        }
+    )
+
+
+async def camera_stream(request):
+    if _api_key(request) != core.API_KEY:
+        return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+
+    q = request.query_params
+    if q.get("mode") == "mjpeg":
+        camera_service.start()
+        if camera_service.state == "unavailable":
+            return JSONResponse(
+                {"ok": False, "error": "no_camera_tool", "detail": camera_service.last_error}, status_code=500
+            )
+        opts = negotiate_stream(q.get("fps"), q.get("w"), q.get("q"))
+        return StreamingResponse(amjpeg_stream(**opts), media_type="multipart/x-mixed-replace; boundary=frame")
+
+    no_store = {"Cache-Control": "no-store, no-cache, must-revalidate, max-age=0", "Pragma": "no-cache"}
+    if q.get("mode") != "still" and camera_service.state != "unavailable":
+        try:
+            max_age = float(q.get("max_age_ms", SNAPSHOT_MAX_AGE_MS)) / 1000
+        except ValueError:
+            return JSONResponse({"ok": False, "error": "bad_max_age"}, status_code=400)
+        quality = QUALITY_TIERS[negotiate_stream(quality=q.get("q"))["tier"]]
+        # 記憶體裡有夠新的就不用進 executor
+        hit = snapshots.peek(max_age, quality)
+        try:
+            jpeg, ts = hit or await run_blocking(core.capture_breaker.call, snapshots.get, max_age, quality)
+        except (FileNotFoundError, RuntimeError):
+            pass
+        else:
+            headers = dict(no_store, **{"X-Frame-Age-Ms": str(int((time.time() - ts) * 1000))})
+            return Response(jpeg, media_type="image/jpeg", headers=headers)
+
+    # mode=still 才存進相簿；snapshot 不能用時的退路只是預覽，不留檔
+    if q.get("mode") == "still":
+        path, err = await _capture_or_error()
+        if not err:
+            return FileResponse(path, media_type="image/jpeg", headers=no_store)
+    else:
+        jpeg, err = await _preview_or_error()
+        if not err:
+            return Response(jpeg, media_type="image/jpeg", headers=no_store)
+    return _placeholder(err, request, no_store["Cache-Control"])
+
+
+async def camera_placeholder(request):
+    # 只畫 placeholder_url() 發過的訊息，不接受任意 text
+    text = core.placeholders.text(request.query_params.get("key", ""))
+    if text is None:
+        return JSONResponse({"ok": False, "error": "not_found"}, status_code=404)
+    return _placeholder(text, request)
+
+
+async def get_photo(request):
+    photo_id, rendition = parse_photo_path(request.path_params["filename"])
+    entry = core.photo_store.get(photo_id) if photo_id else None
+    if entry is None:
+        return JSONResponse({"ok": False, "error": "not_found"}, status_code=404)
+    etag = f'"{core.photo_store.etag(photo_id, rendition)}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(entry["ts"], usegmt=True),
+        "Cache-Control": core.PHOTO_CACHE_CONTROL,
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    path = await run_blocking(core.photo_store.ensure, photo_id, rendition)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+
+class LatencyMiddleware:
+    """原生 async 路由的延遲（串流算到第一個 byte）；Mount 到 Flask 的由 Flask 自己記。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        done = False
+
+        async def send_wrapper(message):
+            nonlocal done
+            if message["type"] == "http.response.start" and not done:
+                done = True
+                route = scope.get("route")
+                if isinstance(route, Route):
+                    metrics.REQUEST_SECONDS.labels(
+                        method=scope["method"], route=route.path, status=message["status"]
+                    ).observe(time.perf_counter() - t0)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    core.start_services()
+    try:
+        yield
+    finally:
+        core.shutdown()
+        HW_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+
+app = Starlette(
+    routes=[
+        Route("/status", status),
+        Route("/status/stream", status_stream),
+        Route("/touch/events", touch_events),
+        Route("/game", game_state),
+        Route("/camera/capture", camera_capture, methods=["GET", "POST"]),
+        Route("/camera/stream", camera_stream),
+        Route("/camera/placeholder.jpg", camera_placeholder),
+        Route("/photos/{filename:path}", get_photo),
+        # 其他路由照舊走 Flask
+        Mount("/", WSGIMiddleware(core.app)),
+    ],
+    lifespan=lifespan,
+)
+app.add_middleware(LatencyMiddleware)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=core.STATUS_EXPOSE_HEADERS,
+)
@@ -0,0 +1,143 @@
+"""自動澆水排程器。
+
+只看 sampler 的快照（不多讀硬體，對 API 沒有額外延遲）：
+- 每筆新的土壤取樣看 soil_dry（True=乾）：DO 腳的方向只在 sensors.py 解讀一次（SOIL_DRY_LEVEL）
+- 最近 window 筆裡乾的比例 ≥ dry_on 才進入 dry，≤ dry_off 才回到 wet（遲滯，不會被單一雜訊觸發）
+- dry 時開一次幫浦，之後 soak_sec 內不再判斷（水滲下去、感測器反應需要時間）
+- 真正澆水走和 /water 一樣的帳本預扣，受 DAILY_LIMIT / COOLDOWN 限制
+
+模式：off / dry_run（只記錄「會澆」不開幫浦）/ on
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from sampler import SAMPLE_INTERVALS, get_snapshot
+
+POLICIES = {
+    "gentle": {"window": 30, "dry_on": 0.9, "dry_off": 0.3, "pulse_sec": 2.0, "soak_sec": 600.0},
+    "normal": {"window": 20, "dry_on": 0.8, "dry_off": 0.2, "pulse_sec": 3.0, "soak_sec": 300.0},
+    "thirsty": {"window": 10, "dry_on": 0.6, "dry_off": 0.2, "pulse_sec": 4.0, "soak_sec": 180.0},
+}
+MODES = ("off", "dry_run", "on")
+
+AUTO_WATER_MODE = os.getenv("AUTO_WATER_MODE", "off")
+AUTO_WATER_POLICY = os.getenv("AUTO_WATER_POLICY", "normal")
+# 被 cooldown / daily_limit 擋下後隔多久再試
+RETRY_SEC = float(os.getenv("AUTO_WATER_RETRY_SEC", "60"))
+MAX_DECISIONS = 50
+
+
+class AutoWaterScheduler:
+    def __init__(self, water, mode: str = AUTO_WATER_MODE, policy: str = AUTO_WATER_POLICY):
+        # water(sec) -> (ok, error, job_id)，app.py 提供（和 /water 同一條路）
+        self.water = water
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._decisions = deque(maxlen=MAX_DECISIONS)
+        self._last_sampled_at = None
+        self.mode = "off"
+        self.policy = None
+        self.configure(mode=mode, policy=policy)
+
+    def configure(self, mode: str | None = None, policy: str | None = None):
+        """切換模式 / 策略；換策略會清掉目前的取樣視窗。"""
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"bad mode: {mode}")
+        if policy is not None and policy not in POLICIES:
+            raise ValueError(f"bad policy: {policy}")
+        with self._lock:
+            if mode is not None:
+                self.mode = mode
+            if policy is not None:
+                self.policy = policy
+                self._window = deque(maxlen=POLICIES[self.policy]["window"])
+                self.state = "warming"
+                self._next_check = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="auto_water")
+        self._thread.start()
+        print(f"[AUTO] mode={self.mode} policy={self.policy}", flush=True)
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _loop(self):
+        interval = SAMPLE_INTERVALS["soil"]
+        while not self._stop.wait(interval):
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[AUTO] error: {e}", flush=True)
+
+    def tick(self, now: float | None = None):
+        """看一次快照：有新的土壤取樣才更新視窗、判斷要不要澆。"""
+        if now is None:
+            now = time.time()
+        snap = get_snapshot()
+        ts = snap.sampled_at.get("soil_dry")
+        dry = snap.values.get("soil_dry")
+        if ts is None or dry is None or ts == self._last_sampled_at:
+            return
+        self._last_sampled_at = ts
+        self.feed(dry, now)
+
+    def feed(self, dry: bool, now: float):
+        with self._lock:
+            if self.mode == "off":
+                return
+            p = POLICIES[self.policy]
+            self._window.append(dry)
+            if len(self._window) < p["window"]:
+                return
+            ratio = sum(self._window) / len(self._window)
+            if self.state != "dry" and ratio >= p["dry_on"]:
+                self.state = "dry"
+            elif self.state != "wet" and ratio <= p["dry_off"]:
+                self.state = "wet"
+            if self.state != "dry" or now < self._next_check:
+                return
+            mode = self.mode
+            sec = p["pulse_sec"]
+
+        if mode == "dry_run":
+            ok, err, job_id = True, None, None
+        else:
+            ok, err, job_id = self.water(sec)
+
+        with self._lock:
+            if ok:
+                # 澆完（或假裝澆完）要等水滲下去，重新收集整個視窗再判斷
+                self._next_check = now + p["soak_sec"]
+                self._window.clear()
+                self.state = "warming"
+            else:
+                self._next_check = now + RETRY_SEC
+            action = ("would_water" if mode == "dry_run" else "water") if ok else "skipped"
+            self._decisions.append(
+                {"ts": now, "action": action, "sec": sec, "ratio": round(ratio, 2), "job_id": job_id, "error": err}
+            )
+        print(f"[AUTO] {action} sec={sec} dry_ratio={ratio:.2f} err={err}", flush=True)
+
+    def status(self) -> dict:
+        with self._lock:
+            window = list(self._window)
+            return {
+                "mode": self.mode,
+                "policy": self.policy,
+                "params": dict(POLICIES[self.policy]),
+                "state": self.state,
+                "samples": len(window),
+                "dry_ratio": round(sum(window) / len(window), 2) if window else None,
+                "next_check": self._next_check or None,
+                "decisions": list(self._decisions),
+            }
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""預覽幀路徑的 benchmark（不需要相機，用假畫面）
+
+用法：
+  python bench_frames.py [--frames 300] [--viewers 3] [--size 640x480] [--json out.json]
+
+比較兩種做法每一幀花多少時間、配置多少記憶體：
+  before : 舊的 camera.py —— capture_array() 每幀配置新陣列，
+           每個觀看者各自 latest_frame.copy() + cv2.imencode（RGB888）
+  after  : 現在的 camera.py —— 相機 buffer memcpy 進預先配置的 FrameRing，
+           每幀只用 simplejpeg 從 YUV420 plane 編碼一次，所有觀看者共用
+
+記憶體用 tracemalloc 量（numpy 的配置也會算進去）：
+  alloc KiB/frame : 每幀暫時配置的位元組（peak）
+  buffers/frame   : 換算成「幾個預覽幀大小的 buffer」
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from camera import FrameRing, encode_yuv420
+
+
+def _fake_plane(rows: int, cols: int):
+    """平滑的漸層 + 一點雜訊，JPEG 大小比較接近真實畫面（純亂數會編得特別大）。"""
+    rng = np.random.default_rng(0)
+    grad = (np.add.outer(np.arange(rows), np.arange(cols)) * 255 // (rows + cols)).astype(np.uint8)
+    return grad + rng.integers(0, 8, (rows, cols), dtype=np.uint8)
+
+
+def _measure(step, frames: int):
+    # 先暖身（第一次配置 ring、載入 codec 等不算）
+    for i in range(5):
+        step(i)
+    tracemalloc.start()
+    total_peak = 0
+    t0 = time.perf_counter()
+    for i in range(frames):
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        step(i)
+        total_peak += tracemalloc.get_traced_memory()[1] - base
+    ms = (time.perf_counter() - t0) * 1000 / frames
+    tracemalloc.stop()
+    return ms, total_peak / frames
+
+
+def bench_before(w: int, h: int, viewers: int, frames: int, quality: int):
+    import cv2
+
+    camera_buf = np.repeat(_fake_plane(h, w)[:, :, None], 3, axis=2)
+    state = {"latest": None}
+
+    def step(_i):
+        # camera_loop: picam2.capture_array() → 每幀一個新陣列
+        state["latest"] = np.array(camera_buf)
+        # mjpeg_generator: 每個觀看者各自 copy + 編碼
+        for _ in range(viewers):
+            frame = state["latest"].copy()
+            _, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            jpeg.tobytes()
+
+    return _measure(step, frames)
+
+
+def bench_after(w: int, h: int, viewers: int, frames: int, quality: int):
+    camera_buf = _fake_plane(h * 3 // 2, w)
+    ring = FrameRing()
+    shared = {}
+
+    def step(i):
+        # camera_loop: DMA buffer → ring（memcpy，不配置）
+        frame = ring.put(camera_buf, i + 1)
+        # 編碼一次，觀看者拿同一份 bytes
+        shared["part"] = encode_yuv420(frame, quality)
+        for _ in range(viewers):
+            shared["part"]
+
+    return _measure(step, frames)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--viewers", type=int, default=3)
+    parser.add_argument("--size", default="640x480")
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    w, h = (int(v) for v in args.size.split("x"))
+    frame_bytes = w * h * 3 // 2
+    print(f"Preview frame path: {w}x{h}, {args.viewers} viewers, {args.frames} frames\n")
+
+    results = {}
+    for name, fn in (("before", bench_before), ("after", bench_after)):
+        try:
+            ms, alloc = fn(w, h, args.viewers, args.frames, args.quality)
+        except ImportError as e:
+            print(f"{name}: skipped ({e})")
+            continue
+        results[name] = {
+            "ms_per_frame": round(ms, 3),
+            "alloc_kib_per_frame": round(alloc / 1024, 1),
+            "buffers_per_frame": round(alloc / frame_bytes, 2),
+        }
+
+    print(f"{'path':<8}{'ms/frame':>10}{'alloc KiB/frame':>18}{'buffers/frame':>16}")
+    for name, r in results.items():
+        print(f"{name:<8}{r['ms_per_frame']:>10}{r['alloc_kib_per_frame']:>18}{r['buffers_per_frame']:>16}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"size": [w, h], "viewers": args.viewers, "frames": args.frames, "results": results}, f, indent=2)
+    sys.exit(0 if results else 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""HTTP 壓力測試：/status 與 /photos/* 在 dev server 和 gunicorn 下的 requests/sec
+
+用法：
+  python bench_http.py [--modes dev,gunicorn] [--clients 32] [--duration 10] [--json out.json]
+  python bench_http.py --url http://<PI_IP>:8000 --photo photo_xxx.jpg   # 測已經在跑的 server
+
+沒給 --url 時，每種模式各自起一個 server（預設 mock 感測器 / 幫浦；SIMULATE=1 則跑在模擬硬體上，
+帳本與 DB 寫在暫存目錄），
+照片目錄也指到暫存目錄並放一張測試照片，跑完送 SIGTERM 並確認有走到 graceful shutdown。
+每個 client 一條執行緒、一條 keep-alive 連線，一直打到時間到為止。
+"""
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PHOTO_NAME = "bench_photo.jpg"
+
+SERVER_CMDS = {
+    "dev": [sys.executable, "app.py"],
+    "gunicorn": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+}
+
+
+def _percentile(sorted_vals, p):
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, int(round(p / 100 * (len(sorted_vals) - 1))))
+    return sorted_vals[k]
+
+
+def load(base: str, path: str, clients: int, duration: float, method: str = "GET", body=None, headers=None) -> dict:
+    """clients 條 keep-alive 連線一直打 path，2xx / 3xx 算成功。"""
+    u = urlparse(base)
+    stop_at = time.perf_counter() + duration
+    lat = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=10)
+        mine = []
+        while time.perf_counter() < stop_at:
+            t0 = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                resp.read()
+                if not 200 <= resp.status < 400:
+                    raise RuntimeError(resp.status)
+                mine.append(time.perf_counter() - t0)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=10)
+        conn.close()
+        with lock:
+            lat.extend(mine)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    t0 = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    elapsed = time.perf_counter() - t0
+
+    lat.sort()
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "requests": len(lat),
+        "errors": errors[0],
+        "rps": round(len(lat) / elapsed, 1),
+        "p50_ms": ms(_percentile(lat, 50)),
+        "p95_ms": ms(_percentile(lat, 95)),
+        "p99_ms": ms(_percentile(lat, 99)),
+    }
+
+
+def _wait_ready(base: str, timeout: float = 30.0) -> bool:
+    u = urlparse(base)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(u.hostname, u.port, timeout=1)
+            conn.request("GET", "/status")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.3)
+    return False
+
+
+@contextmanager
+def serve(mode: str, port: int, threads: int = 32, photo_kb: int = 200, extra_env=None):
+    """起一個 server（dev / gunicorn），yield 狀態 dict（base、tmp、graceful_shutdown 在結束後填）。"""
+    base = f"http://127.0.0.1:{port}"
+    tmp = tempfile.mkdtemp(prefix="bench_http_")
+    photos = os.path.join(tmp, "photos")
+    os.makedirs(photos)
+    with open(os.path.join(photos, PHOTO_NAME), "wb") as f:
+        f.write(os.urandom(photo_kb * 1024))
+    env = dict(os.environ)
+    if env.get("SIMULATE") != "1":
+        # SIMULATE=1 時讓 app 走真的 driver 路徑讀假硬體（見 simulator.py）
+        env.setdefault("MOCK_SENSORS", "1")
+        env.setdefault("PUMP_MOCK", "1")
+    env.update(
+        {
+            "PORT": str(port),
+            "HISTORY_DB": os.path.join(tmp, "history.db"),
+            "WATER_LEDGER": os.path.join(tmp, "ledger.jsonl"),
+            "GAME_STATE": os.path.join(tmp, "game_state.json"),
+            "HW_LOCK": os.path.join(tmp, "hw.lock"),
+            "PHOTOS_DIR": photos,
+            "GUNICORN_THREADS": str(threads),
+        }
+    )
+    env.update(extra_env or {})
+    state = {"base": base, "tmp": tmp, "env": env, "ready": False, "graceful_shutdown": None}
+    log = open(os.path.join(tmp, "server.log"), "w+")
+    proc = subprocess.Popen(SERVER_CMDS[mode], cwd=HERE, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        state["ready"] = _wait_ready(base)
+        if not state["ready"]:
+            print(f"{mode}: server did not start (log: {log.name})")
+        yield state
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.seek(0)
+        state["graceful_shutdown"] = "shutting down" in log.read()
+        log.close()
+
+
+def run_mode(mode: str, args) -> dict | None:
+    with serve(mode, args.port, args.threads, args.photo_kb) as srv:
+        if not srv["ready"]:
+            return None
+        result = {}
+        for path in ("/status", f"/photos/{PHOTO_NAME}"):
+            result[path] = load(srv["base"], path, args.clients, args.duration)
+    result["graceful_shutdown"] = srv["graceful_shutdown"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", default="dev,gunicorn", help="comma separated: dev,gunicorn")
+    parser.add_argument("--url", help="benchmark an already running server instead")
+    parser.add_argument("--photo", default=PHOTO_NAME, help="photo filename for /photos/* (with --url)")
+    parser.add_argument("--photo-kb", type=int, default=200, help="size of the generated test photo")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=32, help="GUNICORN_THREADS for the gunicorn mode")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    if args.url:
+        results["external"] = {
+            path: load(args.url, path, args.clients, args.duration)
+            for path in ("/status", f"/photos/{args.photo}")
+        }
+    else:
+        for mode in args.modes.split(","):
+            r = run_mode(mode.strip(), args)
+            if r is not None:
+                results[mode] = r
+
+    print(f"\n{args.clients} clients, {args.duration}s per endpoint\n")
+    print(f"{'mode':<10}{'path':<24}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for mode, r in results.items():
+        for path, v in r.items():
+            if path == "graceful_shutdown":
+                continue
+            name = "/photos/*" if path.startswith("/photos/") else path
+            print(f"{mode:<10}{name:<24}{v['rps']:>9}{v['p50_ms']:>9}{v['p95_ms']:>9}{v['p99_ms']:>9}{v['errors']:>8}")
+        if "graceful_shutdown" in r:
+            print(f"{mode:<10}graceful shutdown: {'yes' if r['graceful_shutdown'] else 'NO'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"clients": args.clients, "duration": args.duration, "results": results}, f, indent=2)
+    sys.exit(0 if results else 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""端到端效能測試：熱門路由的 req/s 與 p50/p95/p99，加上感測器 / 拍照 / MJPEG 的微基準
+
+用法：
+  python bench_suite.py                                   # 預設 gunicorn、並發 1,8,32，全部路由 + 微基準
+  python bench_suite.py --modes dev,gunicorn --clients 16 --duration 5
+  python bench_suite.py --endpoints status,photo --http-only
+  python bench_suite.py --json after.json --compare before.json   # 跟上一個 commit 的結果比
+
+預設跑在模擬硬體上（SIMULATE=1，見 simulator.py），一般 Linux 就能跑；--no-simulate 則用
+目前環境（Pi 上就是真的硬體，注意 /water 會真的開幫浦）。
+server 用暫存的帳本 / DB / 照片目錄，並關掉 cooldown 與每日上限，/water 才量得到「接受」的路徑。
+結果（含 commit、機器、設定）寫成 JSON，--compare 會列出 req/s 與 p95 的變化。
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_http import PHOTO_NAME, load, serve
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+API_KEY = "bench-key"
+
+# 名稱 → (method, path, body, headers)
+ENDPOINTS = {
+    "status": ("GET", "/status", None, {}),
+    "water": (
+        "POST", "/water", "sec=0.5",
+        {"Content-Type": "application/x-www-form-urlencoded", "X-API-Key": API_KEY},
+    ),
+    "camera_capture": ("POST", "/camera/capture", None, {"X-API-Key": API_KEY}),
+    "camera_stream": ("GET", f"/camera/stream?api_key={API_KEY}", None, {}),
+    "photo": ("GET", f"/photos/{PHOTO_NAME}", None, {}),
+}
+
+SERVER_ENV = {
+    "WATER_API_KEY": API_KEY,
+    "COOLDOWN_SEC": "0",
+    "DAILY_LIMIT_SEC": "1000000000",
+}
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+# ========= HTTP =========
+def run_http(args) -> dict:
+    extra = dict(SERVER_ENV)
+    if args.simulate:
+        extra["SIMULATE"] = "1"
+    results = {}
+    for mode in args.modes:
+        with serve(mode, args.port, args.threads, extra_env=extra) as srv:
+            if not srv["ready"]:
+                continue
+            per_endpoint = {}
+            for name in args.endpoints:
+                method, path, body, headers = ENDPOINTS[name]
+                per_endpoint[name] = {}
+                for clients in args.clients:
+                    r = load(srv["base"], path, clients, args.duration, method, body, headers)
+                    per_endpoint[name][str(clients)] = r
+                    print(
+                        f"{mode:<10}{name:<16}{clients:>4} clients {r['rps']:>9} req/s  "
+                        f"p50 {r['p50_ms']} / p95 {r['p95_ms']} / p99 {r['p99_ms']} ms  errors {r['errors']}",
+                        flush=True,
+                    )
+        per_endpoint["graceful_shutdown"] = srv["graceful_shutdown"]
+        results[mode] = per_endpoint
+    return results
+
+
+# ========= 微基準（同一個行程 import app，跑在模擬硬體上） =========
+def _timings(fn, n: int) -> dict:
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "n": n,
+        "mean_ms": ms(statistics.fmean(samples)),
+        "p50_ms": ms(samples[n // 2]),
+        "p95_ms": ms(samples[min(n - 1, int(n * 0.95))]),
+        "p99_ms": ms(samples[min(n - 1, int(n * 0.99))]),
+    }
+
+
+def run_micro(args) -> dict:
+    tmp = tempfile.mkdtemp(prefix="bench_micro_")
+    os.environ.update(
+        {
+            "HISTORY_DB": os.path.join(tmp, "history.db"),
+            "WATER_LEDGER": os.path.join(tmp, "ledger.jsonl"),
+            "GAME_STATE": os.path.join(tmp, "game_state.json"),
+            "HW_LOCK": os.path.join(tmp, "hw.lock"),
+            "PHOTOS_DIR": os.path.join(tmp, "photos"),
+        }
+    )
+    if args.simulate:
+        os.environ["SIMULATE"] = "1"
+    sys.path.insert(0, HERE)
+    import app
+    from camera import camera_service, encode_yuv420, mjpeg_stream, QUALITY_TIERS
+    from sensors import read_all_sensors
+
+    n = args.iterations
+    out = {}
+    try:
+        app.start_services()
+        out["read_all_sensors"] = _timings(lambda: read_all_sensors(mock=False), n)
+        out["read_all_sensors_mock"] = _timings(lambda: read_all_sensors(mock=True), n)
+
+        path = os.path.join(tmp, "capture.jpg")
+        app._do_capture(path)  # 第一張要等相機暖機，不算
+        out["_do_capture"] = _timings(lambda: app._do_capture(path), max(5, n // 10))
+
+        camera_service.want_frames()
+        _, _, frame = camera_service.wait_frame(0, timeout=5.0)
+        if frame is not None:
+            for q in QUALITY_TIERS:
+                out[f"encode_yuv420_q{q}"] = _timings(lambda: encode_yuv420(frame, q), n)
+
+        # 一個觀看者的每幀成本：牆上時間（受 fps 限制）與整個行程的 CPU 時間（含編碼執行緒）
+        frames = max(30, n // 4)
+        gen = mjpeg_stream(fps=30)
+        next(gen)
+        c0, t0 = time.process_time(), time.perf_counter()
+        size = 0
+        for _ in range(frames):
+            size += len(next(gen))
+        out["mjpeg_stream"] = {
+            "frames": frames,
+            "wall_ms_per_frame": round((time.perf_counter() - t0) * 1000 / frames, 3),
+            "cpu_ms_per_frame": round((time.process_time() - c0) * 1000 / frames, 3),
+            "bytes_per_frame": size // frames,
+        }
+        gen.close()
+    finally:
+        app.shutdown()
+    for name, r in out.items():
+        print(f"micro     {name:<24}{json.dumps(r)}", flush=True)
+    return out
+
+
+# ========= 比較 =========
+def compare(old: dict, new: dict):
+    print(f"\ncompare {old.get('commit')} → {new.get('commit')}")
+    print(f"{'mode':<10}{'endpoint':<16}{'clients':>8}{'req/s':>20}{'p95 ms':>20}")
+    for mode, endpoints in new.get("http", {}).items():
+        for name, by_clients in endpoints.items():
+            if not isinstance(by_clients, dict):
+                continue
+            for clients, r in by_clients.items():
+                o = old.get("http", {}).get(mode, {}).get(name, {}).get(clients)
+                if not o:
+                    continue
+                print(
+                    f"{mode:<10}{name:<16}{clients:>8}{_delta(o['rps'], r['rps']):>20}"
+                    f"{_delta(o['p95_ms'], r['p95_ms']):>20}"
+                )
+    for name, r in new.get("micro", {}).items():
+        o = old.get("micro", {}).get(name)
+        key = "p50_ms" if "p50_ms" in r else "cpu_ms_per_frame"
+        if o and key in o:
+            print(f"micro     {name:<24}{key:<18}{_delta(o[key], r[key]):>20}")
+
+
+def _delta(old, new) -> str:
+    if not old or new is None:
+        return f"{old} → {new}"
+    return f"{old} → {new} ({(new - old) / old * 100:+.0f}%)"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", default="gunicorn", help="comma separated: dev,gunicorn")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"comma separated: {','.join(ENDPOINTS)}")
+    parser.add_argument("--clients", default="1,8,32", help="comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per endpoint and concurrency level")
+    parser.add_argument("--threads", type=int, default=32, help="GUNICORN_THREADS for the gunicorn mode")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--iterations", type=int, default=200, help="micro-benchmark iterations")
+    parser.add_argument("--http-only", action="store_true")
+    parser.add_argument("--micro-only", action="store_true")
+    parser.add_argument("--no-simulate", dest="simulate", action="store_false", help="use the current hardware / env")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    args = parser.parse_args()
+    args.modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    args.endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    args.clients = [int(c) for c in args.clients.split(",")]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    results = {
+        "commit": _git_commit(),
+        "timestamp": time.time(),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": {
+            "modes": args.modes,
+            "endpoints": args.endpoints,
+            "clients": args.clients,
+            "duration": args.duration,
+            "iterations": args.iterations,
+            "simulate": args.simulate,
+        },
+    }
+    if not args.micro_only:
+        results["http"] = run_http(args)
+    if not args.http_only:
+        results["micro"] = run_micro(args)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
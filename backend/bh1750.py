@@ -0,0 +1,141 @@
+"""BH1750 光照感測器（I2C）連續模式讀取器。
+
+以前每次讀都重送 POWER_ON + 模式指令，再 sleep 0.22 秒 × 3 次（約 0.7 秒）。
+其實連續模式下晶片自己會一直量，只要：
+  1) 第一次找到位址、送 POWER_ON + 連續模式（只做一次）
+  2) 之後每次只讀 2 bytes，就是最新一次轉換結果（幾 ms）
+"""
+import threading
+import time
+from collections import deque
+
+try:
+    from smbus2 import i2c_msg
+except ImportError:
+    i2c_msg = None
+
+BH1750_ADDRS = [0x23, 0x5C]  # 常見位址：ADDR 腳對 GND → 0x23；對 VCC → 0x5C
+CMD_POWER_ON = 0x01          # 開電源（有些模組上電後需顯式 POWER ON）
+
+# 模式：(指令, 最長轉換時間秒, 每 count 的 lux 除數)
+#   hres  : 1 lx 解析度，約 120ms（最長 180ms）
+#   hres2 : 0.5 lx 解析度，約 120ms，適合很暗的環境
+#   lres  : 4 lx 解析度，約 16ms（最長 24ms），反應最快
+MODES = {
+    "hres": (0x10, 0.18, 1.2),
+    "hres2": (0x11, 0.18, 2.4),
+    "lres": (0x13, 0.024, 1.2),
+}
+
+# 找不到感測器時，隔多久再重新探測一次
+REPROBE_SEC = 5.0
+
+
+class BH1750Reader:
+    def __init__(self, bus, mode: str = "hres", avg_window: int = 1, addrs=None):
+        if mode not in MODES:
+            raise ValueError(f"unknown BH1750 mode: {mode} (choose from {list(MODES)})")
+        self.bus = bus
+        self.mode = mode
+        self.addrs = list(addrs or BH1750_ADDRS)
+        self.addr = None  # 探測到的位址
+
+        self._lock = threading.Lock()
+        self._last_probe = 0.0
+        self._ready_at = 0.0  # 切模式後第一筆轉換完成的時間
+        # 滾動平均用的 ring buffer（avg_window=1 就是不平均）
+        self._window = deque(maxlen=max(1, int(avg_window)))
+
+        # 統計
+        self.reads = 0
+        self.failures = 0
+        self.last_latency_ms = None
+        self.last_error = None
+
+    def _probe(self):
+        """找位址並進入連續模式（只在第一次或出錯後做）。"""
+        self._last_probe = time.monotonic()
+        cmd, conv_sec, _ = MODES[self.mode]
+        last_error = None
+        for addr in self.addrs:
+            try:
+                self.bus.write_byte(addr, CMD_POWER_ON)
+                self.bus.write_byte(addr, cmd)
+                self.addr = addr
+                self._window.clear()
+                self._ready_at = time.monotonic() + conv_sec
+                print(f"[BH1750] found addr=0x{addr:02X} mode={self.mode}", flush=True)
+                return True
+            except Exception as e:
+                last_error = e
+        self.addr = None
+        self.last_error = str(last_error)
+        print("BH1750 probe error:", last_error)
+        print("👉 提示：請用 'i2cdetect -y 1' 確認位址是否為 0x23 或 0x5C；檢查 I2C 是否啟用、接線與 3.3V 供電。")
+        return False
+
+    def set_mode(self, mode: str):
+        """切換解析度模式（會重新送模式指令）。"""
+        if mode not in MODES:
+            raise ValueError(f"unknown BH1750 mode: {mode} (choose from {list(MODES)})")
+        with self._lock:
+            self.mode = mode
+            if self.addr is not None:
+                cmd, conv_sec, _ = MODES[mode]
+                self.bus.write_byte(self.addr, cmd)
+                self._window.clear()
+                self._ready_at = time.monotonic() + conv_sec
+
+    def _read_raw(self) -> int:
+        if i2c_msg is not None:
+            # 純讀 2 bytes，不送任何指令（連續模式下就是最新結果）
+            msg = i2c_msg.read(self.addr, 2)
+            self.bus.i2c_rdwr(msg)
+            hi, lo = list(msg)
+        else:
+            hi, lo = self.bus.read_i2c_block_data(self.addr, MODES[self.mode][0], 2)
+        return (hi << 8) | lo
+
+    def read(self):
+        """回傳 lux（有開平均就是 ring buffer 內的平均），失敗回 None。"""
+        if self.bus is None:
+            return None
+        with self._lock:
+            if self.addr is None:
+                if self._last_probe and time.monotonic() - self._last_probe < REPROBE_SEC:
+                    return None
+                if not self._probe():
+                    return None
+
+            # 剛進連續模式時第一筆轉換還沒好（只有啟動 / 切模式後會等一次）
+            wait = self._ready_at - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            t0 = time.perf_counter()
+            try:
+                raw = self._read_raw()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print("BH1750 read error:", e)
+                # 下一次重新探測（可能被拔掉或重新上電）
+                self.addr = None
+                return None
+            finally:
+                self.reads += 1
+                self.last_latency_ms = (time.perf_counter() - t0) * 1000
+
+            self._window.append(raw / MODES[self.mode][2])
+            return sum(self._window) / len(self._window)
+
+    def stats(self) -> dict:
+        return {
+            "addr": f"0x{self.addr:02X}" if self.addr is not None else None,
+            "mode": self.mode,
+            "avg_window": self._window.maxlen,
+            "reads": self.reads,
+            "failures": self.failures,
+            "last_latency_ms": round(self.last_latency_ms, 2) if self.last_latency_ms is not None else None,
+            "last_error": self.last_error,
+        }
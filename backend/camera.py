@@ -1,138 +1,919 @@
-from flask import Blueprint, Response, jsonify, request, send_from_directory
-# 避免與主應用的 Picamera2 衝突：這個模組改為延遲初始化
-import cv2
-import time
+"""相機服務：整個 backend 唯一擁有 Picamera2 的地方。
+
+以前 app.py 的 PICAM（still 設定）和這個檔案的 picam2（video 設定）會互搶相機，
+拍照失敗時還會抱著鎖 sleep 重建好幾秒，其他相機請求全部卡住。
+
+現在改成：
+- 一個設定同時開兩條 stream：lores（預覽用小畫面）+ main（全解析度拍照用）
+- 只有一條背景執行緒跟相機講話（capture_request），每一幀都更新預覽；
+  有人要拍照時，就從「同一個 request」的 main stream 存檔，預覽不會中斷
+- 相機出錯時由背景執行緒自己關掉、退避後重開，呼叫端不會被鎖住
+"""
+import asyncio
 import os
-from threading import Lock
+import subprocess
+import threading
+import time
 import logging
 
-camera_bp = Blueprint("camera", __name__)
+from aio_bridge import AsyncNotifier, wait_event
+from metrics import counter, counter_func, gauge_func, histogram, log_every
+
+# lores 給預覽（Pi 4 的 lores 只能是 YUV420），main 給拍照
+PREVIEW_SIZE = tuple(int(v) for v in os.getenv("CAMERA_PREVIEW_SIZE", "640x480").split("x"))
+STILL_SIZE = tuple(int(v) for v in os.getenv("CAMERA_STILL_SIZE", "1920x1440").split("x"))
+JPEG_QUALITY = int(os.getenv("CAMERA_JPEG_QUALITY", "90"))
+
+# 拍照最多等多久（正常只要等下一幀，約幾十 ms）
+STILL_TIMEOUT = 3.0
+# 相機出錯後重開的退避時間（秒）
+RETRY_MIN_SEC = 0.5
+RETRY_MAX_SEC = 10.0
+# 沒人要畫面超過這麼久就停掉相機（省電 / 省 CPU），有人要再開
+IDLE_STOP_SEC = float(os.getenv("CAMERA_IDLE_STOP_SEC", "10"))
+# 相機剛啟動時前幾幀曝光還沒收斂，拍照要等幾幀之後
+WARMUP_FRAMES = 5
+
+
+# /metrics：拍照、編碼時間；幀數 / fps 在抓 /metrics 時才從 stats 讀（見檔尾）
+CAPTURE_SECONDS = histogram("smartplant_camera_capture_seconds", "Full-resolution still capture time", ("result",))
+ENCODE_SECONDS = histogram("smartplant_camera_encode_seconds", "JPEG encode time per frame", ("kind",))
+ENCODE_ERRORS = counter("smartplant_mjpeg_encode_errors_total", "MJPEG frames that failed to encode")
+SHIFTS = counter("smartplant_mjpeg_shifts_total", "MJPEG client quality / fps shifts", ("direction",))
+FRAMES_SENT = counter("smartplant_mjpeg_frames_sent_total", "MJPEG frames written to clients")
+
+# 預覽幀 ring buffer 的格數（編碼者最多可以落後這麼多幀，畫面才會被覆寫）
+RING_SIZE = 4
 
-# 延遲初始化的 picam2 實例（只有在端點被使用時才建立）
-picam2 = None
 
-frame_lock = Lock()
-latest_frame = None
+def _log(msg: str):
+    print(f"[CAMERA] {msg}", flush=True)
 
-PHOTO_DIR = "./photos"
-os.makedirs(PHOTO_DIR, exist_ok=True)
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+class FrameRing:
+    """預先配置好的幾塊 numpy buffer，輪流放最新的預覽幀。
 
-def _ensure_camera_started():
-    """Lazy start Picamera2 for this blueprint only if enabled explicitly.
-    為避免與主 app 的單例衝突，僅在環境變數 ENABLE_CAMERA_BP=1 時啟用。
+    擷取時只有一次 memcpy（相機 buffer → ring），不會每幀配置新陣列；
+    讀的人拿到的是 ring 裡的那一格，用完可以用 valid(seq) 確認它還沒被覆寫。
     """
-    global picam2
-    if os.environ.get("ENABLE_CAMERA_BP", "0") != "1":
-        raise RuntimeError("camera blueprint disabled; set ENABLE_CAMERA_BP=1 to enable")
-    if picam2 is None:
-        from picamera2 import Picamera2
+
+    def __init__(self, size: int = RING_SIZE):
+        self.size = size
+        self._bufs = None
+        self._seqs = [0] * size
+
+    def put(self, src, seq: int):
+        import numpy as np
+        if self._bufs is None or self._bufs[0].shape != src.shape:
+            self._bufs = [np.empty(src.shape, dtype=np.uint8) for _ in range(self.size)]
+            self._seqs = [0] * self.size
+        i = seq % self.size
+        self._seqs[i] = 0  # 寫入中
+        np.copyto(self._bufs[i], src)
+        self._seqs[i] = seq
+        return self._bufs[i]
+
+    def valid(self, seq: int) -> bool:
+        return self._seqs[seq % self.size] == seq
+
+
+class _StillJob:
+    def __init__(self, path: str):
+        self.path = path
+        self.done = threading.Event()
+        self.error = None
+
+
+class CameraService:
+    def __init__(self):
+        self.picam2 = None
+        self.state = "stopped"  # stopped / starting / running / idle / error / unavailable
+        self.last_error = None
+
+        self._thread = None
+        self._stop = threading.Event()
+        self._jobs_lock = threading.Lock()
+        self._jobs: list[_StillJob] = []
+
+        # 需求：有人在看串流（hold）、有拍照工作、或最近有人要過畫面（want_frames）
+        self._demand = threading.Event()
+        self._holders = 0
+        self._demand_until = 0.0
+        self._streaming = False  # picam2 是否 start() 中
+        self._warm = 0  # 這次啟動後拿到幾幀
+
+        # 最新一幀預覽（YUV420，放在 ring 裡），給預覽 / 串流的人讀
+        self._ring = FrameRing()
+        self._mapped_array = None  # picamera2.MappedArray
+        self._frame_cond = threading.Condition()
+        self._frame = None
+        self._frame_seq = 0
+        self._frame_ts = None
+
+        # 統計
+        self.frames = 0
+        self.fps = 0.0
+        self.restarts = 0
+        self.stills_ok = 0
+        self.stills_failed = 0
+        self._still_ms_total = 0.0
+
+    # ========= 相機開關 =========
+    def _open(self):
+        from picamera2 import Picamera2, MappedArray
+        self._mapped_array = MappedArray
         picam2 = Picamera2()
-        picam2.configure(
-            picam2.create_video_configuration(
-                main={"size": (640, 480), "format": "RGB888"}
-            )
+        config = picam2.create_video_configuration(
+            main={"size": STILL_SIZE, "format": "RGB888"},
+            lores={"size": PREVIEW_SIZE, "format": "YUV420"},
+            buffer_count=4,
         )
+        picam2.configure(config)
+        picam2.options["quality"] = JPEG_QUALITY
         picam2.start()
+        self.picam2 = picam2
+        self._streaming = True
+        self._warm = 0
+        _log(f"started main={STILL_SIZE} lores={PREVIEW_SIZE}")
+
+    def _close(self):
+        picam2, self.picam2 = self.picam2, None
+        self._streaming = False
+        if picam2 is None:
+            return
+        try:
+            picam2.stop()
+        except Exception:
+            pass
+        try:
+            # Picamera2.close() releases resources fully
+            picam2.close()
+        except Exception:
+            pass
+
+    def start(self):
+        """啟動背景擷取執行緒（重複呼叫不會多開）。不會阻塞，相機在背景開。"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="camera_loop")
+        self._thread.start()
+
+    def stop(self, timeout: float = 3.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close()
+        self._fail_jobs("camera stopped")
+        self.state = "stopped"
 
+    @property
+    def running(self) -> bool:
+        return self.state == "running"
 
-# ========= 背景抓影像（按需啟動） =========
-def camera_loop():
-    global latest_frame
-    while True:
-        frame = picam2.capture_array()
-        with frame_lock:
-            latest_frame = frame
-        time.sleep(0.03)  # ~30fps
+    # ========= 需求（沒人要畫面就暫停相機） =========
+    def hold(self):
+        """開始需要連續畫面（例如一個串流觀看者），記得配對 release()。"""
+        with self._jobs_lock:
+            self._holders += 1
+        self._demand.set()
+        self.start()
 
-def _ensure_loop_running():
-    import threading
-    # 啟用時才開背景執行緒
-    if os.environ.get("ENABLE_CAMERA_BP", "0") == "1":
-        if not any(isinstance(t, threading.Thread) and t.name == "camera_loop" for t in threading.enumerate()):
-            th = threading.Thread(target=camera_loop, daemon=True, name="camera_loop")
-            th.start()
+    def release(self):
+        with self._jobs_lock:
+            self._holders = max(0, self._holders - 1)
+            # 最後一個人離開後再多跑一下，避免重新整理頁面時相機一直開開關關
+            self._demand_until = max(self._demand_until, time.monotonic() + IDLE_STOP_SEC)
+
+    def want_frames(self, seconds: float = IDLE_STOP_SEC):
+        """接下來 seconds 秒內需要畫面（單次快照之類的用途）。"""
+        with self._jobs_lock:
+            self._demand_until = max(self._demand_until, time.monotonic() + seconds)
+        self._demand.set()
+        self.start()
+
+    def _wanted(self) -> bool:
+        return self._holders > 0 or bool(self._jobs) or time.monotonic() < self._demand_until
+
+    def _pause_if_idle(self) -> bool:
+        """沒有需求就停掉相機並等待，回傳 True 代表這一輪不用擷取。"""
+        if self._wanted():
+            if not self._streaming:
+                self.picam2.start()
+                self._streaming = True
+                self._warm = 0
+                self.state = "running"
+                _log("resumed")
+            return False
+        if self._streaming:
+            self.picam2.stop()
+            self._streaming = False
+            self.state = "idle"
+            _log("idle, camera paused")
+        self._demand.clear()
+        if not self._wanted():
+            self._demand.wait(1.0)
+        return True
+
+    # ========= 背景擷取 =========
+    def _loop(self):
+        backoff = RETRY_MIN_SEC
+        while not self._stop.is_set():
+            if self.picam2 is None:
+                self.state = "starting"
+                try:
+                    self._open()
+                    backoff = RETRY_MIN_SEC
+                    self.state = "running"
+                except ImportError as e:
+                    # 沒有 picamera2：拍照改走 libcamera-still，預覽不可用
+                    self.state = "unavailable"
+                    self.last_error = f"picamera2 not importable: {e}"
+                    _log(self.last_error)
+                    self._fail_jobs(self.last_error)
+                    return
+                except Exception as e:
+                    self._on_error(f"open failed: {e}")
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, RETRY_MAX_SEC)
+                    continue
+
+            try:
+                if self._pause_if_idle():
+                    continue
+                self._capture_one()
+            except Exception as e:
+                self._on_error(f"capture error: {e}")
+                self._close()
+                self.restarts += 1
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, RETRY_MAX_SEC)
+
+    def _on_error(self, msg: str):
+        self.state = "error"
+        self.last_error = msg
+        _log(msg)
+        # 等著拍照的人直接回錯，不要讓他們卡到 timeout
+        self._fail_jobs(msg)
+
+    def _capture_one(self):
+        request = self.picam2.capture_request()
+        try:
+            # 直接從相機的 DMA buffer 複製進預先配置的 ring（不經過 make_array 的新陣列）
+            seq = self._frame_seq + 1
+            with self._mapped_array(request, "lores") as m:
+                frame = self._ring.put(m.array, seq)
+            now = time.time()
+            with self._frame_cond:
+                if self._frame_ts is not None:
+                    dt = now - self._frame_ts
+                    if dt > 0:
+                        self.fps = 0.9 * self.fps + 0.1 * (1.0 / dt)
+                self._frame = frame
+                self._frame_ts = now
+                self._frame_seq = seq
+                self.frames += 1
+                self._frame_cond.notify_all()
+
+            self._warm += 1
+            if self._warm < WARMUP_FRAMES:
+                return
+            with self._jobs_lock:
+                jobs, self._jobs = self._jobs, []
+            for job in jobs:
+                try:
+                    request.save("main", job.path)
+                    if not os.path.exists(job.path):
+                        raise RuntimeError("picamera2 did not create file")
+                except Exception as e:
+                    job.error = f"picamera2 save failed: {e}"
+                job.done.set()
+        finally:
+            request.release()
+
+    def _fail_jobs(self, msg: str):
+        with self._jobs_lock:
+            jobs, self._jobs = self._jobs, []
+        for job in jobs:
+            job.error = msg
+            job.done.set()
+
+    # ========= 預覽 =========
+    @property
+    def warmed_up(self) -> bool:
+        """這次啟動後已經過了暖機幀（曝光 / 白平衡穩定了）。"""
+        return self._warm >= WARMUP_FRAMES
+
+    def frame_valid(self, seq: int) -> bool:
+        """seq 那一幀的 ring 格子還沒被新畫面覆寫。"""
+        return self._ring.valid(seq)
+
+    def latest_frame(self):
+        """回傳 (seq, ts, YUV420 frame)；還沒有畫面時 frame 是 None。
+
+        frame 是 ring 裡的一格（不是複本），RING_SIZE 幀之後會被覆寫。
+        """
+        with self._frame_cond:
+            return self._frame_seq, self._frame_ts, self._frame
+
+    def wait_frame(self, after_seq: int, timeout: float = 1.0):
+        """等到比 after_seq 新的一幀（或逾時），回傳同 latest_frame()。"""
+        with self._frame_cond:
+            self._frame_cond.wait_for(lambda: self._frame_seq > after_seq, timeout=timeout)
+            return self._frame_seq, self._frame_ts, self._frame
+
+    # ========= 拍照 =========
+    def capture_still(self, path: str):
+        """拍一張全解析度 JPEG 到 path。
+
+        相機服務在跑 → 從下一幀的 main stream 存檔（不會打斷預覽）；
+        沒有 picamera2 → 改用 libcamera-still。失敗丟 RuntimeError / FileNotFoundError。
+        """
+        t0 = time.perf_counter()
+        try:
+            if self.state == "unavailable":
+                _capture_libcamera(path)
+            else:
+                self.start()
+                job = _StillJob(path)
+                with self._jobs_lock:
+                    self._jobs.append(job)
+                self._demand.set()
+                if self.state == "unavailable":
+                    # 背景執行緒剛好判定沒有 picamera2 並結束了
+                    self._fail_jobs(self.last_error)
+                if not job.done.wait(STILL_TIMEOUT):
+                    with self._jobs_lock:
+                        if job in self._jobs:
+                            self._jobs.remove(job)
+                    raise RuntimeError(f"camera capture timeout ({self.state}: {self.last_error})")
+                if job.error:
+                    if self.state == "unavailable":
+                        _capture_libcamera(path)
+                    else:
+                        raise RuntimeError(job.error)
+        except Exception:
+            self.stills_failed += 1
+            CAPTURE_SECONDS.labels(result="error").observe(time.perf_counter() - t0)
+            raise
+        self.stills_ok += 1
+        self._still_ms_total += (time.perf_counter() - t0) * 1000
+        CAPTURE_SECONDS.labels(result="ok").observe(time.perf_counter() - t0)
+
+    # ========= 健康狀態 =========
+    def stats(self) -> dict:
+        _, ts, _ = self.latest_frame()
+        return {
+            "state": self.state,
+            "last_error": self.last_error,
+            "preview_size": list(PREVIEW_SIZE),
+            "still_size": list(STILL_SIZE),
+            "frames": self.frames,
+            "fps": round(self.fps, 1),
+            "last_frame_age": round(time.time() - ts, 3) if ts else None,
+            "restarts": self.restarts,
+            "stills_ok": self.stills_ok,
+            "stills_failed": self.stills_failed,
+            "still_avg_ms": round(self._still_ms_total / self.stills_ok, 1) if self.stills_ok else None,
+            "pending_stills": len(self._jobs),
+            "holders": self._holders,
+        }
+
+
+def _libcamera_cmd(path: str) -> list:
+    # -o path : output file
+    # -t 500 : short preview time in ms
+    # --width/--height can be omitted to let libcamera pick defaults
+    return [
+        "libcamera-still",
+        "-o", path,
+        "-t", "500",
+        "--immediate",  # capture immediately without lengthy preview
+        "-q", str(JPEG_QUALITY),
+    ]
+
+
+def _capture_libcamera(path: str):
+    """Fallback: libcamera-still via subprocess (available on Raspberry Pi OS)."""
+    cmd = _libcamera_cmd(path)
+    _log(f"running fallback: {' '.join(cmd)}")
+    try:
+        # Run with a timeout to avoid hanging
+        subprocess.run(cmd, check=True, timeout=10, capture_output=True)
+    except FileNotFoundError:
+        raise FileNotFoundError("neither picamera2 nor libcamera-still is available")
+    except subprocess.TimeoutExpired as te:
+        raise RuntimeError(f"libcamera-still timeout: {te}")
+    except subprocess.CalledProcessError as cpe:
+        err = cpe.stderr.decode() if getattr(cpe, "stderr", None) else str(cpe)
+        raise RuntimeError(f"libcamera-still failed: {err}")
+    if not os.path.exists(path):
+        raise RuntimeError("libcamera-still did not create file")
+    _log("libcamera-still capture success")
+
+
+async def capture_libcamera_async(path: str):
+    """_capture_libcamera 的 async 版：用 asyncio 子行程，等待時不佔執行緒。"""
+    cmd = _libcamera_cmd(path)
+    _log(f"running fallback: {' '.join(cmd)}")
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError:
+        raise FileNotFoundError("neither picamera2 nor libcamera-still is available")
+    try:
+        _, stderr = await asyncio.wait_for(proc.communicate(), timeout=10)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise RuntimeError("libcamera-still timeout")
+    if proc.returncode != 0:
+        raise RuntimeError(f"libcamera-still failed: {stderr.decode(errors='replace')}")
+    if not os.path.exists(path):
+        raise RuntimeError("libcamera-still did not create file")
+    _log("libcamera-still capture success")
 
 
 # ========= 即時串流（MJPEG） =========
-def mjpeg_generator():
-    logging.info("Starting MJPEG generator...")
-    while True:
-        with frame_lock:
-            if latest_frame is None:
-                logging.warning("No frame available for MJPEG generator.")
-                continue
-            frame = latest_frame.copy()
+# simplejpeg（會一起載入 numpy）第一次編碼才 import，不拖慢 app 啟動；startup 會在背景先暖好
+_simplejpeg = None
 
+
+def jpeg_codec():
+    """回傳 simplejpeg 模組；沒裝就回 None（改用 opencv）。"""
+    global _simplejpeg
+    if _simplejpeg is None:
         try:
-            _, jpeg = cv2.imencode(".jpg", frame)
-            yield (
-                b"--frame\r\n"
-                b"Content-Type: image/jpeg\r\n\r\n" +
-                jpeg.tobytes() +
-                b"\r\n"
+            import simplejpeg
+            _simplejpeg = simplejpeg
+        except ImportError:
+            _simplejpeg = False
+    return _simplejpeg or None
+
+
+def yuv420_planes(frame):
+    """把 (h*3/2, w) 的 I420 切成 Y / U / V 三個 view（不複製）。"""
+    h = frame.shape[0] * 2 // 3
+    w = frame.shape[1]
+    y = frame[:h]
+    u = frame[h:h + h // 4].reshape(h // 2, w // 2)
+    v = frame[h + h // 4:].reshape(h // 2, w // 2)
+    return y, u, v
+
+
+def encode_yuv420(frame, quality: int, scale: int = 1, out=None) -> bytes:
+    """把 lores 的 YUV420（I420，形狀 (h*3/2, w)）直接編成 JPEG，不用先轉 RGB。
+
+    scale=2 / 4 時每隔幾個像素取一個（縮成 1/2、1/4 大小），
+    out 可以給預先配置好的 (y, u, v) 縮小後 buffer，避免每幀配置。
+    """
+    y, u, v = yuv420_planes(frame)
+    if scale > 1:
+        import numpy as np
+        if out is None:
+            out = tuple(np.empty(p[::scale, ::scale].shape, dtype=np.uint8) for p in (y, u, v))
+        for dst, src in zip(out, (y, u, v)):
+            np.copyto(dst, src[::scale, ::scale])
+        y, u, v = out
+    codec = jpeg_codec()
+    if codec is not None:
+        return codec.encode_jpeg_yuv_planes(y, u, v, quality=quality, fastdct=True)
+    import cv2  # 沒有 simplejpeg 才退回 opencv
+    import numpy as np
+    i420 = np.concatenate([y.reshape(-1), u.reshape(-1), v.reshape(-1)]).reshape(-1, y.shape[1])
+    bgr = cv2.cvtColor(i420, cv2.COLOR_YUV420p2BGR)
+    _, jpeg = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return jpeg.tobytes()
+
+
+# 串流可選的畫質（由好到差）；前端要求的值會對到最接近的一檔，落後時往下降
+QUALITY_TIERS = (85, 70, 50, 35)
+SCALES = (1, 2, 4)  # lores 的 1、1/2、1/4 大小
+MAX_STREAM_FPS = 30
+
+
+class MjpegBroadcaster:
+    """某一個 (縮放, 畫質) 組合的串流：每一幀只編碼一次，所有觀看者共用同一份 JPEG bytes。
+
+    只有一條編碼執行緒，而且只在有人看的時候才工作；觀看者在 Condition 上等下一幀，
+    沒有新畫面時不耗 CPU。慢的觀看者會直接跳到最新一幀（不會累積延遲）。
+    async 觀看者（asgi.py）改在 notifier 上等，不佔執行緒。
+    """
+
+    def __init__(self, service: CameraService, quality: int = 80, scale: int = 1):
+        self.service = service
+        self.quality = quality
+        self.scale = scale
+
+        self._cond = threading.Condition()
+        self._wanted = threading.Event()
+        self._thread = None
+        self._seq = 0
+        self._ts = None
+        self._jpeg = None
+        self._part = None  # 已包好 multipart 標頭的一段
+        self._scaled = None  # 縮小用的預先配置 buffer
+        self._scaled_for = None
+        self.notifier = AsyncNotifier()
+
+        # 統計
+        self.subscribers = 0
+        self.frames_encoded = 0
+        self.frames_dropped = 0
+        self._encode_ms_total = 0.0
+        self._encode_hist = ENCODE_SECONDS.labels(kind="mjpeg")
+
+    def _loop(self):
+        last = 0
+        while True:
+            self._wanted.wait()
+            seq, ts, frame = self.service.wait_frame(last, timeout=1.0)
+            if frame is None or seq == last:
+                continue
+            last = seq
+            try:
+                t0 = time.perf_counter()
+                if self.scale > 1 and self._scaled_for != frame.shape:
+                    import numpy as np
+                    self._scaled = tuple(
+                        np.empty(p[::self.scale, ::self.scale].shape, dtype=np.uint8) for p in yuv420_planes(frame)
+                    )
+                    self._scaled_for = frame.shape
+                jpeg = encode_yuv420(frame, self.quality, self.scale, out=self._scaled)
+                spent = time.perf_counter() - t0
+                self._encode_ms_total += spent * 1000
+                self._encode_hist.observe(spent)
+                self.frames_encoded += 1
+            except Exception as e:
+                # 每一幀都會失敗的話不要洗版：次數看 /metrics，log 只偶爾印
+                n = ENCODE_ERRORS.inc()
+                if log_every(n):
+                    logging.error(f"Error encoding MJPEG frame (#{n}): {e}")
+                continue
+            if not self.service.frame_valid(seq):
+                # 編碼途中 ring 那一格已經被新畫面蓋掉（編碼太慢），這張丟掉
+                self.frames_dropped += 1
+                continue
+            part = (
+                b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                + str(len(jpeg)).encode()
+                + b"\r\n\r\n" + jpeg + b"\r\n"
+            )
+            with self._cond:
+                self._seq, self._ts, self._jpeg, self._part = seq, ts, jpeg, part
+                self._cond.notify_all()
+            self.notifier.notify_all()
+            if self.subscribers == 0:
+                self._wanted.clear()
+
+    def join(self):
+        with self._cond:
+            self.subscribers += 1
+        self.service.hold()
+        self._wanted.set()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._loop, daemon=True, name=f"mjpeg_encoder_s{self.scale}_q{self.quality}"
             )
-            logging.debug("MJPEG frame generated.")
-        except Exception as e:
-            logging.error(f"Error in MJPEG generator: {e}")
-        time.sleep(0.03)
-
-
-@camera_bp.route("/camera/stream")
-def camera_stream():
-    logging.info("/camera/stream endpoint called.")
-    api_key = request.args.get("api_key")
-    if api_key != os.environ.get("WATER_API_KEY"):
-        logging.warning("Unauthorized access to /camera/stream.")
-        return "Unauthorized", 401
-
-    # Ensure picamera2 is initialized
-    global picam2
+            self._thread.start()
+
+    def leave(self):
+        with self._cond:
+            self.subscribers -= 1
+        self.service.release()
+
+    def next_part(self, seen: int, timeout: float = 5.0):
+        """等比 seen 新的一段，回傳 (seq, part)；逾時 part 是 None。"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != seen, timeout=timeout)
+            if self._seq == seen:
+                return seen, None
+            return self._seq, self._part
+
+    def peek(self, seen: int):
+        """不等待版的 next_part：沒有比 seen 新的就回傳 (seen, None)。"""
+        with self._cond:
+            if self._seq == seen:
+                return seen, None
+            return self._seq, self._part
+
+    def latest(self):
+        """最新一幀的 (jpeg, ts)，同一把鎖裡一起拿（不會拿到新的時間配舊的畫面）；還沒有就 (None, None)。"""
+        with self._cond:
+            return self._jpeg, self._ts
+
+    def stats(self) -> dict:
+        return {
+            "scale": self.scale,
+            "quality": self.quality,
+            "subscribers": self.subscribers,
+            "frames_encoded": self.frames_encoded,
+            "frames_dropped": self.frames_dropped,
+            "encode_avg_ms": round(self._encode_ms_total / self.frames_encoded, 2) if self.frames_encoded else None,
+        }
+
+
+_broadcasters: dict = {}
+_broadcasters_lock = threading.Lock()
+
+
+def get_broadcaster(scale: int, quality: int) -> MjpegBroadcaster:
+    key = (scale, quality)
+    with _broadcasters_lock:
+        b = _broadcasters.get(key)
+        if b is None:
+            b = _broadcasters[key] = MjpegBroadcaster(camera_service, quality=quality, scale=scale)
+        return b
+
+
+def negotiate_stream(fps=None, width=None, quality=None) -> dict:
+    """把前端給的 fps / 寬度 / 畫質對到伺服器支援的檔位。"""
+    try:
+        fps = max(1.0, min(float(fps), MAX_STREAM_FPS)) if fps else 15.0
+    except ValueError:
+        fps = 15.0
+    scale = 1
+    try:
+        if width:
+            want = int(width)
+            # 挑寬度 ≥ 要求的最小一檔（要求比 1/4 還小就用 1/4）
+            scale = max((s for s in SCALES if PREVIEW_SIZE[0] // s >= want), default=SCALES[-1])
+    except ValueError:
+        pass
+    tier = 1
     try:
-        _ensure_camera_started()
-        _ensure_loop_running()
-    except Exception as e:
-        logging.error(f"Failed to initialize picamera2: {e}")
-        return jsonify(ok=False, error="no_camera_tool", detail=str(e)), 500
-
-    logging.info("Starting MJPEG stream.")
-    return Response(
-        mjpeg_generator(),
-        mimetype="multipart/x-mixed-replace; boundary=frame"
-    )
-
-
-# ========= 拍照 =========
-@camera_bp.route("/camera/capture", methods=["POST"])
-def camera_capture():
-    logging.info("/camera/capture endpoint called.")
-    api_key = request.headers.get("x-api-key")
-    if api_key != os.environ.get("WATER_API_KEY"):
-        logging.warning("Unauthorized access to /camera/capture.")
-        return jsonify(ok=False, error="unauthorized"), 401
+        if quality:
+            q = int(quality)
+            tier = min(range(len(QUALITY_TIERS)), key=lambda i: abs(QUALITY_TIERS[i] - q))
+    except ValueError:
+        pass
+    return {"fps": fps, "scale": scale, "tier": tier}
+
+
+# 連續幾幀寫出去比預定間隔慢就降一檔，連續幾幀都很順再升回去（不超過協商的上限）
+SLOW_FRAMES_TO_DOWNSHIFT = 5
+FAST_FRAMES_TO_UPSHIFT = 150
+
+
+class _StreamShaper:
+    """一個觀看者目前的 fps / 縮放 / 畫質，依每幀寫出去花多久升降檔（同步、async 串流共用）。
+
+    「寫出去花多久」比幀間隔慢就代表這個客戶端跟不上，先降畫質、再縮小畫面、最後降 fps；
+    一直很順再依相反順序升回去（不超過協商的上限）。
+    """
+
+    def __init__(self, fps: float, scale: int, tier: int):
+        self.max_fps, self.max_scale_i, self.max_tier = fps, SCALES.index(scale), tier
+        self.fps, self.scale_i, self.tier = fps, self.max_scale_i, tier
+        self.slow = self.fast = 0
+        self.broadcaster = get_broadcaster(SCALES[self.scale_i], QUALITY_TIERS[self.tier])
+        self.broadcaster.join()
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.fps
+
+    def sent(self, spent: float, interval: float) -> bool:
+        """記錄一幀花了 spent 秒寫出去；換了 broadcaster 回傳 True（呼叫端要重設 seen）。"""
+        if spent > interval:
+            self.slow, self.fast = self.slow + 1, 0
+        else:
+            self.slow, self.fast = 0, self.fast + 1
+
+        shifted = None
+        if self.slow >= SLOW_FRAMES_TO_DOWNSHIFT:
+            if self.tier < len(QUALITY_TIERS) - 1:
+                self.tier += 1
+            elif self.scale_i < len(SCALES) - 1:
+                self.scale_i += 1
+            elif self.fps > 1:
+                self.fps = max(1.0, self.fps / 2)
+            shifted = "down"
+        elif self.fast >= FAST_FRAMES_TO_UPSHIFT:
+            if self.fps < self.max_fps:
+                self.fps = min(self.max_fps, self.fps * 2)
+            elif self.scale_i > self.max_scale_i:
+                self.scale_i -= 1
+            elif self.tier > self.max_tier:
+                self.tier -= 1
+            shifted = "up"
+        if not shifted:
+            return False
+
+        self.slow = self.fast = 0
+        n = SHIFTS.labels(direction=shifted).inc()
+        if log_every(n):
+            logging.info(
+                f"MJPEG client shifted {shifted} (#{n}): fps={self.fps} scale={SCALES[self.scale_i]} q={QUALITY_TIERS[self.tier]}"
+            )
+        nb = get_broadcaster(SCALES[self.scale_i], QUALITY_TIERS[self.tier])
+        if nb is self.broadcaster:
+            return False
+        nb.join()
+        self.broadcaster.leave()
+        self.broadcaster = nb
+        return True
 
+    def close(self):
+        self.broadcaster.leave()
+
+
+def mjpeg_stream(fps: float = 15.0, scale: int = 1, tier: int = 1):
+    """單一觀看者的 multipart/x-mixed-replace generator（給 Flask Response 用）。
+
+    yield 之後才會回到這裡，所以「yield 花多久」≈ 把這一幀寫進 socket 花多久。
+    """
+    shaper = _StreamShaper(fps, scale, tier)
     try:
-        _ensure_camera_started()
-        _ensure_loop_running()
-    except Exception as e:
-        logging.error(f"Failed to initialize picamera2 for capture: {e}")
-        return jsonify(ok=False, error="no_camera_tool", detail=str(e)), 500
-
-    with frame_lock:
-        if latest_frame is None:
-            logging.error("No frame available for capture.")
-            return jsonify(ok=False, error="no frame"), 500
-        frame = latest_frame.copy()
-
-    filename = f"{int(time.time())}.jpg"
-    path = os.path.join(PHOTO_DIR, filename)
+        seen = 0
+        while True:
+            seen, part = shaper.broadcaster.next_part(seen)
+            if part is None:
+                if camera_service.state == "unavailable":
+                    return
+                continue
+
+            interval = shaper.interval
+            t0 = time.monotonic()
+            yield part
+            FRAMES_SENT.inc()
+            if shaper.sent(time.monotonic() - t0, interval):
+                seen = 0
+
+            # 限制這個客戶端的 fps（睡掉剩下的間隔，之後直接拿最新一幀）
+            remaining = interval - (time.monotonic() - t0)
+            if remaining > 0:
+                time.sleep(remaining)
+    finally:
+        shaper.close()
+
+
+async def amjpeg_stream(fps: float = 15.0, scale: int = 1, tier: int = 1):
+    """mjpeg_stream 的 async 版（給 asgi.py）：等新幀、限速都是 await，一個觀看者只是一個 coroutine。"""
+    shaper = _StreamShaper(fps, scale, tier)
+    b = shaper.broadcaster
+    ev = b.notifier.add()
     try:
-        cv2.imwrite(path, cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
-        logging.info(f"Photo saved to {path}.")
-    except Exception as e:
-        logging.error(f"Error saving photo: {e}")
-        return jsonify(ok=False, error="save_failed", detail=str(e)), 500
+        seen = 0
+        while True:
+            ev.clear()
+            seq, part = b.peek(seen)
+            if part is None:
+                if camera_service.state == "unavailable":
+                    return
+                await wait_event(ev, 5.0)
+                continue
+            seen = seq
+
+            interval = shaper.interval
+            t0 = time.monotonic()
+            yield part
+            FRAMES_SENT.inc()
+            if shaper.sent(time.monotonic() - t0, interval):
+                b.notifier.discard(ev)
+                b = shaper.broadcaster
+                ev = b.notifier.add()
+                seen = 0
+
+            remaining = interval - (time.monotonic() - t0)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+    finally:
+        b.notifier.discard(ev)
+        shaper.close()
+
+
+def stream_stats() -> dict:
+    with _broadcasters_lock:
+        profiles = [b.stats() for b in _broadcasters.values()]
+    return {
+        "encoder": "simplejpeg" if jpeg_codec() is not None else "opencv",
+        "subscribers": sum(p["subscribers"] for p in profiles),
+        "profiles": profiles,
+    }
+
+
+# ========= 單張預覽（/camera/stream 預設模式） =========
+# 記憶體裡的畫面多舊以內可以直接回（毫秒）
+SNAPSHOT_MAX_AGE_MS = float(os.getenv("SNAPSHOT_MAX_AGE_MS", "200"))
+
+
+class SnapshotSource:
+    """從記憶體拿最新一幀的 JPEG，取代每次 <img> 重新整理都拍一張全尺寸照片寫進 SD 卡。
+
+    1. 有人在看 MJPEG 而且同畫質的那一幀夠新 → 直接用 broadcaster 編好的 bytes
+    2. 上一次 snapshot 編的還夠新 → 直接回
+    3. 都沒有 → 只有一個請求（leader）去叫醒相機、等一幀新的、編碼一次；
+       同時進來的其他請求等 leader 的結果（coalesce），不會各自編碼
+    相機不能用（沒有 picamera2）丟 FileNotFoundError，呼叫端改走拍照。
+    """
+
+    def __init__(self, service: CameraService):
+        self.service = service
+        self._lock = threading.Lock()
+        self._cache = {}  # quality → (jpeg, ts)
+        self._inflight = {}  # quality → threading.Event
+
+        # 統計
+        self.hits = 0
+        self.encodes = 0
+        self.coalesced = 0
+
+    def peek(self, max_age: float, quality: int):
+        """不等待：記憶體裡有夠新的就回傳 (jpeg, ts)，否則 None。"""
+        now = time.time()
+        b = _broadcasters.get((1, quality))
+        if b is not None:
+            jpeg, ts = b.latest()
+            if ts is not None and now - ts <= max_age:
+                self.hits += 1
+                return jpeg, ts
+        c = self._cache.get(quality)
+        if c is not None and now - c[1] <= max_age:
+            self.hits += 1
+            return c
+        return None
+
+    def get(self, max_age: float = SNAPSHOT_MAX_AGE_MS / 1000, quality: int = QUALITY_TIERS[1],
+            timeout: float = STILL_TIMEOUT):
+        """回傳 (jpeg, ts)；逾時丟 RuntimeError。"""
+        if self.service.state == "unavailable":
+            raise FileNotFoundError(self.service.last_error or "camera unavailable")
+        hit = self.peek(max_age, quality)
+        if hit is not None:
+            return hit
+
+        with self._lock:
+            ev = self._inflight.get(quality)
+            leader = ev is None
+            if leader:
+                ev = self._inflight[quality] = threading.Event()
+            else:
+                self.coalesced += 1
+        if not leader:
+            ev.wait(timeout)
+            # leader 失敗 / 逾時的話快取裡可能是舊的：一樣要符合呼叫端要的 max_age
+            with self._lock:
+                c = self._cache.get(quality)
+            if c is None or time.time() - c[1] > max_age:
+                raise RuntimeError(f"snapshot timeout ({self.service.state}: {self.service.last_error})")
+            return c
+
+        try:
+            jpeg, ts = self._encode_fresh(max_age, quality, timeout)
+            with self._lock:
+                self._cache[quality] = (jpeg, ts)
+            return jpeg, ts
+        finally:
+            with self._lock:
+                self._inflight.pop(quality).set()
+
+    def _encode_fresh(self, max_age: float, quality: int, timeout: float):
+        self.service.start()
+        self.service.want_frames()
+        deadline = time.monotonic() + timeout
+        seq, ts, frame = self.service.latest_frame()
+        while True:
+            fresh = frame is not None and time.time() - ts <= max_age and self.service.warmed_up
+            if fresh:
+                with ENCODE_SECONDS.labels(kind="snapshot").time():
+                    jpeg = encode_yuv420(frame, quality)
+                # 編碼途中 ring 那一格被蓋掉就拿下一幀重來
+                if self.service.frame_valid(seq):
+                    self.encodes += 1
+                    return jpeg, ts
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.service.state == "unavailable":
+                raise RuntimeError(f"snapshot timeout ({self.service.state}: {self.service.last_error})")
+            seq, ts, frame = self.service.wait_frame(seq, timeout=min(remaining, 1.0))
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "encodes": self.encodes, "coalesced": self.coalesced}
+
+
+# 整個 backend 共用這一個
+camera_service = CameraService()
+snapshots = SnapshotSource(camera_service)
+
+
+def _broadcaster_metric(key: str) -> dict:
+    with _broadcasters_lock:
+        return {(str(b.scale), str(b.quality)): getattr(b, key) for b in _broadcasters.values()}
+
 
-    return jsonify(ok=True, url=f"/photos/{filename}")
\ No newline at end of file
+counter_func("smartplant_camera_frames_total", "Preview frames captured", lambda: camera_service.frames)
+gauge_func("smartplant_camera_fps", "Preview capture rate (moving average)", lambda: round(camera_service.fps, 2))
+counter_func(
+    "smartplant_mjpeg_frames_encoded_total", "MJPEG frames encoded per profile",
+    lambda: _broadcaster_metric("frames_encoded"), ("scale", "quality"),
+)
+counter_func(
+    "smartplant_mjpeg_frames_dropped_total", "MJPEG frames dropped because the ring slot was overwritten",
+    lambda: _broadcaster_metric("frames_dropped"), ("scale", "quality"),
+)
+gauge_func(
+    "smartplant_mjpeg_subscribers", "MJPEG viewers per profile",
+    lambda: _broadcaster_metric("subscribers"), ("scale", "quality"),
+)
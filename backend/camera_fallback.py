@@ -0,0 +1,174 @@
+"""相機壞掉時的處理：佔位圖快取 + 拍照斷路器。
+
+以前相機一掛，每個 /camera/capture、/camera/stream 請求都會：先讓硬體再失敗一次（等逾時），
+再用 PIL 畫一張 800x600 的佔位圖、編 JPEG、寫一個新檔到 photos/ —— 失敗比成功還貴，
+停機期間 SD 卡還一直被塞滿。現在：
+- PlaceholderCache：同一段錯誤訊息只畫一次，JPEG bytes 放記憶體（LRU），不寫檔；
+  網址只帶伺服器發的 key（訊息的 hash），不認得的 key 不畫（不然任何人都能拿一堆
+  不同的字串逼 Pi 一直畫圖、把快取洗掉）
+- CaptureBreaker：連續失敗 CAMERA_BREAKER_FAILURES 次就「斷開」，之後 back-off 時間內
+  直接丟 RuntimeError、不碰硬體；時間到放一個請求去試（half-open），成功就恢復，
+  又失敗就把 back-off 加倍（最多 CAMERA_BREAKER_MAX_SEC）
+"""
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PLACEHOLDER_CACHE_SIZE = int(os.getenv("PLACEHOLDER_CACHE_SIZE", "32"))
+# 記住幾個發出去的 key（只存訊息文字，比畫好的圖便宜很多）
+PLACEHOLDER_MAX_KEYS = int(os.getenv("PLACEHOLDER_MAX_KEYS", "256"))
+# 錯誤訊息太長就截斷（也當快取 key，避免任意長字串把記憶體吃掉）
+PLACEHOLDER_MAX_TEXT = 200
+BREAKER_FAILURES = int(os.getenv("CAMERA_BREAKER_FAILURES", "3"))
+BREAKER_SEC = float(os.getenv("CAMERA_BREAKER_SEC", "10"))
+BREAKER_MAX_SEC = float(os.getenv("CAMERA_BREAKER_MAX_SEC", "300"))
+
+# PIL 不能用時的備案：1x1 白點 JPEG
+_TINY_JPEG_B64 = (
+    "/9j/4AAQSkZJRgABAQAAAQABAAD/2wCEAAkGBxISEBUREBIVFhUVFRUVFRUVFRUVFRUWFhUVFRUYHSggGBolGxUVITEhJSkrLi4uFx8zODMtNygtLisBCgoKDg0OGxAQGy0lHyUtLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLf/AABEIAAEAAQMBIgACEQEDEQH/xAAWAAEBAQAAAAAAAAAAAAAAAAADAgT/EAB0QAQADAQEAAwAAAAAAAAAAAAECAxEEEiExQZH/2gAMAwEAAhEDEQA/AKuAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAf/9k="
+)
+
+
+def render_placeholder(text: str = "camera unavailable") -> bytes:
+    """畫一張佔位圖（JPEG bytes），讓前端還是有東西可以顯示。"""
+    try:
+        from PIL import Image, ImageDraw
+
+        img = Image.new("RGB", (800, 600), color=(240, 240, 240))
+        draw = ImageDraw.Draw(img)
+        draw.text((20, 20), text, fill=(0, 0, 0))
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=85)
+        return buf.getvalue()
+    except Exception:
+        return base64.b64decode(_TINY_JPEG_B64)
+
+
+class PlaceholderCache:
+    def __init__(self, size: int = PLACEHOLDER_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # text → (jpeg, etag)，最近用的在後面
+        self._keys = OrderedDict()  # key → text（issue() 發出去的）
+        self.hits = 0
+        self.renders = 0
+
+    @staticmethod
+    def clean(text: str) -> str:
+        return (text or "camera unavailable")[:PLACEHOLDER_MAX_TEXT]
+
+    def issue(self, text: str) -> str:
+        """登記一段（伺服器自己產生的）錯誤訊息，回傳放進網址的 key。"""
+        text = self.clean(text)
+        key = hashlib.sha1(text.encode()).hexdigest()[:16]
+        with self._lock:
+            self._keys[key] = text
+            self._keys.move_to_end(key)
+            while len(self._keys) > PLACEHOLDER_MAX_KEYS:
+                self._keys.popitem(last=False)
+        return key
+
+    def text(self, key: str) -> str | None:
+        """issue() 發過的 key → 訊息；不認得就 None。"""
+        with self._lock:
+            return self._keys.get(key)
+
+    def get(self, text: str):
+        """回傳 (jpeg bytes, etag)；沒畫過才畫（在鎖外畫，不擋其他訊息）。"""
+        text = self.clean(text)
+        with self._lock:
+            item = self._items.get(text)
+            if item is not None:
+                self._items.move_to_end(text)
+                self.hits += 1
+                return item
+        jpeg = render_placeholder(text)
+        item = (jpeg, hashlib.sha1(jpeg).hexdigest()[:16])
+        with self._lock:
+            self.renders += 1
+            self._items[text] = item
+            self._items.move_to_end(text)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        return item
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached": len(self._items), "size": self.size, "hits": self.hits, "renders": self.renders}
+
+
+class CaptureBreaker:
+    def __init__(self, failures: int = BREAKER_FAILURES, backoff: float = BREAKER_SEC, max_backoff: float = BREAKER_MAX_SEC):
+        self.failures = failures
+        self.base_backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._streak = 0  # 連續失敗次數
+        self._backoff = backoff
+        self._open_until = 0.0  # monotonic；> 0 表示斷開中
+        self._trial = False  # half-open：已經放一個請求去試了
+        self.last_error = None
+        self.rejected = 0
+        self.opened = 0
+
+    def check(self):
+        """斷開中就丟 RuntimeError（不碰硬體）；back-off 到了只放第一個請求去試。"""
+        with self._lock:
+            if not self._open_until:
+                return
+            if time.monotonic() < self._open_until or self._trial:
+                self.rejected += 1
+                # 訊息固定（不帶倒數秒數），佔位圖快取才打得中
+                raise RuntimeError(f"camera unavailable (circuit open): {self.last_error}")
+            self._trial = True
+
+    def succeeded(self):
+        with self._lock:
+            if self._open_until:
+                print("[CAMERA] breaker closed, camera is back", flush=True)
+            self._streak = 0
+            self._backoff = self.base_backoff
+            self._open_until = 0.0
+            self._trial = False
+
+    def failed(self, error):
+        with self._lock:
+            self.last_error = str(error)
+            self._streak += 1
+            if self._trial:
+                # half-open 試失敗：back-off 加倍再斷開
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+            elif self._streak < self.failures:
+                return
+            self._trial = False
+            self._open_until = time.monotonic() + self._backoff
+            self.opened += 1
+            print(f"[CAMERA] breaker open for {self._backoff:.0f}s after {self._streak} failures: {error}", flush=True)
+
+    def call(self, fn, *args):
+        """check() → fn(*args)，依結果記成功 / 失敗。"""
+        self.check()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self.failed(e)
+            raise
+        self.succeeded()
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            remaining = max(0.0, self._open_until - time.monotonic()) if self._open_until else 0.0
+            return {
+                "state": "closed" if not self._open_until else ("half_open" if remaining == 0 else "open"),
+                "retry_in": round(remaining, 1),
+                "streak": self._streak,
+                "backoff": self._backoff,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+            }
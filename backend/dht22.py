@@ -0,0 +1,134 @@
+"""常駐的 DHT22 讀取器。
+
+以前每次讀都要 import board / adafruit_dht、重新建 DHT22 物件、讀完再 exit()，
+而且常常撞到 DHT22「兩次讀取至少隔 2 秒」的限制，只好 sleep 重試好幾秒。
+這裡改成整個程式只建一次 driver（一直佔著這支腳），啟動時挑好能用的後端，
+間隔內的呼叫直接回傳上一筆好值。
+"""
+import threading
+import time
+
+
+class DHT22Reader:
+    # DHT22 規格：兩次量測至少間隔 2 秒
+    MIN_INTERVAL = 2.0
+
+    def __init__(self, pin: int, min_interval: float = MIN_INTERVAL):
+        self.pin = int(pin)
+        self.min_interval = float(min_interval)
+        self.backend = None  # "adafruit_dht" / "Adafruit_DHT" / None(都不能用)
+
+        self._lock = threading.Lock()
+        self._opened = False
+        self._device = None  # adafruit_dht.DHT22 實例
+        self._legacy = None  # Adafruit_DHT 模組
+
+        self._last_attempt = 0.0
+        self._last_good = (None, None)
+        self._last_good_at = None
+
+        # 統計
+        self.reads = 0
+        self.failures = 0
+        self.cached = 0
+        self.last_latency_ms = None
+        self.max_latency_ms = 0.0
+        self._total_latency_ms = 0.0
+
+    def _open(self):
+        """只做一次：挑可用的後端並建立 driver。"""
+        self._opened = True
+        # 先嘗試 adafruit_circuitpython_dht（CircuitPython 驅動）
+        try:
+            import board
+            import adafruit_dht
+            board_pin = getattr(board, f"D{self.pin}", None)
+            if board_pin is not None:
+                self._device = adafruit_dht.DHT22(board_pin, use_pulseio=False)
+                self.backend = "adafruit_dht"
+                print(f"[DHT22] backend=adafruit_dht pin={self.pin}", flush=True)
+                return
+        except Exception as e:
+            print(f"[DHT22] adafruit_dht unavailable: {e}", flush=True)
+
+        # 再嘗試傳統的 Adafruit_DHT
+        try:
+            import Adafruit_DHT
+            self._legacy = Adafruit_DHT
+            self.backend = "Adafruit_DHT"
+            print(f"[DHT22] backend=Adafruit_DHT pin={self.pin}", flush=True)
+        except Exception as e:
+            print(f"[DHT22] no usable backend: {e}", flush=True)
+
+    def _read_once(self):
+        if self._device is not None:
+            t = self._device.temperature
+            h = self._device.humidity
+            return h, t
+        if self._legacy is not None:
+            # 用單次 read（不是 read_retry），重試交給下一次呼叫，不在這裡 sleep
+            return self._legacy.read(self._legacy.DHT22, self.pin)
+        return None, None
+
+    def read(self):
+        """回傳 (humi, temp)，單位 (% , °C)。
+
+        距離上次真的去讀不到 min_interval → 直接回傳上一筆好值（可能是 (None, None)）。
+        讀失敗回 (None, None)。
+        """
+        with self._lock:
+            if not self._opened:
+                self._open()
+
+            now = time.monotonic()
+            if now - self._last_attempt < self.min_interval:
+                self.cached += 1
+                return self._last_good
+            self._last_attempt = now
+
+            t0 = time.perf_counter()
+            try:
+                h, t = self._read_once()
+            except RuntimeError:
+                # DHT 常見 transient error（checksum / timing）
+                h, t = None, None
+            except Exception as e:
+                print(f"[DHT22] read error: {e}", flush=True)
+                h, t = None, None
+            ms = (time.perf_counter() - t0) * 1000
+
+            self.reads += 1
+            self.last_latency_ms = ms
+            self.max_latency_ms = max(self.max_latency_ms, ms)
+            self._total_latency_ms += ms
+
+            if h is None or t is None:
+                self.failures += 1
+                return (None, None)
+
+            self._last_good = (round(h, 1), round(t, 1))
+            self._last_good_at = time.time()
+            return self._last_good
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "pin": self.pin,
+            "reads": self.reads,
+            "failures": self.failures,
+            "cached": self.cached,
+            "last_latency_ms": round(self.last_latency_ms, 2) if self.last_latency_ms is not None else None,
+            "avg_latency_ms": round(self._total_latency_ms / self.reads, 2) if self.reads else None,
+            "max_latency_ms": round(self.max_latency_ms, 2),
+            "last_good_at": self._last_good_at,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._device is not None:
+                try:
+                    self._device.exit()
+                except Exception:
+                    pass
+                self._device = None
+            self._opened = False
@@ -0,0 +1,293 @@
+"""遊戲狀態引擎：植物情緒、每日愛心任務、招蜂引蝶、連續天數。
+
+以前全部在 frontend/app/page.tsx 裡，每個瀏覽器各自從輪詢的 /status 算一份
+（觸控 / 乾→濕邊緣、情緒、hearts、hasCalledInsectsToday），裝置之間不一致、重新整理就歸零。
+現在後端收到事件才算一次，所有前端只負責畫：
+- 感測器快照（sampler listener）：土壤乾 / 濕、觸控 false→true、乾→濕
+- 觸控中斷事件、澆水工作完成、拍照成功、POST /game/insects
+- 暫時的情緒（happy / excited）到期、跨日重置由背景執行緒處理
+
+每次變動版本號 +1，只記「哪些欄位變了」；前端用 /game?since=<version> 拿差異，
+太舊的版本（差異已經被擠掉）就回整份。版本從啟動時間（ms）往上數（跟 status_cache 一樣），
+重開機前拿到的版本一定比現在的舊，會拿到整份，不會跟新的歷史對錯。
+會跨日保留的欄位（愛心、連續天數…）寫到 JSON 檔。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+
+GAME_STATE = os.getenv("GAME_STATE", os.path.join(os.path.dirname(__file__), "game_state.json"))
+# 情緒維持多久（秒），數值跟原本前端的 setTimeout 一樣
+HAPPY_TOUCH_SEC = float(os.getenv("GAME_HAPPY_TOUCH_SEC", "1.2"))
+HAPPY_WATER_SEC = float(os.getenv("GAME_HAPPY_WATER_SEC", "5"))
+EXCITED_SEC = float(os.getenv("GAME_EXCITED_SEC", "8"))
+MAX_DIFFS = 256
+
+HEARTS = ("photo", "water", "touch")
+# 跨日 / 重開機要保留的欄位
+PERSISTED = ("day", "hearts", "insects_called", "streak", "best_streak", "last_full_day")
+
+
+class GameEngine:
+    def __init__(self, path: str = GAME_STATE, clock=time.time):
+        self.path = path
+        self.clock = clock
+
+        self._cond = threading.Condition()
+        self._diffs = deque(maxlen=MAX_DIFFS)  # (version, 變動的欄位名稱)
+        self._listeners = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.version = int(clock() * 1000)
+
+        self._mood = None  # 暫時的情緒（happy / excited），到 _mood_until 為止
+        self._mood_until = 0.0
+        self._soil_dry = None
+        self._touching = False
+        self._event_seq = 0
+        self.state = {
+            "emotion": "content",
+            "day": date.fromtimestamp(clock()).isoformat(),
+            "hearts": {h: False for h in HEARTS},
+            "insects_called": False,
+            "can_call_insects": False,
+            "streak": 0,
+            "best_streak": 0,
+            "last_full_day": None,
+            "last_event": None,
+        }
+        self._load()
+
+    # ========= 持久化 =========
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[GAME] ignoring unreadable state {self.path}: {e}", flush=True)
+            return
+        for k in PERSISTED:
+            if k in saved:
+                self.state[k] = saved[k]
+        self.state["hearts"] = {h: bool(self.state["hearts"].get(h)) for h in HEARTS}
+        self._rollover(self.clock())
+        self._refresh_derived()
+        print(f"[GAME] loaded state day={self.state['day']} streak={self.state['streak']}", flush=True)
+
+    def _save(self):
+        # 呼叫端要拿著 self._cond；檔案很小，寫暫存檔後原子 rename
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({k: self.state[k] for k in PERSISTED}, f)
+        os.replace(tmp, self.path)
+
+    # ========= 狀態更新（全部要拿著 self._cond） =========
+    def _rollover(self, now: float) -> bool:
+        """跨日：愛心和招蜂引蝶重置；昨天沒集滿三顆愛心，連續天數歸零。"""
+        today = date.fromtimestamp(now).isoformat()
+        if self.state["day"] == today:
+            return False
+        yesterday = (date.fromtimestamp(now) - timedelta(days=1)).isoformat()
+        self.state["day"] = today
+        self.state["hearts"] = {h: False for h in HEARTS}
+        self.state["insects_called"] = False
+        if self.state["last_full_day"] not in (today, yesterday):
+            self.state["streak"] = 0
+        return True
+
+    def _refresh_derived(self):
+        s = self.state
+        s["can_call_insects"] = all(s["hearts"].values()) and not s["insects_called"]
+        if self._mood is not None:
+            s["emotion"] = self._mood
+        elif self._soil_dry:
+            s["emotion"] = "thirsty"
+        else:
+            s["emotion"] = "content"
+
+    def _set_mood(self, mood: str, sec: float, now: float):
+        # excited（招蜂引蝶動畫）期間不被 happy 蓋掉
+        if self._mood == "excited" and mood != "excited" and now < self._mood_until:
+            return
+        self._mood = mood
+        self._mood_until = now + sec
+        self._wake.set()
+
+    def _earn(self, heart: str, now: float):
+        s = self.state
+        if s["hearts"][heart]:
+            return
+        s["hearts"] = {**s["hearts"], heart: True}
+        if all(s["hearts"].values()) and s["last_full_day"] != s["day"]:
+            yesterday = (date.fromisoformat(s["day"]) - timedelta(days=1)).isoformat()
+            s["streak"] = s["streak"] + 1 if s["last_full_day"] == yesterday else 1
+            s["best_streak"] = max(s["best_streak"], s["streak"])
+            s["last_full_day"] = s["day"]
+
+    def _event(self, kind: str, now: float, merge_sec: float = 0.0):
+        # 前端用 last_event 播一次音效 / 動畫（seq 變了才播）。
+        # 同一件事可能從兩個來源進來（觸控：中斷 + 快照；澆水：工作完成 + 土壤乾→濕），
+        # merge_sec 內的同類事件只算一次
+        last = self.state["last_event"]
+        if last and last["type"] == kind and now - last["ts"] < merge_sec:
+            return
+        self._event_seq += 1
+        self.state["last_event"] = {"seq": self._event_seq, "type": kind, "ts": now}
+
+    def _apply(self, fn, now: float | None = None):
+        """在鎖裡跑 fn(now)，算出變動的欄位；有變就版本 +1、存檔、通知 listener。"""
+        if now is None:
+            now = self.clock()
+        with self._cond:
+            # 巢狀的欄位（hearts / last_event）一律整個換掉，淺拷貝就比得出差異
+            old = dict(self.state)
+            rolled = self._rollover(now)
+            result = fn(now)
+            if self._mood is not None and now >= self._mood_until:
+                self._mood = None
+            self._refresh_derived()
+            changed = [k for k, v in self.state.items() if old.get(k) != v]
+            if not changed:
+                return result
+            self.version += 1
+            self._diffs.append((self.version, changed))
+            if rolled or any(k in PERSISTED for k in changed):
+                try:
+                    self._save()
+                except OSError as e:
+                    print(f"[GAME] save error: {e}", flush=True)
+            self._cond.notify_all()
+            diff = {"version": self.version, "changed": {k: self.state[k] for k in changed}}
+        for listener in self._listeners:
+            try:
+                listener(diff)
+            except Exception as e:
+                print(f"[GAME] listener error: {e}", flush=True)
+        return result
+
+    # ========= 事件 =========
+    def on_snapshot(self, snap):
+        """sampler listener：土壤乾→濕算澆水，觸控 false→true 算摸摸。"""
+        # 乾 / 濕只看 sensors 統一過方向的 soil_dry（True=乾，見 SOIL_DRY_LEVEL）
+        dry = snap.values.get("soil_dry")
+        touching = bool(snap.values.get("touch"))
+
+        def update(now):
+            was_dry, was_touching = self._soil_dry, self._touching
+            if dry is not None:
+                self._soil_dry = dry
+            self._touching = touching
+            if was_dry and dry is False:
+                self._earn("water", now)
+                self._set_mood("happy", HAPPY_WATER_SEC, now)
+                self._event("water", now, merge_sec=HAPPY_WATER_SEC)
+            if touching and not was_touching:
+                self._touched(now)
+
+        self._apply(update)
+
+    def on_touch_event(self, event: dict):
+        """TouchDetector listener：中斷記到的 tap（比取樣間隔短的點擊也算）。"""
+        self._apply(self._touched)
+
+    def _touched(self, now: float):
+        self._earn("touch", now)
+        self._set_mood("happy", HAPPY_TOUCH_SEC, now)
+        self._event("touch", now, merge_sec=HAPPY_TOUCH_SEC)
+
+    def on_water_job(self, job: dict):
+        """PumpExecutor listener：澆水工作完成才算（排隊中 / 失敗不算）。"""
+        if job.get("status") != "done":
+            return
+
+        def update(now):
+            self._earn("water", now)
+            self._set_mood("happy", HAPPY_WATER_SEC, now)
+            self._event("water", now, merge_sec=HAPPY_WATER_SEC)
+
+        self._apply(update)
+
+    def on_photo(self):
+        def update(now):
+            self._earn("photo", now)
+            self._event("photo", now)
+
+        self._apply(update)
+
+    def call_insects(self):
+        """三顆愛心都拿到、今天還沒叫過才可以；回傳 (ok, error)。"""
+
+        def update(now):
+            if self.state["insects_called"]:
+                return False, "already_called"
+            if not all(self.state["hearts"].values()):
+                return False, "hearts_missing"
+            self.state["insects_called"] = True
+            self._set_mood("excited", EXCITED_SEC, now)
+            self._event("insects", now)
+            return True, None
+
+        return self._apply(update)
+
+    def tick(self, now: float | None = None):
+        """讓暫時的情緒到期、跨日重置（背景執行緒呼叫，也可以直接測）。"""
+        self._apply(lambda _now: None, now)
+
+    # ========= 查詢 =========
+    def add_listener(self, fn):
+        """狀態有變時呼叫 fn(diff)，diff = {"version", "changed": {欄位: 新值}}。"""
+        self._listeners.append(fn)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {"version": self.version, "full": True, "state": dict(self.state)}
+
+    def since(self, version: int, wait: float = 0.0) -> dict:
+        """回傳 version 之後變動過的欄位（合併成最新值）；wait>0 時沒變化會 long-poll。
+
+        version 太舊（差異已經被擠出佇列、或是重開機前的版本）或比目前還新就回整份，full=True。
+        """
+        with self._cond:
+            if wait > 0 and self.version == version:
+                self._cond.wait_for(lambda: self.version != version, timeout=wait)
+            oldest = self._diffs[0][0] if self._diffs else self.version + 1
+            if version > self.version or version < oldest - 1:
+                return {"version": self.version, "full": True, "state": dict(self.state)}
+            keys = set()
+            for v, changed in self._diffs:
+                if v > version:
+                    keys.update(changed)
+            return {"version": self.version, "full": False, "state": {k: self.state[k] for k in sorted(keys)}}
+
+    # ========= 背景執行緒 =========
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="game")
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            now = self.clock()
+            midnight = time.mktime((date.fromtimestamp(now) + timedelta(days=1)).timetuple())
+            wake_at = min(midnight, self._mood_until) if self._mood is not None else midnight
+            self._wake.wait(max(0.05, min(wake_at - now, 60.0)))
+            self._wake.clear()
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[GAME] error: {e}", flush=True)
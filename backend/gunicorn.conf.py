@@ -0,0 +1,45 @@
+"""正式上線用的 gunicorn 設定（取代 app.run 的開發用 server）。
+
+  cd backend
+  gunicorn -c gunicorn.conf.py app:app
+
+- worker_class=gthread：一個行程、多條執行緒。相機、幫浦、GPIO、取樣器都是行程內的單例，
+  只能有一個行程擁有（app.py 會拿 HW_LOCK 檔案鎖），所以 worker 固定 1 個，
+  要撐更多平板就加 GUNICORN_THREADS。
+- /status/stream（SSE）與 MJPEG 每個連線會佔住一條執行緒，threads 要比同時看的裝置多。
+- 不 preload：硬體初始化與背景執行緒要在 worker 裡做（fork 之後執行緒不會跟過去）。
+- SIGTERM / Ctrl-C：等進行中的請求 graceful_timeout 秒，然後 worker_exit 關相機、幫浦 cleanup()。
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+if workers != 1:
+    print(f"[GUNICORN] GUNICORN_WORKERS={workers} ignored: hardware singletons need exactly one worker", flush=True)
+    workers = 1
+
+preload_app = False
+# 串流回應會一直寫，gthread 的 heartbeat 不受影響；這個只管卡死的 worker
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_SEC", "10"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+accesslog = os.getenv("GUNICORN_ACCESSLOG") or None
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    import app
+
+    app.start_services()
+
+
+def worker_exit(server, worker):
+    import sys
+
+    # app 沒 import 成功（例如拿不到硬體鎖）就沒有東西要收
+    app = sys.modules.get("app")
+    if app is not None and hasattr(app, "shutdown"):
+        app.shutdown()
@@ -0,0 +1,206 @@
+"""感測器歷史資料（SQLite，WAL 模式）。
+
+背景執行緒每 HISTORY_SAMPLE_SEC 秒從 sampler 的快照取一次數值，累積後一次批次寫入
+（減少 SD 卡寫入次數），同時更新 1 分鐘 / 1 小時的 rollup（min / max / sum / count）。
+各層資料超過保留期限就刪掉；查詢時依 step 與時間範圍挑最適合的那一層。
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from sampler import get_snapshot
+
+HISTORY_DB = os.getenv("HISTORY_DB", os.path.join(os.path.dirname(__file__), "history.db"))
+HISTORY_SAMPLE_SEC = float(os.getenv("HISTORY_SAMPLE_SEC", "10"))
+HISTORY_FLUSH_SEC = float(os.getenv("HISTORY_FLUSH_SEC", "60"))
+
+# 要記錄的欄位（touch 是瞬間事件，不記在這裡；soil_dry 的平均就是乾的時間比例）
+HISTORY_FIELDS = ("soil_pct", "soil_dry", "lux", "temp_c", "humi_pct")
+
+# (表名, bucket 秒數, 保留秒數)；bucket=0 代表原始資料
+TIERS = (
+    ("raw", 0, float(os.getenv("HISTORY_RAW_DAYS", "2")) * 86400),
+    ("rollup_1m", 60, float(os.getenv("HISTORY_1M_DAYS", "14")) * 86400),
+    ("rollup_1h", 3600, float(os.getenv("HISTORY_1H_DAYS", "400")) * 86400),
+)
+
+# 一次查詢最多回幾個點（沒指定 step 時用來自動決定 step）
+MAX_POINTS = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS raw (
+    field TEXT NOT NULL,
+    ts REAL NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS raw_field_ts ON raw(field, ts);
+CREATE TABLE IF NOT EXISTS rollup_1m (
+    field TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    min REAL, max REAL, sum REAL, count INTEGER,
+    PRIMARY KEY (field, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_1h (
+    field TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    min REAL, max REAL, sum REAL, count INTEGER,
+    PRIMARY KEY (field, bucket)
+) WITHOUT ROWID;
+"""
+
+_UPSERT = """
+INSERT INTO {table} (field, bucket, min, max, sum, count) VALUES (?, ?, ?, ?, ?, 1)
+ON CONFLICT(field, bucket) DO UPDATE SET
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max),
+    sum = sum + excluded.sum,
+    count = count + 1
+"""
+
+_local = threading.local()
+_stop = threading.Event()
+_thread: threading.Thread | None = None
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(HISTORY_DB, timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL 模式下 NORMAL 就不會壞檔，只是斷電時可能少最後幾筆
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _conn() -> sqlite3.Connection:
+    """每個執行緒一條連線（sqlite3 連線不能跨執行緒共用）。"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+    return conn
+
+
+def init_db():
+    conn = _conn()
+    conn.executescript(_SCHEMA)
+    conn.commit()
+
+
+def record(rows: list[tuple[str, float, float]]):
+    """批次寫入 [(field, ts, value), ...]，同時更新 rollup。"""
+    if not rows:
+        return
+    conn = _conn()
+    with conn:
+        conn.executemany("INSERT INTO raw (field, ts, value) VALUES (?, ?, ?)", rows)
+        for table, bucket_sec, _ in TIERS[1:]:
+            conn.executemany(
+                _UPSERT.format(table=table),
+                [(f, int(ts // bucket_sec) * bucket_sec, v, v, v) for f, ts, v in rows],
+            )
+
+
+def evict(now: float | None = None):
+    """刪掉超過保留期限的資料。"""
+    if now is None:
+        now = time.time()
+    conn = _conn()
+    with conn:
+        for table, _, keep_sec in TIERS:
+            col = "ts" if table == "raw" else "bucket"
+            conn.execute(f"DELETE FROM {table} WHERE {col} < ?", (now - keep_sec,))
+
+
+def _pick_tier(start: float, step: float, now: float):
+    """挑 bucket ≤ step 且保留期限涵蓋 start 的最粗那一層（都不符合就用最粗的）。"""
+    for tier in reversed(TIERS):
+        _, bucket_sec, keep_sec = tier
+        if bucket_sec <= step and start >= now - keep_sec:
+            return tier
+    return TIERS[-1]
+
+
+def query(field: str, start: float, end: float, step: float | None = None) -> dict:
+    """回傳 [start, end) 之間每 step 秒一個點的 min / max / mean。"""
+    now = time.time()
+    if step is None or step <= 0:
+        step = max(1.0, (end - start) / MAX_POINTS)
+    step = max(step, (end - start) / MAX_POINTS)
+    table, bucket_sec, _ = _pick_tier(start, step, now)
+    step = max(step, bucket_sec)
+
+    conn = _conn()
+    if table == "raw":
+        sql = (
+            "SELECT CAST(ts / ? AS INTEGER) * ? AS b, MIN(value), MAX(value), AVG(value), COUNT(*) "
+            "FROM raw WHERE field = ? AND ts >= ? AND ts < ? GROUP BY b ORDER BY b"
+        )
+    else:
+        sql = (
+            "SELECT CAST(bucket / ? AS INTEGER) * ? AS b, MIN(min), MAX(max), SUM(sum) / SUM(count), SUM(count) "
+            f"FROM {table} WHERE field = ? AND bucket >= ? AND bucket < ? GROUP BY b ORDER BY b"
+        )
+    rows = conn.execute(sql, (step, step, field, start, end)).fetchall()
+    return {
+        "field": field,
+        "from": start,
+        "to": end,
+        "step": step,
+        "tier": table,
+        "points": [
+            {"t": b, "min": mn, "max": mx, "mean": round(mean, 3), "n": n}
+            for b, mn, mx, mean, n in rows
+        ],
+    }
+
+
+def _history_loop():
+    pending: list[tuple[str, float, float]] = []
+    last_flush = time.monotonic()
+    last_evict = 0.0
+    while not _stop.wait(HISTORY_SAMPLE_SEC):
+        snap = get_snapshot()
+        now = time.time()
+        stale = set(snap.stale_fields(now))
+        for field in HISTORY_FIELDS:
+            v = snap.values.get(field)
+            if v is None or field in stale:
+                continue
+            pending.append((field, now, float(v)))
+
+        if time.monotonic() - last_flush >= HISTORY_FLUSH_SEC:
+            try:
+                record(pending)
+                pending = []
+                if now - last_evict >= 3600:
+                    evict(now)
+                    last_evict = now
+            except Exception as e:
+                print(f"[HISTORY] write error: {e}", flush=True)
+            last_flush = time.monotonic()
+
+    # 結束前把還沒寫的寫掉
+    try:
+        record(pending)
+    except Exception as e:
+        print(f"[HISTORY] final write error: {e}", flush=True)
+
+
+def start_history():
+    """建立資料表並啟動背景記錄執行緒（重複呼叫不會多開）。"""
+    global _thread
+    if _thread is not None:
+        return
+    init_db()
+    _stop.clear()
+    _thread = threading.Thread(target=_history_loop, daemon=True, name="history")
+    _thread.start()
+    print(f"[HISTORY] recording to {HISTORY_DB} every {HISTORY_SAMPLE_SEC}s", flush=True)
+
+
+def stop_history(timeout: float = 2.0):
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout)
+        _thread = None
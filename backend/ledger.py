@@ -0,0 +1,203 @@
+"""澆水帳本（取代 app.py 裡的 daily_sec / last_day / last_water_at 全域變數）。
+
+- reserve()：在同一把鎖裡檢查 cooldown / 每日上限並預扣額度，併發請求不會同時通過
+- 每一筆都 append 到 JSON Lines 檔（只追加、不改舊資料）；壞掉的最後一行（斷電）會被略過
+- fsync 分批做：寫入只 flush 到 OS，真正 fsync 由背景每秒一次，或開幫浦前 sync() 一次
+  → 幫浦動作前額度一定已經落地，重開機 / crash loop 也不會超過每日上限
+- 啟動時從檔案重建每日總量，之後查詢都只看記憶體；每次寫入順便丟掉超過保留期限的紀錄，
+  長時間跑記憶體也不會一直長
+"""
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+# 記憶體 / 檔案只保留最近幾天（每日上限只看今天，歷史查詢夠用就好）
+KEEP_DAYS = int(os.getenv("LEDGER_KEEP_DAYS", "30"))
+FSYNC_SEC = float(os.getenv("LEDGER_FSYNC_SEC", "1.0"))
+
+
+class WateringLedger:
+    def __init__(self, path: str, daily_limit: float, cooldown: float):
+        self.path = path
+        self.daily_limit = float(daily_limit)
+        self.cooldown = float(cooldown)
+
+        self._lock = threading.Lock()
+        self._entries = {}  # id → entry（依時間順序）
+        self._daily = {}  # "YYYY-MM-DD" → 秒數
+        self._last_water_ts = None
+        self._dirty = False
+        self._stop = threading.Event()
+
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+        if self._file.tell() > 0 and not self._ends_with_newline():
+            # 半行之後接著寫會把下一筆也弄壞，先補換行
+            self._file.write("\n")
+            self._file.flush()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name="ledger_fsync")
+        self._flusher.start()
+
+    # ========= 重建 / 寫檔 =========
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        cutoff = time.time() - KEEP_DAYS * 86400
+        kept = 0
+        total = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                total += 1
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # 斷電時最後一行可能只寫了一半
+                    continue
+                if rec.get("ts", 0) < cutoff:
+                    continue
+                kept += 1
+                self._apply(rec)
+        print(f"[LEDGER] loaded {kept} records from {self.path}", flush=True)
+        if total > kept * 2 + 100:
+            self._compact()
+
+    def _compact(self):
+        """只保留 KEEP_DAYS 內的紀錄，寫到暫存檔後原子 rename。"""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for e in self._entries.values():
+                rec = {"type": "reserve", "id": e["id"], "ts": e["ts"], "sec": e["sec"], "source": e["source"]}
+                f.write(json.dumps(rec) + "\n")
+                if e["status"] in ("done", "failed"):
+                    f.write(json.dumps({"type": e["status"], "id": e["id"], "ts": e["finished_at"]}) + "\n")
+                if e["refunded"]:
+                    f.write(json.dumps({"type": "refund", "id": e["id"], "ts": e["finished_at"] or e["ts"]}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _apply(self, rec: dict):
+        kind = rec.get("type")
+        if kind == "reserve":
+            day = date.fromtimestamp(rec["ts"]).isoformat()
+            self._entries[rec["id"]] = {
+                "id": rec["id"],
+                "ts": rec["ts"],
+                "sec": rec["sec"],
+                "source": rec.get("source", "manual"),
+                "status": "reserved",
+                "finished_at": None,
+                "refunded": False,
+            }
+            self._daily[day] = self._daily.get(day, 0.0) + rec["sec"]
+            if self._last_water_ts is None or rec["ts"] > self._last_water_ts:
+                self._last_water_ts = rec["ts"]
+        elif kind in ("done", "failed"):
+            e = self._entries.get(rec["id"])
+            if e is not None:
+                e["status"] = kind
+                e["finished_at"] = rec["ts"]
+        elif kind == "refund":
+            e = self._entries.get(rec["id"])
+            if e is not None and not e["refunded"]:
+                e["refunded"] = True
+                day = date.fromtimestamp(e["ts"]).isoformat()
+                self._daily[day] = max(0.0, self._daily.get(day, 0.0) - e["sec"])
+
+    def _append(self, rec: dict):
+        # 呼叫端要拿著 self._lock
+        self._apply(rec)
+        self._file.write(json.dumps(rec) + "\n")
+        self._file.flush()
+        self._dirty = True
+        self._trim(rec["ts"])
+
+    def _trim(self, now: float):
+        """丟掉比最大的時間窗（每日上限的一天、cooldown、KEEP_DAYS 的歷史）還舊的紀錄。"""
+        # 呼叫端要拿著 self._lock；_entries 依時間順序，從最舊的開始丟
+        cutoff = now - max(KEEP_DAYS * 86400, 86400, self.cooldown)
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest["ts"] >= cutoff:
+                break
+            del self._entries[oldest["id"]]
+        first_day = date.fromtimestamp(cutoff).isoformat()
+        for day in [d for d in self._daily if d < first_day]:
+            del self._daily[day]
+
+    def sync(self):
+        """把還沒 fsync 的紀錄落地（開幫浦前呼叫）。"""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _flush_loop(self):
+        while not self._stop.wait(FSYNC_SEC):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"[LEDGER] fsync error: {e}", flush=True)
+
+    def close(self):
+        self._stop.set()
+        self.sync()
+        with self._lock:
+            self._file.close()
+
+    # ========= 澆水額度 =========
+    def reserve(self, sec: float, job_id: str, now: float | None = None, source: str = "manual"):
+        """原子的「檢查 + 預扣」。回傳 (ok, error)；error 是 "cooldown" / "daily_limit"。
+
+        source 記錄是誰要澆的（manual / auto），/water/history 會帶出來。
+        """
+        with self._lock:
+            # 在鎖裡取時間：併發請求的 ts 才會跟寫入順序一致（不會出現 now < 上一筆）
+            if now is None:
+                now = time.time()
+            if self._last_water_ts is not None and now - self._last_water_ts < self.cooldown:
+                return False, "cooldown"
+            today = date.fromtimestamp(now).isoformat()
+            if self._daily.get(today, 0.0) + sec > self.daily_limit:
+                return False, "daily_limit"
+            self._append({"type": "reserve", "id": job_id, "ts": now, "sec": sec, "source": source})
+            return True, None
+
+    def finish(self, job_id: str, ok: bool):
+        """記錄工作結果；失敗就把預扣的秒數退回（cooldown 仍然保留）。"""
+        now = time.time()
+        with self._lock:
+            self._append({"type": "done" if ok else "failed", "id": job_id, "ts": now})
+            if not ok:
+                self._append({"type": "refund", "id": job_id, "ts": now})
+
+    def today_total(self) -> float:
+        return self._daily.get(date.today().isoformat(), 0.0)
+
+    @property
+    def last_water_at(self) -> datetime | None:
+        ts = self._last_water_ts
+        return datetime.fromtimestamp(ts) if ts is not None else None
+
+    # ========= 查詢 =========
+    def history(self, start: float, end: float, limit: int = 200) -> dict:
+        with self._lock:
+            entries = [dict(e) for e in self._entries.values() if start <= e["ts"] < end]
+            first = date.fromtimestamp(start)
+            last = date.fromtimestamp(end)
+            daily = {}
+            d = first
+            while d <= last and len(daily) <= KEEP_DAYS:
+                key = d.isoformat()
+                if key in self._daily:
+                    daily[key] = round(self._daily[key], 1)
+                d += timedelta(days=1)
+        return {"entries": entries[-limit:], "daily": daily}
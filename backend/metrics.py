@@ -0,0 +1,226 @@
+"""Prometheus 文字格式的 /metrics（不另外裝 prometheus_client）。
+
+熱路徑上只做一次 bisect + 加法（拿一下 lock），格式化全部留到有人來抓 /metrics 時才做。
+已經有在數的東西（相機幀數、MJPEG 編碼張數…）用 gauge_func / counter_func 在抓的時候
+讀現成的值，完全不碰熱路徑。
+
+  SENSOR_READ = histogram("smartplant_sensor_read_seconds", "...", ("sensor",))
+  with SENSOR_READ.labels(sensor="read_bh1750").time():
+      ...
+  ENCODE_ERRORS = counter("smartplant_mjpeg_encode_errors_total", "...")
+  n = ENCODE_ERRORS.inc()   # 回傳累計值，用來「每 N 次才印一行 log」
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ContextDecorator
+
+# 預設 bucket（秒）：感測器讀值 ~ms、拍照 / DHT22 ~秒都涵蓋得到
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PUMP_BUCKETS = (0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _label_str(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, child):
+        self.child = child
+
+    def _recreate_cm(self):
+        # 當 decorator 用時每次呼叫一個新的 timer（t0 不能在執行緒之間共用）
+        return _Timer(self.child)
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.t0)
+        return False
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+
+    def labels(self, **kw):
+        """取得某組 label 的子項；熱路徑上最好先存起來重複用。"""
+        key = tuple(str(kw[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+            return self.value
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_label_str(labelnames, key)} {_fmt(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, n=1):
+        return self._default.inc(n)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後一格是 +Inf
+        self.sum = 0.0
+
+    def observe(self, v: float):
+        i = bisect_left(self.buckets, v)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+
+    def time(self):
+        """context manager / decorator：量裡面花了幾秒。"""
+        return _Timer(self)
+
+    def render(self, name, labelnames, key):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        acc = 0
+        for le, c in zip(self.buckets + (float("inf"),), counts):
+            acc += c
+            le_label = 'le="' + _fmt(le) + '"'
+            lines.append(f"{name}_bucket{_label_str(labelnames, key, le_label)} {acc}")
+        labels = _label_str(labelnames, key)
+        lines.append(f"{name}_sum{labels} {_fmt(total)}")
+        lines.append(f"{name}_count{labels} {acc}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, v: float):
+        self._default.observe(v)
+
+    def time(self):
+        return self._default.time()
+
+
+class _Func:
+    """抓 /metrics 時才呼叫 fn()；fn 回傳數字，或 {label 值 tuple: 數字}。"""
+
+    def __init__(self, kind: str, name: str, help: str, fn, labelnames=()):
+        self.kind, self.name, self.help, self.fn, self.labelnames = kind, name, help, fn, tuple(labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            value = self.fn()
+        except Exception:
+            return lines
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for key, v in items:
+            if v is not None:
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {_fmt(v)}")
+        return lines
+
+
+def _register(m):
+    with _registry_lock:
+        for existing in _registry:
+            if existing.name == m.name:
+                return existing
+        _registry.append(m)
+    return m
+
+
+def counter(name: str, help: str, labelnames=()) -> Counter:
+    return _register(Counter(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, labelnames, buckets))
+
+
+def gauge_func(name: str, help: str, fn, labelnames=()):
+    return _register(_Func("gauge", name, help, fn, labelnames))
+
+
+def counter_func(name: str, help: str, fn, labelnames=()):
+    return _register(_Func("counter", name, help, fn, labelnames))
+
+
+def render() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 每一個路由的延遲（app.py 的 Flask hook、asgi.py 的 middleware 共用）
+REQUEST_SECONDS = histogram(
+    "smartplant_http_request_seconds", "HTTP request latency by route (streams: time to first byte)",
+    ("method", "route", "status"),
+)
+
+
+def log_every(n: int, every: int = 100) -> bool:
+    """第 1 次、之後每 every 次回傳 True：重複的錯誤只偶爾印一行，次數看 counter。"""
+    return n == 1 or n % every == 0
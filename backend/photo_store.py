@@ -0,0 +1,221 @@
+"""照片儲存：多尺寸版本、索引、容量上限。
+
+以前每次拍照（含佔位圖）都丟一張全尺寸 JPEG 到 photos/，沒人刪，/photos 也沒有快取，
+SD 卡會滿、相簿一次載好幾 MB。現在：
+- 拍照完立刻產生 thumb / medium 兩個縮小版（PIL draft 模式，解碼時就縮，很快）
+    photos/<id>.jpg          full（舊網址 /photos/<id>.jpg 照樣能用）
+    photos/medium/<id>.jpg   長邊 MEDIUM_PX
+    photos/thumb/<id>.jpg    長邊 THUMB_PX
+- 照片寫好就不會再改，所以 ETag 固定、回應可以 Cache-Control: immutable
+- 索引（photos/index.json）記每張的時間、大小；列照片只看記憶體，不掃目錄
+- 超過 PHOTO_MAX_MB 或 PHOTO_MAX_COUNT 就從最舊的開始刪（三個版本一起刪）
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+PHOTO_MAX_MB = float(os.getenv("PHOTO_MAX_MB", "500"))
+PHOTO_MAX_COUNT = int(os.getenv("PHOTO_MAX_COUNT", "1000"))
+THUMB_PX = int(os.getenv("PHOTO_THUMB_PX", "320"))
+MEDIUM_PX = int(os.getenv("PHOTO_MEDIUM_PX", "1024"))
+
+# 版本名稱 → 長邊像素（None = 原圖）
+RENDITIONS = {"thumb": THUMB_PX, "medium": MEDIUM_PX, "full": None}
+INDEX_NAME = "index.json"
+
+
+class PhotoStore:
+    def __init__(self, root: str, max_bytes: float = PHOTO_MAX_MB * 1024 * 1024, max_count: int = PHOTO_MAX_COUNT):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_count = max_count
+        self._lock = threading.Lock()
+        self._photos = OrderedDict()  # id → entry，由舊到新
+        self._bytes = 0
+        self.evicted = 0
+
+        for name in RENDITIONS:
+            if RENDITIONS[name] is not None:
+                os.makedirs(os.path.join(root, name), exist_ok=True)
+        self._load()
+
+    # ========= 路徑 =========
+    def path(self, photo_id: str, rendition: str = "full") -> str:
+        if rendition == "full":
+            return os.path.join(self.root, f"{photo_id}.jpg")
+        return os.path.join(self.root, rendition, f"{photo_id}.jpg")
+
+    @staticmethod
+    def url(photo_id: str, rendition: str = "full") -> str:
+        if rendition == "full":
+            return f"/photos/{photo_id}.jpg"
+        return f"/photos/{rendition}/{photo_id}.jpg"
+
+    def new_path(self, prefix: str = "photo") -> str:
+        """給拍照用的新檔名（full 的位置）。"""
+        return self.path(f"{prefix}_{int(time.time())}_{uuid.uuid4().hex[:6]}")
+
+    # ========= 索引 =========
+    def _load(self):
+        index = os.path.join(self.root, INDEX_NAME)
+        try:
+            with open(index, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = self._scan()
+            print(f"[PHOTOS] index rebuilt from directory: {len(entries)} photos", flush=True)
+        for e in entries:
+            self._photos[e["id"]] = e
+            self._bytes += sum(e["bytes"].values())
+        with self._lock:
+            self._evict()
+            self._save()
+
+    def _scan(self) -> list:
+        """沒有索引（第一次升級、或索引壞了）才掃一次目錄。"""
+        entries = []
+        for name in os.listdir(self.root):
+            full = os.path.join(self.root, name)
+            if not name.endswith(".jpg") or not os.path.isfile(full):
+                continue
+            photo_id = name[:-4]
+            st = os.stat(full)
+            sizes = {"full": st.st_size}
+            for r in RENDITIONS:
+                p = self.path(photo_id, r)
+                if r != "full" and os.path.exists(p):
+                    sizes[r] = os.path.getsize(p)
+            entries.append(self._entry(photo_id, st.st_mtime, sizes, photo_id.startswith("placeholder_")))
+        entries.sort(key=lambda e: e["ts"])
+        return entries
+
+    def _save(self):
+        # 呼叫端要拿著 self._lock；寫暫存檔再 rename，斷電也不會留下半個索引
+        index = os.path.join(self.root, INDEX_NAME)
+        tmp = index + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(list(self._photos.values()), f, separators=(",", ":"))
+        os.replace(tmp, index)
+
+    @staticmethod
+    def _entry(photo_id: str, ts: float, sizes: dict, placeholder: bool) -> dict:
+        return {"id": photo_id, "ts": ts, "bytes": sizes, "placeholder": placeholder}
+
+    # ========= 新增 / 刪除 =========
+    def _make_renditions(self, photo_id: str) -> dict:
+        from PIL import Image
+
+        sizes = {"full": os.path.getsize(self.path(photo_id))}
+        for name, px in RENDITIONS.items():
+            if px is None:
+                continue
+            with Image.open(self.path(photo_id)) as img:
+                # draft：JPEG 解碼時直接用 1/2、1/4、1/8 的 DCT 縮放，比解完整張再縮快很多
+                img.draft("RGB", (px, px))
+                img = img.convert("RGB")
+                img.thumbnail((px, px))
+                img.save(self.path(photo_id, name), format="JPEG", quality=80, optimize=True)
+            sizes[name] = os.path.getsize(self.path(photo_id, name))
+        return sizes
+
+    def add(self, full_path: str, placeholder: bool = False) -> dict:
+        """登記一張剛寫好的照片（full_path 要在 root 底下），產生縮小版並套用容量上限。"""
+        photo_id = os.path.basename(full_path)[:-4]
+        try:
+            sizes = self._make_renditions(photo_id)
+        except Exception as e:
+            # 縮圖失敗不影響原圖，之後 ensure() 會再試
+            print(f"[PHOTOS] rendition error {photo_id}: {e}", flush=True)
+            sizes = {"full": os.path.getsize(full_path)}
+        entry = self._entry(photo_id, time.time(), sizes, placeholder)
+        with self._lock:
+            self._photos[photo_id] = entry
+            self._bytes += sum(sizes.values())
+            self._evict()
+            self._save()
+        return dict(entry)
+
+    def _evict(self):
+        # 呼叫端要拿著 self._lock
+        while self._photos and (len(self._photos) > self.max_count or self._bytes > self.max_bytes):
+            photo_id, e = self._photos.popitem(last=False)
+            self._bytes -= sum(e["bytes"].values())
+            self.evicted += 1
+            for r in RENDITIONS:
+                try:
+                    os.remove(self.path(photo_id, r))
+                except FileNotFoundError:
+                    pass
+
+    # ========= 查詢 =========
+    def get(self, photo_id: str) -> dict | None:
+        with self._lock:
+            e = self._photos.get(photo_id)
+            return dict(e) if e else None
+
+    def ensure(self, photo_id: str, rendition: str) -> str | None:
+        """回傳某版本的檔案路徑；索引裡沒有就 None。舊照片缺縮小版時在這裡補做一次。"""
+        with self._lock:
+            e = self._photos.get(photo_id)
+            if e is None:
+                return None
+            missing = rendition not in e["bytes"]
+        if missing:
+            sizes = self._make_renditions(photo_id)
+            with self._lock:
+                self._bytes += sum(sizes.values()) - sum(e["bytes"].values())
+                e["bytes"] = sizes
+                self._save()
+        return self.path(photo_id, rendition)
+
+    def etag(self, photo_id: str, rendition: str) -> str:
+        e = self.get(photo_id)
+        return f"{photo_id}-{rendition}-{e['bytes'].get(rendition, 0)}" if e else ""
+
+    def list(self, limit: int = 50, before: float | None = None, include_placeholders: bool = False) -> list:
+        """最新的在前面；before 用來分頁（上一頁最後一張的 ts）。"""
+        out = []
+        with self._lock:
+            for e in reversed(self._photos.values()):
+                if before is not None and e["ts"] >= before:
+                    continue
+                if e["placeholder"] and not include_placeholders:
+                    continue
+                out.append(
+                    {
+                        "id": e["id"],
+                        "ts": e["ts"],
+                        "bytes": sum(e["bytes"].values()),
+                        "urls": {r: self.url(e["id"], r) for r in RENDITIONS},
+                    }
+                )
+                if len(out) >= limit:
+                    break
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "count": len(self._photos),
+                "bytes": self._bytes,
+                "max_count": self.max_count,
+                "max_bytes": int(self.max_bytes),
+                "evicted": self.evicted,
+            }
+
+
+def parse_photo_path(filename: str):
+    """/photos/ 後面的路徑 → (id, rendition)；不是照片路徑回傳 (None, None)。"""
+    parts = filename.split("/")
+    if len(parts) == 1:
+        rendition, name = "full", parts[0]
+    elif len(parts) == 2 and parts[0] in RENDITIONS and parts[0] != "full":
+        rendition, name = parts
+    else:
+        return None, None
+    if not name.endswith(".jpg") or name.startswith(".") or "\\" in name:
+        return None, None
+    return name[:-4], rendition
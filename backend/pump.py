@@ -75,6 +75,9 @@ def pulse_pump(sec: float):
     if _mock:
         print(f"[PUMP] mock pulse {sec}s")
         time.sleep(sec)
+        # mock 感測器讀的是模擬植物（sensors._mock_group），澆水也要反映到土壤
+        import simulator
+        simulator.get_plant().water(sec)
         return True, "mock"
 
     if GPIO is None or _pump_pin is None:
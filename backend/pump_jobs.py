@@ -0,0 +1,141 @@
+"""澆水工作佇列。
+
+pulse_pump(sec) 會 time.sleep(sec)（最多 10 秒），以前直接在 Flask request 裡跑，
+瀏覽器要等、dev server 的其他請求也被拖慢。現在 /water 只負責排一個工作並立刻回 job id，
+由唯一一條 actuator 執行緒依序開幫浦；狀態：queued → running → done / failed。
+stop() 之後不再開幫浦：還在排隊的工作直接 failed（on_done 會被呼叫，帳本才會退回額度）。
+"""
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# 保留最近幾筆工作給 /water/<id> 查
+MAX_JOBS = 100
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class PumpExecutor:
+    def __init__(self, pulse, max_jobs: int = MAX_JOBS):
+        # pulse(sec) -> (ok, msg)，就是 pump.pulse_pump
+        self.pulse = pulse
+        self.max_jobs = max_jobs
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._thread = None
+        self._listeners = []
+        self._stopped = False
+
+    def add_listener(self, fn):
+        """工作狀態改變時呼叫 fn(job_dict)（在 actuator 執行緒上）。"""
+        self._listeners.append(fn)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="pump_actuator")
+        self._thread.start()
+
+    def submit(self, sec: float, on_done=None, job_id: str | None = None) -> dict:
+        """排一個澆水工作，回傳工作內容（含 id）。on_done(job) 在完成或失敗後呼叫。"""
+        job = {
+            "id": job_id or new_job_id(),
+            "sec": sec,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            stopped = self._stopped
+            if not stopped:
+                # 跟 stop() 用同一把鎖：stop() 之後不會再有工作進佇列
+                self._queue.put((job, on_done))
+        if stopped:
+            self._fail(job, on_done, "shutting_down")
+            return dict(job)
+        self.start()
+        self._notify(job)
+        return dict(job)
+
+    def stop(self, timeout: float = 15.0):
+        """不再收工作；排隊中的工作標成 failed，等正在開的那一次幫浦關掉。可重複呼叫。"""
+        with self._lock:
+            self._stopped = True
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self._fail(*item, "shutting_down")
+        if self._thread is not None:
+            self._queue.put(None)
+            # pulse 最多 10 秒，跑完才回來（之後才能關 GPIO / 帳本）
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                print("[PUMP] actuator still running after stop()", flush=True)
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def latest(self) -> dict | None:
+        with self._lock:
+            if not self._jobs:
+                return None
+            return dict(next(reversed(self._jobs.values())))
+
+    def _set(self, job: dict, **fields):
+        with self._lock:
+            job.update(fields)
+        self._notify(job)
+
+    def _notify(self, job: dict):
+        for fn in self._listeners:
+            try:
+                fn(dict(job))
+            except Exception as e:
+                print(f"[PUMP] listener error: {e}", flush=True)
+
+    def _fail(self, job: dict, on_done, error: str):
+        self._set(job, status="failed", finished_at=time.time(), error=error)
+        self._done(job, on_done)
+
+    def _done(self, job: dict, on_done):
+        if on_done is not None:
+            try:
+                on_done(dict(job))
+            except Exception as e:
+                print(f"[PUMP] on_done error: {e}", flush=True)
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job, on_done = item
+            if self._stopped:
+                self._fail(job, on_done, "shutting_down")
+                continue
+            self._set(job, status="running", started_at=time.time())
+            try:
+                ok, msg = self.pulse(job["sec"])
+            except Exception as e:
+                ok, msg = False, str(e)
+            if ok:
+                self._set(job, status="done", finished_at=time.time())
+            else:
+                self._set(job, status="failed", finished_at=time.time(), error=msg)
+            self._done(job, on_done)
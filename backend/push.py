@@ -0,0 +1,112 @@
+"""/status/stream 推播（Server-Sent Events）。
+
+只有一個 producer 執行緒：感測器值變了（或有人 poke，例如澆完水）才重新組一次
+status、序列化一次，然後所有訂閱者共用同一份 bytes。訂閱者在 Condition 上等，
+沒有新資料時每 heartbeat 秒送一個 SSE 註解行保持連線。
+asgi.py 的訂閱者用 asubscribe()（coroutine，不佔執行緒）。
+"""
+import json
+import threading
+
+from aio_bridge import AsyncNotifier, wait_event
+
+
+class StatusHub:
+    def __init__(self, build, heartbeat: float = 15.0, ignore_keys=("now", "sampled_at")):
+        # build() → status dict；ignore_keys 是每次都會變、但不算「有變化」的欄位
+        self.build = build
+        self.heartbeat = heartbeat
+        self.ignore_keys = tuple(ignore_keys)
+
+        self._dirty = threading.Event()
+        self._build_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._event = None  # 最新一筆已編碼好的 SSE 事件
+        self._last_key = None
+        self._thread = None
+        self._anotify = AsyncNotifier()
+        self.subscribers = 0
+
+    def poke(self, *_):
+        """通知 producer 重新組 status（可以直接當 sampler listener 用）。"""
+        self._dirty.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="status_hub")
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            self._dirty.wait(self.heartbeat)
+            self._dirty.clear()
+            try:
+                self._produce()
+            except Exception as e:
+                print(f"[PUSH] build error: {e}", flush=True)
+
+    def _produce(self):
+        with self._build_lock:
+            data = self.build()
+            key = json.dumps({k: v for k, v in data.items() if k not in self.ignore_keys}, sort_keys=True)
+            if key == self._last_key:
+                return
+            self._last_key = key
+            self._publish(data)
+
+    def _publish(self, data: dict):
+        with self._cond:
+            self._seq += 1
+            body = json.dumps(data, separators=(",", ":"))
+            self._event = f"id: {self._seq}\nevent: status\ndata: {body}\n\n".encode()
+            self._cond.notify_all()
+        self._anotify.notify_all()
+
+    def subscribe(self):
+        """SSE generator：先送目前狀態，之後只在有變化時送，閒置時送 heartbeat。"""
+        if self._event is None:
+            self._produce()
+        with self._cond:
+            self.subscribers += 1
+        try:
+            seen = -1
+            while True:
+                with self._cond:
+                    if self._seq == seen:
+                        self._cond.wait(self.heartbeat)
+                    if self._seq == seen:
+                        event = None
+                    else:
+                        seen = self._seq
+                        event = self._event
+                yield event if event is not None else b": ping\n\n"
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    async def asubscribe(self):
+        """subscribe() 的 async 版（給 asgi.py）。"""
+        if self._event is None:
+            self._produce()
+        ev = self._anotify.add()
+        with self._cond:
+            self.subscribers += 1
+        try:
+            seen = -1
+            while True:
+                # 先 clear 再讀 seq：讀完之後才來的通知一定會把 ev 設起來，不會漏
+                ev.clear()
+                if self._seq == seen:
+                    await wait_event(ev, self.heartbeat)
+                if self._seq == seen:
+                    yield b": ping\n\n"
+                else:
+                    with self._cond:
+                        seen, event = self._seq, self._event
+                    yield event
+        finally:
+            self._anotify.discard(ev)
+            with self._cond:
+                self.subscribers -= 1
@@ -0,0 +1,166 @@
+"""背景感測器取樣器。
+
+每組感測器（見 sensors.SENSOR_GROUPS）各自一條 daemon thread，依自己的週期讀硬體，
+讀完就發佈一份新的「不可變快照」。/status 只要拿目前的快照（一次參照讀取），
+完全不碰硬體，多個前端同時輪詢也不會讓硬體被多讀幾次。
+"""
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from metrics import counter, gauge_func, log_every
+from sensors import SENSOR_GROUPS, read_group
+
+# 各組取樣週期（秒）：觸控要快，DHT22 本身最少要隔 2 秒
+SAMPLE_INTERVALS = {
+    "touch": float(os.getenv("SAMPLE_TOUCH_SEC", "0.05")),
+    "light": float(os.getenv("SAMPLE_LIGHT_SEC", "1.0")),
+    "dht": float(os.getenv("SAMPLE_DHT_SEC", "3.0")),
+    "soil": float(os.getenv("SAMPLE_SOIL_SEC", "1.0")),
+}
+
+# 超過「週期 × STALE_FACTOR」沒更新就算 stale（例如 DHT22 一直讀失敗）
+STALE_FACTOR = float(os.getenv("SAMPLE_STALE_FACTOR", "3"))
+
+
+class Snapshot:
+    """某一刻的感測器讀值，建立後不可修改（讀的人不需要鎖）。
+
+    values     : {欄位: 最後一次成功讀到的值}
+    sampled_at : {欄位: 該值的取樣時間 (time.time())}
+    version    : 任何欄位的值改變時 +1
+    """
+
+    __slots__ = ("values", "sampled_at", "version")
+
+    def __init__(self, values: dict, sampled_at: dict, version: int):
+        object.__setattr__(self, "values", MappingProxyType(dict(values)))
+        object.__setattr__(self, "sampled_at", MappingProxyType(dict(sampled_at)))
+        object.__setattr__(self, "version", version)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshot is immutable")
+
+    def age(self, field: str, now: float | None = None) -> float | None:
+        ts = self.sampled_at.get(field)
+        if ts is None:
+            return None
+        if now is None:
+            now = time.time()
+        return now - ts
+
+    def stale_fields(self, now: float | None = None) -> list[str]:
+        if now is None:
+            now = time.time()
+        stale = []
+        for group, fields in SENSOR_GROUPS.items():
+            max_age = SAMPLE_INTERVALS[group] * STALE_FACTOR
+            for field in fields:
+                age = self.age(field, now)
+                if age is None or age > max_age:
+                    stale.append(field)
+        return stale
+
+
+_errors = counter("smartplant_sensor_errors_total", "Sensor group reads that raised", ("group",))
+
+_EMPTY_VALUES = {f: None for fields in SENSOR_GROUPS.values() for f in fields}
+
+_snapshot = Snapshot(_EMPTY_VALUES, {}, 0)
+_publish_lock = threading.Lock()
+_stop = threading.Event()
+_threads: list[threading.Thread] = []
+# 至少讀過一輪的組（不論成功與否），給 /ready 判斷「第一輪取樣做完了沒」
+_attempted: set = set()
+# 值有變動時要通知的 callback（例如推播 hub），在取樣執行緒上呼叫，要很快返回
+_listeners: list = []
+
+
+def get_snapshot() -> Snapshot:
+    """回傳最新快照（O(1)，不會阻塞）。"""
+    return _snapshot
+
+
+def add_listener(fn):
+    """註冊「快照值有變動」時的 callback：fn(snapshot)。"""
+    _listeners.append(fn)
+
+
+def _publish(fields: dict, ts: float):
+    global _snapshot
+    with _publish_lock:
+        old = _snapshot
+        values = dict(old.values)
+        sampled_at = dict(old.sampled_at)
+        changed = False
+        for k, v in fields.items():
+            # 讀失敗（None）就保留上一筆好值，時間戳不更新 → 自然變 stale
+            if v is None:
+                continue
+            if values.get(k) != v:
+                changed = True
+            values[k] = v
+            sampled_at[k] = ts
+        _snapshot = Snapshot(values, sampled_at, old.version + 1 if changed else old.version)
+        snap = _snapshot
+    if changed:
+        for fn in _listeners:
+            try:
+                fn(snap)
+            except Exception as e:
+                print(f"[SAMPLER] listener error: {e}", flush=True)
+
+
+def _sample_loop(group: str, mock: bool):
+    interval = SAMPLE_INTERVALS[group]
+    while not _stop.is_set():
+        t0 = time.monotonic()
+        try:
+            fields = read_group(group, mock=mock)
+            _publish(fields, time.time())
+        except Exception as e:
+            # 壞掉的感測器每個週期都會失敗：次數看 /metrics，log 只偶爾印
+            n = _errors.labels(group=group).inc()
+            if log_every(n):
+                print(f"[SAMPLER] {group} read error (#{n}): {e}", flush=True)
+        _attempted.add(group)
+        elapsed = time.monotonic() - t0
+        _stop.wait(max(0.0, interval - elapsed))
+
+
+def start_sampler(mock: bool = False):
+    """啟動每組感測器的背景取樣執行緒（重複呼叫不會多開）。"""
+    if _threads:
+        return
+    _stop.clear()
+    for group in SENSOR_GROUPS:
+        th = threading.Thread(target=_sample_loop, args=(group, mock), daemon=True, name=f"sampler_{group}")
+        th.start()
+        _threads.append(th)
+    print(f"[SAMPLER] started groups={list(SENSOR_GROUPS)} mock={mock}", flush=True)
+
+
+def _stale_metric() -> dict:
+    stale = get_snapshot().stale_fields()
+    return {(f,): int(f in stale) for f in _EMPTY_VALUES}
+
+
+gauge_func(
+    "smartplant_sensor_stale",
+    "1 if the field has not been updated for SAMPLE_STALE_FACTOR sample intervals",
+    _stale_metric,
+    ("field",),
+)
+
+
+def warmed_up() -> bool:
+    """每組感測器都至少讀過一次了（讀失敗也算，之後由 stale 標示）。"""
+    return _attempted.issuperset(SENSOR_GROUPS)
+
+
+def stop_sampler(timeout: float = 2.0):
+    _stop.set()
+    for th in _threads:
+        th.join(timeout)
+    _threads.clear()
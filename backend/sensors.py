@@ -1,7 +1,13 @@
 import os
-import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
+# 沒有 Pi 的開發機用 SIMULATE=1（app.py 會先裝好假的 RPi.GPIO），這裡不自己偷換成假硬體
 import RPi.GPIO as GPIO
+from dht22 import DHT22Reader
+from bh1750 import BH1750Reader
+from touch import TouchDetector
+from metrics import histogram
 try:
     import smbus2
 except ImportError:
@@ -11,13 +17,19 @@ except ImportError:
 _soil_virtual = 55.0
 _last_t = time.time()
 
-BH1750_ADDRS = [0x23, 0x5C]  # 常見位址：ADDR 腳對 GND → 0x23；對 VCC → 0x5C
-CMD_POWER_ON = 0x01          # 開電源（有些模組上電後需顯式 POWER ON）
-CMD_CONT_HRES = 0x10         # 連續高解析度模式（約 0.12~0.24s）
+# BH1750 解析度模式：hres / hres2 / lres（見 bh1750.MODES），可選滾動平均筆數
+BH1750_MODE = os.getenv("BH1750_MODE", "hres")
+BH1750_AVG = int(os.getenv("BH1750_AVG", "3"))
 
 # 可設定的腳位（BCM 編號）
 DHT_PIN = int(os.getenv("DHT_PIN", "4"))
 SOIL_PIN = int(os.getenv("SOIL_PIN", "17"))
+# 土壤 DO 腳「乾」的時候是哪個電位，看模組 / 接線（乾的時候 DO=1 → 1，DO=0 → 0）。
+# 只在這裡解讀一次，其他地方都用 soil_dry 欄位（True=乾），不要自己猜方向
+SOIL_DRY_LEVEL = int(os.getenv("SOIL_DRY_LEVEL", "1"))
+
+# DHT22 driver 整個程式只建一次（第一次讀的時候挑後端）
+dht_reader = DHT22Reader(DHT_PIN)
 
 
 bus = None
@@ -28,7 +40,8 @@ if smbus2 is not None:
         print("⚠ WARNING: /dev/i2c-1 not found, BH1750 disabled for now.")
         bus = None
 
-
+# BH1750 只探測一次位址、進一次連續模式，之後每次只讀 2 bytes
+bh1750_reader = BH1750Reader(bus, mode=BH1750_MODE, avg_window=BH1750_AVG)
 
 # ===== 腳位設定 =====
 TOUCH_PIN = 6  # 你 TTP223 / 電容觸控模組 OUT 接的那一腳（之前 test_touch 用的那個）
@@ -38,7 +51,14 @@ GPIO.setmode(GPIO.BCM)
 GPIO.setup(TOUCH_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
 GPIO.setup(SOIL_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
 
+# 觸控中斷偵測（app 啟動時呼叫 touch_detector.start()）
+touch_detector = TouchDetector(TOUCH_PIN, active_high=True)
+
+# 每個真實感測器讀一次花多久（/metrics）
+SENSOR_READ_SECONDS = histogram("smartplant_sensor_read_seconds", "Time spent in one sensor read", ("sensor",))
 
+
+@SENSOR_READ_SECONDS.labels(sensor="_read_touch").time()
 def _read_touch() -> bool:
     """
     讀取電容式觸控模組狀態。
@@ -49,94 +69,26 @@ def _read_touch() -> bool:
     v = GPIO.input(TOUCH_PIN)
     return v == 1   # 如果你發現邏輯相反，就改成：return v == 0
 
+@SENSOR_READ_SECONDS.labels(sensor="read_bh1750").time()
 def read_bh1750():
     """讀取 BH1750 亮度（lux）。
-    - 會嘗試兩個常見位址 0x23 / 0x5C。
-    - 失敗時回傳 0.0，並印出可診斷的訊息。
+    - 透過常駐的 BH1750Reader（連續模式，每次只讀最新一筆轉換結果）。
+    - 失敗時回傳 None（背景取樣器會保留上一筆好值並標成 stale）。
     """
-    if bus is None:
-        # I2C 還沒開 / 感測器還沒接好 → 先回 0，不要讓程式死掉
-        return 0.0
-
-    last_error = None
-    for addr in BH1750_ADDRS:
-        try:
-            readings = []
-            # 顯式 POWER ON
-            bus.write_byte(addr, CMD_POWER_ON)
-            time.sleep(0.01)
-            # 連續高解析度模式
-            bus.write_byte(addr, CMD_CONT_HRES)
-            # 連續讀取 3 次取平均，提升穩定度
-            for _ in range(3):
-                time.sleep(0.22)
-                data = bus.read_i2c_block_data(addr, 0x00, 2)
-                raw = (data[0] << 8) | data[1]
-                readings.append(raw)
-            # 過濾全零讀值，避免立即回 0
-            valid = [r for r in readings if r > 0]
-            if not valid:
-                last_error = ValueError(f"BH1750 addr=0x{addr:02X} returned only zeros: {readings}")
-                continue
-            avg_raw = sum(valid) / len(valid)
-            lux = avg_raw / 1.2
-            return lux
-        except Exception as e:
-            last_error = e
-            continue
-
-    if last_error is not None:
-        print("BH1750 read error:", last_error)
-        print("👉 提示：請用 'i2cdetect -y 1' 確認位址是否為 0x23 或 0x5C；檢查 I2C 是否啟用、接線與 3.3V 供電。")
-    return 0.0
+    return bh1750_reader.read()
 
+@SENSOR_READ_SECONDS.labels(sensor="_read_dht22").time()
 def _read_dht22():
     """
-    讀取 DHT22 的溫度與濕度。
-    函式可能會丟 RuntimeError（感測器沒回應），所以要 try/except。
+    讀取 DHT22 的溫度與濕度（透過常駐的 DHT22Reader，見 dht22.py）。
     回傳 (humi, temp) 單位：(% , °C)，讀失敗回 (None, None)。
     """
-    # 先嘗試 adafruit_circuitpython_dht（CircuitPython 驅動）
-    try:
-        import board
-        import adafruit_dht
-        board_pin = getattr(board, f"D{DHT_PIN}", None)
-        if board_pin is not None:
-            d = adafruit_dht.DHT22(board_pin, use_pulseio=False)
-            try:
-                # 多次嘗試取得讀值（DHT 容易有 transient error）
-                for _ in range(5):
-                    try:
-                        t = d.temperature
-                        h = d.humidity
-                        if t is not None and h is not None:
-                            return (round(h, 1), round(t, 1))
-                    except RuntimeError:
-                        time.sleep(1.0)
-                        continue
-                return (None, None)
-            finally:
-                try:
-                    d.exit()
-                except Exception:
-                    pass
-    except Exception:
-        # adafruit_dht 不可用或失敗，繼續嘗試 Adafruit_DHT
-        pass
-
-    # 再嘗試傳統的 Adafruit_DHT
-    try:
-        import Adafruit_DHT
-        h, t = Adafruit_DHT.read_retry(Adafruit_DHT.DHT22, DHT_PIN)
-        if h is None or t is None:
-            return (None, None)
-        return (round(h, 1), round(t, 1))
-    except Exception:
-        return (None, None)
+    return dht_reader.read()
 
+@SENSOR_READ_SECONDS.labels(sensor="_read_soil_digital").time()
 def _read_soil_digital() -> bool:
-    v = GPIO.input(SOIL_PIN)
-    return v == 1   # 如果你測到「乾的時候 DO=1」，就改成 return v == 0
+    """土壤乾不乾（True=乾）；DO 腳的方向用 SOIL_DRY_LEVEL 設定。"""
+    return GPIO.input(SOIL_PIN) == SOIL_DRY_LEVEL
 
 """
 def _virtual_soil_pct(is_wet: bool) -> float:
@@ -162,36 +114,134 @@ def _virtual_soil_pct(is_wet: bool) -> float:
 """
 
 
-def read_all_sensors(mock: bool = False):
-    """
-    給 app.py 用的主函式。
+# 每組感測器一起讀（DHT22 一次就給溫度＋濕度），給背景取樣器各自排程用
+SENSOR_GROUPS = {
+    "touch": ("touch",),
+    "light": ("lux",),
+    "dht": ("humi_pct", "temp_c"),
+    "soil": ("soil_pct", "soil_dry"),
+}
 
-    mock=True  → 回傳隨機假資料（開發 / 沒插硬體用）
-    mock=False → 讀取真實感測器（目前只接觸控，其它先用固定值）
-    """
+
+def _mock_group(group: str) -> dict:
+    # 以前是每次獨立的亂數；現在讀模擬植物（SIM_SEED 決定軌跡，mock 幫浦澆水也會反映）
+    import simulator
+    return simulator.get_plant().group(group)
+
+
+def read_group(group: str, mock: bool = False) -> dict:
+    """讀取單一組感測器，回傳 {欄位: 值}（欄位見 SENSOR_GROUPS）。"""
     if mock:
-        # ⭐ 保留你原本的亂數版本
+        return _mock_group(group)
+
+    if group == "touch":
+        return {"touch": _read_touch()}
+    if group == "light":
+        return {"lux": read_bh1750()}
+    if group == "dht":
+        humi_pct, temp_c = _read_dht22()
+        return {"humi_pct": humi_pct, "temp_c": temp_c}
+    if group == "soil":
+        # DO 腳只分乾 / 濕：百分比只有 0 或 100（歷史的平均就是濕的時間比例）
+        dry = _read_soil_digital()
+        return {"soil_pct": 0.0 if dry else 100.0, "soil_dry": dry}
+    raise KeyError(group)
+
+
+# 一次「現在就讀」最多等多久（DHT22 卡住也不會拖住整個回應）
+READ_DEADLINE_SEC = float(os.getenv("SENSOR_READ_DEADLINE_MS", "500")) / 1000
+
+
+class ReadOrchestrator:
+    """每組感測器同時讀，deadline 到了就回傳已經讀完的；其他欄位給上一筆好值並標狀態。
+
+    status：ok（這次讀到）/ stale（這次讀失敗）/ timeout（deadline 內沒讀完）
+    後兩種的「上一筆好值」和時間直接拿 sampler 的快照（不另外留一份，剛啟動也有值）。
+    沒讀完的那組繼續在背景跑；下一次呼叫時如果它還沒回來，就等同一個 future，
+    不會再送一個（卡住的 DHT22 不會越堆越多執行緒）。
+    """
+
+    def __init__(self, groups=SENSOR_GROUPS, read=read_group):
+        self.groups = dict(groups)
+        self.read_group = read
+        self._pool = ThreadPoolExecutor(max_workers=len(self.groups), thread_name_prefix="sensor_read")
+        self._lock = threading.Lock()
+        self._inflight = {}  # group → Future
+
+    def _submit(self, group: str, mock: bool):
+        with self._lock:
+            fut = self._inflight.get(group)
+            if fut is not None and not fut.done():
+                return fut
+            fut = self._pool.submit(self.read_group, group, mock)
+            self._inflight[group] = fut
+        return fut
+
+    def read(self, mock: bool = False, deadline: float = READ_DEADLINE_SEC) -> dict:
+        # sampler 會 import 這個檔，在這裡才 import（跟 _mock_group 的 simulator 一樣）
+        from sampler import get_snapshot
+
+        t0 = time.perf_counter()
+        futures = {group: self._submit(group, mock) for group in self.groups}
+        wait(futures.values(), timeout=deadline)
+        snap = get_snapshot()
+
+        values, status, sampled_at = {}, {}, {}
+        for group, fut in futures.items():
+            fields = None
+            if fut.done():
+                try:
+                    fields = fut.result()
+                except Exception:
+                    fields = {}
+            for k in self.groups[group]:
+                v = (fields or {}).get(k)
+                if v is not None:
+                    values[k], status[k], sampled_at[k] = v, "ok", time.time()
+                    continue
+                last, ts = snap.values.get(k), snap.sampled_at.get(k)
+                values[k], status[k], sampled_at[k] = last, "stale" if fields is not None else "timeout", ts
         return {
-            "soil_pct": 35 + 15 * random.random(),
-            "lux": 500 + 5000 * random.random(),
-            "temp_c": 24 + 4 * random.random(),
-            "humi_pct": 50 + 10 * random.random(),
-            "touch": random.random() < 0.1,
+            "values": values,
+            "status": status,
+            "sampled_at": sampled_at,
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
         }
 
-    # ⭐ 這裡開始是真實硬體版（目前只有觸控是真的，其它先給固定值）
-    touch = _read_touch()
-    lux = read_bh1750()
-    humi_pct, temp_c = _read_dht22()
-    soil_pct = _read_soil_digital()
-    #soil_pct = _virtual_soil_pct(is_wet)
-
-
-    # TODO：之後你再把下面這幾個改成 BH1750 / BME280 / 土壤感測器的真實讀值
-    return {
-        "soil_pct": soil_pct,
-        "lux": lux,
-        "temp_c": temp_c,
-        "humi_pct": humi_pct,
-        "touch": touch,
-    }
+    def close(self):
+        # 不等還在跑的讀取（DHT22 自己有 timeout，會結束）
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_orchestrator = None
+_orchestrator_lock = threading.Lock()
+
+
+def read_sensors(mock: bool = False, deadline: float = READ_DEADLINE_SEC) -> dict:
+    """同時讀所有感測器（最多等 deadline 秒），回傳 values / status / sampled_at / elapsed_ms。"""
+    global _orchestrator
+    with _orchestrator_lock:
+        if _orchestrator is None:
+            _orchestrator = ReadOrchestrator()
+    return _orchestrator.read(mock=mock, deadline=deadline)
+
+
+def close_reads():
+    global _orchestrator
+    with _orchestrator_lock:
+        if _orchestrator is not None:
+            _orchestrator.close()
+            _orchestrator = None
+
+
+def read_all_sensors(mock: bool = False, deadline: float = READ_DEADLINE_SEC):
+    """
+    讀取所有感測器，回傳 {欄位: 值}（/status 改由 sampler.py 的背景快照提供）。
+
+    以前是依序讀（延遲是全部加起來，DHT22 卡住整個就卡住）；現在各組同時讀，
+    最多等 deadline 秒，沒讀完的欄位給上一筆好值。要看每個欄位的狀態用 read_sensors()。
+
+    mock=True  → 模擬植物的資料（開發 / 沒插硬體用）
+    mock=False → 讀取真實感測器
+    """
+    return read_sensors(mock=mock, deadline=deadline)["values"]
@@ -0,0 +1,645 @@
+#!/usr/bin/env python3
+"""植物物理模擬器 + 假硬體（沒有 Pi 也能跑整個 backend、壓測、跑回歸）。
+
+PlantSim 是一株「會變乾的植物」：
+- 土壤水分隨時間蒸發（白天、氣溫高時比較快），幫浦開多久就加多少
+- 日照、氣溫、濕度跟著一天的時間走（加上以 seed 決定的雲量 / 雜訊）
+- 觸控照腳本（SIM_TOUCH_SCRIPT）加上隨機的 tap / double_tap / long_press
+同一個 seed 的軌跡完全一樣，跟讀取頻率無關（雜訊是「seed + 時間區段」算出來的）。
+
+時間加速：SIM_SPEED=3600 → 真實 1 秒 = 模擬 1 小時（只有環境會加速：蒸發、日夜；
+幫浦出水量和觸控是跟真實時間走的，因為 pump.py 真的會 sleep、觸控是人在按）。
+
+假硬體（install() 放進 sys.modules，要在 import sensors / pump / camera 之前）：
+  RPi.GPIO      土壤 DO 腳、觸控腳讀模擬值；幫浦腳輸出 ON/OFF 就替植物澆水；觸控有邊緣中斷
+  smbus2        BH1750（0x23）回傳模擬的 lux
+  board / adafruit_dht   DHT22，偶爾跟真的一樣丟 RuntimeError
+  picamera2     YUV420 預覽幀（亮度跟著日照、顏色跟著土壤乾濕），拍照寫 JPEG
+
+  SIMULATE=1 python app.py                        # 整個 backend 跑在模擬硬體上
+  SIMULATE=1 SIM_SPEED=3600 python bench_http.py  # 壓測
+  python simulator.py --days 7 --policy normal    # 離線跑 7 天自動澆水（幾秒就跑完）
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import types
+from importlib.machinery import ModuleSpec
+
+SIM_SEED = int(os.getenv("SIM_SEED", "42"))
+SIM_SPEED = float(os.getenv("SIM_SPEED", "1"))
+
+# 土壤：每小時蒸發幾 %（22°C、半日照時），幫浦每秒加幾 %，DO 腳在幾 % 以上算濕
+DRY_PCT_PER_HOUR = float(os.getenv("SIM_DRY_PCT_PER_HOUR", "1.5"))
+PUMP_PCT_PER_SEC = float(os.getenv("SIM_PUMP_PCT_PER_SEC", "5"))
+SOIL_WET_PCT = float(os.getenv("SIM_SOIL_WET_PCT", "40"))
+SOIL_START_PCT = float(os.getenv("SIM_SOIL_START_PCT", "55"))
+# 室內窗邊的日照高峰（lux）、平均氣溫 / 日夜溫差
+LUX_PEAK = float(os.getenv("SIM_LUX_PEAK", "8000"))
+TEMP_MEAN = float(os.getenv("SIM_TEMP_MEAN", "23"))
+TEMP_SWING = float(os.getenv("SIM_TEMP_SWING", "4"))
+# 觸控：腳本（秒數是從啟動起算的真實時間）+ 每分鐘隨機幾次
+TOUCH_SCRIPT = os.getenv("SIM_TOUCH_SCRIPT", "")
+TOUCH_PER_MIN = float(os.getenv("SIM_TOUCH_PER_MIN", "1"))
+DHT_FAIL_RATE = float(os.getenv("SIM_DHT_FAIL_RATE", "0.05"))
+CAMERA_FPS = float(os.getenv("SIM_CAMERA_FPS", "30"))
+
+# 和 sensors.py / app.py 同一組腳位設定
+SOIL_PIN = int(os.getenv("SOIL_PIN", "17"))
+# 乾的時候 DO 腳是幾（sensors.SOIL_DRY_LEVEL）；假腳位照這個方向輸出，兩種接線都模擬得到
+SOIL_DRY_LEVEL = int(os.getenv("SOIL_DRY_LEVEL", "1"))
+TOUCH_PIN = 6
+PUMP_PIN = int(os.getenv("PUMP_PIN", "17"))
+PUMP_ACTIVE_LOW = True
+
+# 按一下 / 連點 / 長按各按多久（秒）
+TOUCH_SHAPES = {
+    "tap": ((0.0, 0.12),),
+    "double_tap": ((0.0, 0.1), (0.22, 0.1)),
+    "long_press": ((0.0, 1.2),),
+}
+
+
+class SimClock:
+    """模擬時間 = 啟動時的真實時間 + 經過的真實時間 × speed。"""
+
+    def __init__(self, speed: float = 1.0, start: float | None = None):
+        self.speed = speed
+        self.start = time.time() if start is None else start
+        self._m0 = time.monotonic()
+
+    def now(self) -> float:
+        return self.start + (time.monotonic() - self._m0) * self.speed
+
+
+class ManualClock:
+    """離線跑用：時間只在 advance() 時前進。"""
+
+    def __init__(self, start: float):
+        self.t = start
+
+    def now(self) -> float:
+        return self.t
+
+    def advance(self, sec: float):
+        self.t += sec
+
+
+class PlantSim:
+    # 土壤狀態最多一次前進幾秒（模擬時間），讓蒸發速度跟著日照 / 氣溫變
+    MAX_STEP = 60.0
+
+    def __init__(self, seed: int = SIM_SEED, clock=None, soil_pct: float = SOIL_START_PCT):
+        self.seed = seed
+        self.clock = clock or SimClock(SIM_SPEED)
+        self.soil_pct = soil_pct
+        self.watered_sec = 0.0
+        self.waterings = 0
+        self._t = self.clock.now()
+        self._lock = threading.Lock()
+        self._noise_cache = {}
+        self._rate_cache = (None, 0.0)
+
+        self._m0 = time.monotonic()
+        self._trng = random.Random(f"{seed}:touch")
+        self._presses = []  # [(開始, 結束)]，真實時間（monotonic）
+        self._touch_until = self._m0
+        for kind, offset in _parse_touch_script(TOUCH_SCRIPT):
+            self._add_press(kind, self._m0 + offset)
+
+    # ========= 環境（只跟時間有關） =========
+    def _noise(self, key: str, t: float, period: float) -> float:
+        """0~1，同一個 seed、同一個時間區段永遠是同一個值。"""
+        k = (key, int(t // period))
+        v = self._noise_cache.get(k)
+        if v is None:
+            if len(self._noise_cache) > 1024:
+                self._noise_cache.clear()
+            v = self._noise_cache[k] = random.Random(f"{self.seed}:{k[0]}:{k[1]}").random()
+        return v
+
+    @staticmethod
+    def _hour(t: float) -> float:
+        lt = time.localtime(t)
+        return lt.tm_hour + lt.tm_min / 60 + lt.tm_sec / 3600
+
+    def lux(self, t: float | None = None) -> float:
+        t = self.clock.now() if t is None else t
+        h = self._hour(t)
+        if not 6.0 <= h <= 18.0:
+            return round(2.0 * self._noise("night", t, 600), 1)
+        sun = math.sin(math.pi * (h - 6.0) / 12.0)
+        clouds = 0.4 + 0.6 * self._noise("clouds", t, 1800)
+        return round(LUX_PEAK * sun * clouds + 20.0, 1)
+
+    def temp_c(self, t: float | None = None) -> float:
+        t = self.clock.now() if t is None else t
+        # 下午 3 點最熱
+        base = TEMP_MEAN + TEMP_SWING * math.sin(2 * math.pi * (self._hour(t) - 9.0) / 24.0)
+        return round(base + (self._noise("temp", t, 600) - 0.5) * 0.6, 1)
+
+    def humi_pct(self, t: float | None = None) -> float:
+        t = self.clock.now() if t is None else t
+        humi = 60.0 - 1.5 * (self.temp_c(t) - TEMP_MEAN) + (self._noise("humi", t, 600) - 0.5) * 4
+        return round(min(100.0, max(0.0, humi)), 1)
+
+    # ========= 土壤 =========
+    def _dry_rate(self, t: float) -> float:
+        """每秒蒸發幾 %（每分鐘算一次就夠準）。"""
+        minute = int(t // 60)
+        if self._rate_cache[0] == minute:
+            return self._rate_cache[1]
+        light = min(1.0, self.lux(t) / LUX_PEAK)
+        heat = max(0.2, 1.0 + 0.04 * (self.temp_c(t) - 22.0))
+        rate = DRY_PCT_PER_HOUR / 3600 * (0.5 + light) * heat
+        self._rate_cache = (minute, rate)
+        return rate
+
+    def _advance(self):
+        # 呼叫端要拿著 self._lock
+        now = self.clock.now()
+        while self._t < now:
+            dt = min(self.MAX_STEP, now - self._t)
+            self.soil_pct = max(0.0, self.soil_pct - self._dry_rate(self._t + dt / 2) * dt)
+            self._t += dt
+
+    def water(self, sec: float):
+        """幫浦開了 sec 秒（真實時間）。"""
+        with self._lock:
+            self._advance()
+            self.soil_pct = min(100.0, self.soil_pct + PUMP_PCT_PER_SEC * sec)
+            self.watered_sec += sec
+            self.waterings += 1
+
+    def soil(self) -> float:
+        with self._lock:
+            self._advance()
+            return round(self.soil_pct, 1)
+
+    def soil_dry(self) -> bool:
+        """土壤 DO 模組的判斷：水分低於 SOIL_WET_PCT 算乾（腳位電位見 _fake_gpio）。"""
+        return self.soil() < SOIL_WET_PCT
+
+    # ========= 觸控 =========
+    def _add_press(self, kind: str, at: float):
+        for start, length in TOUCH_SHAPES[kind]:
+            self._presses.append((at + start, at + start + length))
+        self._presses.sort()
+
+    def touching(self, now: float | None = None) -> bool:
+        """now 是 time.monotonic()。"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            # 隨機觸控排到 now 之後一點（Poisson：間隔是指數分布）
+            while TOUCH_PER_MIN > 0 and self._touch_until < now + 5.0:
+                self._touch_until += self._trng.expovariate(TOUCH_PER_MIN / 60)
+                kind = self._trng.choices(list(TOUCH_SHAPES), weights=(6, 2, 1))[0]
+                self._add_press(kind, self._touch_until)
+            while self._presses and self._presses[0][1] < now:
+                self._presses.pop(0)
+            return any(start <= now < end for start, end in self._presses)
+
+    # ========= 給 sensors 的 mock 模式 =========
+    def group(self, group: str) -> dict:
+        """和 sensors.read_group 一樣的欄位；土壤是真的百分比，乾 / 濕跟 DO 腳同一個門檻。"""
+        if group == "touch":
+            return {"touch": self.touching()}
+        if group == "light":
+            return {"lux": self.lux()}
+        if group == "dht":
+            t = self.clock.now()
+            return {"humi_pct": self.humi_pct(t), "temp_c": self.temp_c(t)}
+        if group == "soil":
+            return {"soil_pct": self.soil(), "soil_dry": self.soil_dry()}
+        raise KeyError(group)
+
+    def stats(self) -> dict:
+        t = self.clock.now()
+        return {
+            "seed": self.seed,
+            "sim_time": t,
+            "speed": getattr(self.clock, "speed", None),
+            "soil_pct": self.soil(),
+            "lux": self.lux(t),
+            "temp_c": self.temp_c(t),
+            "humi_pct": self.humi_pct(t),
+            "waterings": self.waterings,
+            "watered_sec": round(self.watered_sec, 1),
+        }
+
+
+def _parse_touch_script(script: str) -> list:
+    """"tap@5,double_tap@12,long_press@20" → [("tap", 5.0), ...]"""
+    out = []
+    for item in filter(None, (s.strip() for s in script.split(","))):
+        kind, _, at = item.partition("@")
+        if kind not in TOUCH_SHAPES:
+            raise ValueError(f"bad SIM_TOUCH_SCRIPT entry: {item}")
+        out.append((kind, float(at or 0)))
+    return out
+
+
+_plant = None
+_plant_lock = threading.Lock()
+
+
+def get_plant() -> PlantSim:
+    """整個程式共用的那一株（SIM_SEED / SIM_SPEED）。"""
+    global _plant
+    with _plant_lock:
+        if _plant is None:
+            _plant = PlantSim()
+        return _plant
+
+
+def _module(name: str) -> types.ModuleType:
+    # 要有 __spec__，不然 importlib.util.find_spec(name) 會丟 ValueError（/camera/health 會用到）
+    mod = types.ModuleType(name)
+    mod.__spec__ = ModuleSpec(name, None)
+    return mod
+
+
+# ========= 假 RPi.GPIO =========
+def _fake_gpio(plant: PlantSim, soil_dry_level: int | None = None) -> types.ModuleType:
+    gpio = _module("RPi.GPIO")
+    gpio.BCM, gpio.BOARD = 11, 10
+    gpio.IN, gpio.OUT = 1, 0
+    gpio.HIGH, gpio.LOW = 1, 0
+    gpio.PUD_OFF, gpio.PUD_DOWN, gpio.PUD_UP = 20, 21, 22
+    gpio.RISING, gpio.FALLING, gpio.BOTH = 31, 32, 33
+
+    dry_level = SOIL_DRY_LEVEL if soil_dry_level is None else soil_dry_level
+    lock = threading.Lock()
+    modes, levels, callbacks = {}, {}, {}
+    pump = {"since": None}
+
+    def _pump(on: bool):
+        # 幫浦的出水量用真實時間算（pump.py 是真的 sleep sec 秒）
+        if on and pump["since"] is None:
+            pump["since"] = time.monotonic()
+        elif not on and pump["since"] is not None:
+            plant.water(time.monotonic() - pump["since"])
+            pump["since"] = None
+
+    def _pump_level(pin):
+        on_level = gpio.LOW if PUMP_ACTIVE_LOW else gpio.HIGH
+        return pin == PUMP_PIN and modes.get(pin) == gpio.OUT and levels.get(pin) == on_level
+
+    def setwarnings(_flag):
+        pass
+
+    def setmode(_mode):
+        pass
+
+    def setup(pin, mode, pull_up_down=None, initial=None):
+        with lock:
+            modes[pin] = mode
+            if initial is not None:
+                levels[pin] = initial
+            on = _pump_level(pin)
+        if pin == PUMP_PIN:
+            _pump(on)
+
+    def output(pin, value):
+        with lock:
+            levels[pin] = value
+            on = _pump_level(pin)
+        if pin == PUMP_PIN:
+            _pump(on)
+
+    def input(pin):
+        if modes.get(pin) == gpio.IN:
+            if pin == TOUCH_PIN:
+                return int(plant.touching())
+            if pin == SOIL_PIN:
+                return dry_level if plant.soil_dry() else 1 - dry_level
+        return levels.get(pin, gpio.LOW)
+
+    def add_event_detect(pin, edge, callback=None, bouncetime=None):
+        with lock:
+            callbacks[pin] = callback
+        _start_edges()
+
+    def remove_event_detect(pin):
+        with lock:
+            callbacks.pop(pin, None)
+
+    def cleanup(pin=None):
+        with lock:
+            for p in [pin] if pin is not None else list(modes):
+                modes.pop(p, None)
+                levels.pop(p, None)
+
+    edges = {"thread": None}
+
+    def _edge_loop():
+        # 真的 GPIO 是硬體中斷；這裡每 5ms 看一次模擬值，有變化就呼叫 callback
+        last = {}
+        while True:
+            with lock:
+                watched = list(callbacks.items())
+            for pin, cb in watched:
+                level = input(pin)
+                if last.get(pin, level) != level and cb is not None:
+                    try:
+                        cb(pin)
+                    except Exception as e:
+                        print(f"[SIM] edge callback error: {e}", flush=True)
+                last[pin] = level
+            time.sleep(0.005)
+
+    def _start_edges():
+        if edges["thread"] is None:
+            edges["thread"] = threading.Thread(target=_edge_loop, daemon=True, name="sim_gpio_edges")
+            edges["thread"].start()
+
+    for fn in (setwarnings, setmode, setup, output, input, add_event_detect, remove_event_detect, cleanup):
+        setattr(gpio, fn.__name__, fn)
+    return gpio
+
+
+# ========= 假 smbus2（BH1750） =========
+def _fake_smbus2(plant: PlantSim) -> types.ModuleType:
+    mod = _module("smbus2")
+    bh1750_addr = 0x23
+
+    class i2c_msg:
+        def __init__(self, addr, length):
+            self.addr, self.buf = addr, [0] * length
+
+        @classmethod
+        def read(cls, addr, length):
+            return cls(addr, length)
+
+        def __iter__(self):
+            return iter(self.buf)
+
+    class SMBus:
+        def __init__(self, bus=1):
+            self.bus = bus
+            self._divisor = 1.2
+
+        def write_byte(self, addr, value):
+            if addr != bh1750_addr:
+                raise OSError(121, "Remote I/O error")
+            # hres2 模式每 count 是 0.5 lx
+            if value == 0x11:
+                self._divisor = 2.4
+            elif value in (0x10, 0x13):
+                self._divisor = 1.2
+
+        def _raw(self, addr):
+            if addr != bh1750_addr:
+                raise OSError(121, "Remote I/O error")
+            raw = min(0xFFFF, int(plant.lux() * self._divisor))
+            return [raw >> 8, raw & 0xFF]
+
+        def i2c_rdwr(self, *msgs):
+            for m in msgs:
+                m.buf = self._raw(m.addr)
+
+        def read_i2c_block_data(self, addr, _cmd, length):
+            return self._raw(addr)[:length]
+
+        def close(self):
+            pass
+
+    mod.SMBus, mod.i2c_msg = SMBus, i2c_msg
+    return mod
+
+
+# ========= 假 DHT22（board + adafruit_dht） =========
+def _fake_dht(plant: PlantSim):
+    board = _module("board")
+    for n in range(28):
+        setattr(board, f"D{n}", n)
+
+    dht = _module("adafruit_dht")
+    rng = random.Random(f"{plant.seed}:dht")
+
+    class DHT22:
+        def __init__(self, pin, use_pulseio=True):
+            self.pin = pin
+
+        @property
+        def temperature(self):
+            # 真的 DHT22 常常讀失敗，driver 會丟 RuntimeError
+            if rng.random() < DHT_FAIL_RATE:
+                raise RuntimeError("Checksum did not validate. Try again.")
+            return plant.temp_c()
+
+        @property
+        def humidity(self):
+            return plant.humi_pct()
+
+        def exit(self):
+            pass
+
+    dht.DHT22 = DHT22
+    return board, dht
+
+
+# ========= 假 picamera2 =========
+def _fake_picamera2(plant: PlantSim) -> types.ModuleType:
+    mod = _module("picamera2")
+
+    class _Request:
+        def __init__(self, cam):
+            self.cam = cam
+
+        def make_array(self, name):
+            return self.cam.frame(name)
+
+        def save(self, name, path, format=None):
+            from PIL import Image
+
+            w, h = self.cam.config[name]["size"]
+            y = self.cam.frame("lores")[: self.cam.config["lores"]["size"][1]]
+            Image.fromarray(y).convert("RGB").resize((w, h)).save(path, format="JPEG", quality=85)
+
+        def release(self):
+            pass
+
+    class Picamera2:
+        def __init__(self, camera_num=0):
+            self.options = {}
+            self.config = None
+            self._next = time.monotonic()
+            self._texture = None
+
+        def create_video_configuration(self, main=None, lores=None, buffer_count=4, **kw):
+            return {"main": main or {"size": (1920, 1080)}, "lores": lores or {"size": (640, 480)}}
+
+        create_still_configuration = create_video_configuration
+
+        def configure(self, config):
+            self.config = config
+
+        def start(self):
+            self._next = time.monotonic()
+
+        def stop(self):
+            pass
+
+        def close(self):
+            pass
+
+        def frame(self, name):
+            """YUV420（lores）：亮度跟著日照，顏色越乾越偏黃褐。"""
+            import numpy as np
+
+            w, h = self.config["lores"]["size"]
+            if self._texture is None or self._texture.shape != (h, w):
+                rng = np.random.default_rng(plant.seed)
+                self._texture = rng.integers(0, 60, size=(h, w), dtype=np.uint8)
+            brightness = int(min(180, 40 + plant.lux() / LUX_PEAK * 140))
+            dryness = max(0.0, min(1.0, (SOIL_WET_PCT + 20 - plant.soil()) / 40))
+            out = np.empty((h * 3 // 2, w), dtype=np.uint8)
+            np.add(self._texture, brightness, out=out[:h])
+            out[h : h + h // 4] = int(110 - 20 * dryness)  # U
+            out[h + h // 4 :] = int(110 + 40 * dryness)  # V
+            return out
+
+        def capture_request(self):
+            # 跟真的相機一樣照 fps 出幀
+            self._next += 1.0 / CAMERA_FPS
+            delay = self._next - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self._next = time.monotonic()
+            return _Request(self)
+
+    class MappedArray:
+        def __init__(self, request, stream):
+            self.request, self.stream = request, stream
+
+        def __enter__(self):
+            self.array = self.request.make_array(self.stream)
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    mod.Picamera2, mod.MappedArray = Picamera2, MappedArray
+    return mod
+
+
+HARDWARE = ("gpio", "i2c", "dht", "camera")
+
+
+def install(hardware=HARDWARE, plant: PlantSim | None = None):
+    """把假硬體模組放進 sys.modules（要在 import sensors / pump / camera 之前）。"""
+    plant = plant or get_plant()
+    if "gpio" in hardware:
+        gpio = _fake_gpio(plant)
+        rpi = _module("RPi")
+        rpi.GPIO = gpio
+        sys.modules["RPi"], sys.modules["RPi.GPIO"] = rpi, gpio
+    if "i2c" in hardware:
+        sys.modules["smbus2"] = _fake_smbus2(plant)
+    if "dht" in hardware:
+        sys.modules["board"], sys.modules["adafruit_dht"] = _fake_dht(plant)
+    if "camera" in hardware:
+        sys.modules["picamera2"] = _fake_picamera2(plant)
+    print(f"[SIM] fake hardware: {', '.join(hardware)} seed={plant.seed} speed={getattr(plant.clock, 'speed', '-')}", flush=True)
+    return plant
+
+
+# ========= 離線回歸：幾秒跑完好幾天的自動澆水 =========
+def run_days(
+    days: float,
+    seed: int = SIM_SEED,
+    policy: str = "normal",
+    step: float = 1.0,
+    start: float | None = None,
+    soil_dry_level: int = SOIL_DRY_LEVEL,
+) -> dict:
+    """用 ManualClock 跑 days 天：每 step 秒讀一次土壤 DO 餵給 AutoWaterScheduler（mode=on）。
+
+    DO 腳照 soil_dry_level 的方向輸出、再照同一個設定解讀（跟 sensors._read_soil_digital 一樣），
+    兩種接線的結果（digest）應該完全一樣。
+    """
+    install(("gpio", "i2c", "dht"))
+    from auto_water import AutoWaterScheduler
+
+    if start is None:
+        # 固定的起點（當地時間午夜），同一個 seed 的結果才會一樣
+        start = time.mktime((2024, 6, 1, 0, 0, 0, 0, 0, -1))
+    clock = ManualClock(start)
+    plant = PlantSim(seed, clock)
+    gpio = _fake_gpio(plant, soil_dry_level)
+    gpio.setup(SOIL_PIN, gpio.IN)
+
+    def water(sec):
+        plant.water(sec)
+        return True, None, None
+
+    sched = AutoWaterScheduler(water, mode="on", policy=policy)
+    soil, dry_steps, steps = [], 0, int(days * 86400 / step)
+    digest = hashlib.sha1()
+    t0 = time.perf_counter()
+    for i in range(steps):
+        clock.advance(step)
+        dry = gpio.input(SOIL_PIN) == soil_dry_level
+        dry_steps += dry
+        sched.feed(dry, clock.now())
+        if i % int(max(1, 600 / step)) == 0:
+            pct = plant.soil()
+            soil.append(pct)
+            digest.update(f"{pct:.2f}".encode())
+    elapsed = time.perf_counter() - t0
+    return {
+        "days": days,
+        "seed": seed,
+        "policy": policy,
+        "soil_dry_level": soil_dry_level,
+        "step_sec": step,
+        "waterings": plant.waterings,
+        "watered_sec": round(plant.watered_sec, 1),
+        "soil_min": min(soil),
+        "soil_max": max(soil),
+        "soil_mean": round(sum(soil) / len(soil), 1),
+        "dry_hours": round(dry_steps * step / 3600, 2),
+        "wall_sec": round(elapsed, 2),
+        "speedup": round(days * 86400 / elapsed),
+        "digest": digest.hexdigest()[:12],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="offline plant simulation with the auto-water scheduler")
+    parser.add_argument("--days", type=float, default=7.0)
+    parser.add_argument("--seed", type=int, default=SIM_SEED)
+    parser.add_argument("--policy", default="normal", help="gentle / normal / thirsty")
+    parser.add_argument("--step", type=float, default=1.0, help="soil sample interval (simulated seconds)")
+    parser.add_argument(
+        "--soil-dry-level", choices=("0", "1", "both"), default="both",
+        help="DO level when dry; both runs each wiring and checks they agree",
+    )
+    parser.add_argument("--json", help="write the summary to this file")
+    args = parser.parse_args()
+
+    levels = (1, 0) if args.soil_dry_level == "both" else (int(args.soil_dry_level),)
+    results = [run_days(args.days, args.seed, args.policy, args.step, soil_dry_level=level) for level in levels]
+    for result in results:
+        for k, v in result.items():
+            print(f"{k:<16}{v}")
+        print()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results[0] if len(results) == 1 else results, f, indent=2)
+    # 兩種接線只差在腳位電位，植物的軌跡一定要一樣；不一樣就是某處把方向寫死了
+    if len({r["digest"] for r in results}) > 1:
+        print("soil polarity mismatch: digests differ between SOIL_DRY_LEVEL settings", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
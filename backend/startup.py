@@ -0,0 +1,85 @@
+"""啟動計時與就緒狀態（/ready）。
+
+app.py 每個初始化步驟用 startup.step("名稱") 包起來，記錄花了幾毫秒、有沒有出錯；
+慢的事情（相機開機、第一輪感測器讀值、JPEG / PIL 這些大模組）用 startup.background()
+丟到背景做，HTTP port 不用等它們。/ready 會把每個元件的狀態列出來，
+全部好了才回 200（給 systemd / 負載平衡 / 前端判斷「後端暖好了沒」）。
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class Startup:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._steps = OrderedDict()  # 名稱 → {ms, ok, error, background}
+        self._checks = OrderedDict()  # 名稱 → check() -> bool
+        self.imported_ms = None
+
+    def _record(self, name: str, t0: float, error: Exception | None, background: bool):
+        with self._lock:
+            self._steps[name] = {
+                "ms": round((time.perf_counter() - t0) * 1000, 1),
+                "ok": error is None,
+                "error": str(error) if error is not None else None,
+                "background": background,
+            }
+
+    @contextmanager
+    def step(self, name: str):
+        """同步步驟：計時，出錯照樣往外丟（啟動該失敗就失敗）。"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self._record(name, t0, e, False)
+            raise
+        self._record(name, t0, None, False)
+
+    def background(self, name: str, fn):
+        """在背景執行緒跑 fn()；完成（或失敗）後這個元件才算 ready。"""
+        with self._lock:
+            self._steps[name] = {"ms": None, "ok": None, "error": None, "background": True}
+
+        def run():
+            t0 = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                print(f"[STARTUP] {name} failed: {e}", flush=True)
+                self._record(name, t0, e, True)
+                return
+            self._record(name, t0, None, True)
+
+        threading.Thread(target=run, daemon=True, name=f"warm_{name}").start()
+
+    def require(self, name: str, check):
+        """/ready 時呼叫 check() → bool，False 就算還沒好（例如相機還在開）。"""
+        self._checks[name] = check
+
+    def done_importing(self):
+        self.imported_ms = round((time.perf_counter() - self.t0) * 1000, 1)
+        with self._lock:
+            parts = ", ".join(f"{k}={v['ms']}ms" for k, v in self._steps.items() if not v["background"])
+        print(f"[STARTUP] app imported in {self.imported_ms}ms ({parts})", flush=True)
+
+    def report(self) -> dict:
+        with self._lock:
+            steps = {k: dict(v) for k, v in self._steps.items()}
+        pending = [k for k, v in steps.items() if v["ok"] is None]
+        checks = {}
+        for name, check in self._checks.items():
+            try:
+                checks[name] = bool(check())
+            except Exception:
+                checks[name] = False
+        return {
+            "ready": not pending and all(checks.values()),
+            "uptime_ms": round((time.perf_counter() - self.t0) * 1000, 1),
+            "imported_ms": self.imported_ms,
+            "steps": steps,
+            "checks": checks,
+        }
@@ -0,0 +1,121 @@
+"""/status 的版本化快取：內容沒變就不重組、不重新序列化。
+
+- key()：很便宜的「有沒有變」（快照版本、過期欄位、帳本、幫浦、觸控、遊戲版本），每個請求算一次
+- key 變了才 build() 一次、JSON 編一次，版本 +1；MessagePack 第一次有人要才編，之後共用
+- 每次都在變的欄位（now、sampled_at）不進快取：fresh() 每個回應算一次，接在快取的 bytes 後面
+  （觸控每 50ms 取樣一次，放進 key 快取就等於沒用）
+- ETag 是版本號（weak：只代表快取的那部分沒變）；版本從啟動時間（ms）往上數，重開機後不會撞號
+- since(v)：跟最近 HISTORY 個版本裡的 v 比，只回變過的欄位（加上 fresh 欄位）；v 太舊就回整份
+
+MessagePack 是選配（pip install msgpack）；沒裝就一律回 JSON。
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+HISTORY = int(os.getenv("STATUS_HISTORY", "64"))
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+STATUS_MIMETYPES = {"json": "application/json", "msgpack": "application/msgpack"}
+
+
+def negotiate_format(accept: str) -> str:
+    """Accept 裡有 MessagePack（而且有裝 msgpack）就用，不然 JSON。"""
+    if msgpack is not None and any(t in (accept or "") for t in MSGPACK_TYPES):
+        return "msgpack"
+    return "json"
+
+
+def encode_body(data, fmt: str) -> bytes:
+    if fmt == "msgpack":
+        return msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+class StatusEntry:
+    __slots__ = ("version", "body", "_encoded")
+
+    def __init__(self, version: int, body: dict):
+        self.version = version
+        self.body = body
+        self._encoded = {"json": _encode_fields(body, "json")}
+
+    def etag(self, fmt: str) -> str:
+        # 不同編碼是不同的表示法，ETag 要分開；weak 是因為 fresh 欄位每次都不一樣
+        return f'W/"{self.version}"' if fmt == "json" else f'W/"{self.version}-{fmt}"'
+
+    def encoded(self, fmt: str, fresh: dict) -> bytes:
+        """快取的欄位（已經編好）+ 這次的 fresh 欄位，合成一個完整的 object / map。"""
+        data = self._encoded.get(fmt)
+        if data is None:
+            # 重複編也只是多做一次，不用鎖
+            data = self._encoded[fmt] = _encode_fields(self.body, fmt)
+        extra = _encode_fields(fresh, fmt)
+        if fmt == "msgpack":
+            return msgpack.Packer().pack_map_header(len(self.body) + len(fresh)) + data + extra
+        return b"{" + data + b"," + extra + b"}"
+
+
+def _encode_fields(fields: dict, fmt: str) -> bytes:
+    """只編 key / value 本身（JSON 不含外面的 {}，MessagePack 不含 map header），才能接起來。"""
+    if fmt == "msgpack":
+        return b"".join(msgpack.packb(k, use_bin_type=True) + msgpack.packb(v, use_bin_type=True) for k, v in fields.items())
+    return encode_body(fields, "json")[1:-1]
+
+
+class StatusCache:
+    def __init__(self, build, key, fresh, history: int = HISTORY):
+        # build() → status dict；key() → 任何可以用 == 比較的值，變了才重組；
+        # fresh() → 每次回應都重算的欄位（不能跟 build() 的欄位重複）
+        self.build = build
+        self.key = key
+        self.fresh = fresh
+        self._lock = threading.Lock()
+        self._history = OrderedDict()  # version → body（最新的在後面）
+        self._max_history = history
+        self._version = int(time.time() * 1000)
+        self._key = object()
+        self._entry = None
+        self.builds = 0
+        self.hits = 0
+
+    def get(self) -> StatusEntry:
+        """目前的狀態；key 沒變就直接回上一份（含已經編好的 bytes）。"""
+        key = self.key()
+        with self._lock:
+            if self._entry is not None and key == self._key:
+                self.hits += 1
+                return self._entry
+            body = self.build()
+            self._version += 1
+            body["version"] = self._version
+            self._entry = StatusEntry(self._version, body)
+            self._key = key
+            self._history[self._version] = body
+            while len(self._history) > self._max_history:
+                self._history.popitem(last=False)
+            self.builds += 1
+            return self._entry
+
+    def current(self) -> dict:
+        """完整的 status dict（快取的欄位 + fresh 欄位），給 /status/stream。"""
+        return {**self.get().body, **self.fresh()}
+
+    def since(self, version: int) -> dict:
+        """{"version", "full", "state"}：version 之後變過的欄位（巢狀欄位整個給），fresh 欄位一定有。"""
+        entry = self.get()
+        with self._lock:
+            old = self._history.get(version)
+        if old is None:
+            return {"version": entry.version, "full": True, "state": {**entry.body, **self.fresh()}}
+        changed = {k: v for k, v in entry.body.items() if old.get(k) != v}
+        return {"version": entry.version, "full": False, "state": {**changed, **self.fresh()}}
+
+    def stats(self) -> dict:
+        return {"version": self._version, "builds": self.builds, "hits": self.hits, "msgpack": msgpack is not None}
@@ -1,7 +1,10 @@
+import os
 import time
 import RPi.GPIO as GPIO
 
 SOIL_PIN = 14
+# 跟 sensors.py 同一個設定：乾的時候 DO 是幾（用這支量出來再寫進 .env）
+SOIL_DRY_LEVEL = int(os.getenv("SOIL_DRY_LEVEL", "1"))
 
 GPIO.setwarnings(False)
 GPIO.setmode(GPIO.BCM)
@@ -10,7 +13,7 @@ GPIO.setup(SOIL_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
 try:
     while True:
         v = GPIO.input(SOIL_PIN)
-        print("DO =", v, "=>", "濕" if v == 1 else "乾")
+        print("DO =", v, "=>", "乾" if v == SOIL_DRY_LEVEL else "濕")
         time.sleep(0.5)
 except KeyboardInterrupt:
     pass
@@ -0,0 +1,148 @@
+"""觸控（TTP223）中斷偵測與事件佇列。
+
+以前只在 /status 被呼叫時讀一次 GPIO.input，比輪詢間隔短的點擊就漏掉了。
+這裡用 GPIO.add_event_detect 監聽上下緣，放開時分類成 tap / double_tap / long_press，
+放進有上限的佇列（每筆有遞增的 seq），前端用 cursor 取「這之後」的事件。
+"""
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import RPi.GPIO as GPIO
+except Exception:
+    GPIO = None
+
+DEBOUNCE_SEC = float(os.getenv("TOUCH_DEBOUNCE_MS", "30")) / 1000
+LONG_PRESS_SEC = float(os.getenv("TOUCH_LONG_PRESS_SEC", "0.8"))
+DOUBLE_TAP_SEC = float(os.getenv("TOUCH_DOUBLE_TAP_SEC", "0.35"))
+QUEUE_SIZE = int(os.getenv("TOUCH_QUEUE_SIZE", "256"))
+
+
+class TouchDetector:
+    def __init__(self, pin: int, active_high: bool = True):
+        self.pin = int(pin)
+        self.active_high = bool(active_high)
+        self.started = False
+
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=QUEUE_SIZE)
+        self._seq = 0
+        self._pressed = False
+        self._pressed_at = None
+        self._last_edge = float("-inf")
+        self._last_tap_at = None
+        self._listeners = []
+        # GPIO callback 和重讀電位的 timer 都會呼叫 feed()
+        self._edge_lock = threading.Lock()
+        self._recheck = None
+
+    def add_listener(self, fn):
+        """有新事件時呼叫 fn(event)（在 GPIO callback 執行緒上，要很快返回）。"""
+        self._listeners.append(fn)
+
+    def start(self):
+        """註冊 GPIO 中斷（上下緣都要，才能算按多久）。"""
+        if self.started or GPIO is None:
+            return
+        GPIO.add_event_detect(self.pin, GPIO.BOTH, callback=self._on_edge)
+        self.started = True
+        print(f"[TOUCH] edge detect on pin={self.pin}", flush=True)
+
+    def stop(self):
+        with self._edge_lock:
+            if self._recheck is not None:
+                self._recheck.cancel()
+                self._recheck = None
+        if self.started and GPIO is not None:
+            try:
+                GPIO.remove_event_detect(self.pin)
+            except Exception:
+                pass
+        self.started = False
+
+    def _on_edge(self, _channel=None):
+        level = GPIO.input(self.pin) == (1 if self.active_high else 0)
+        self.feed(level)
+
+    def feed(self, pressed: bool, now: float | None = None):
+        """餵一次電位變化（GPIO callback 或模擬器都走這裡），含軟體去彈跳。"""
+        if now is None:
+            now = time.monotonic()
+        with self._edge_lock:
+            if pressed == self._pressed:
+                return
+            if now - self._last_edge < DEBOUNCE_SEC:
+                # 彈跳視窗內的邊緣先不算，但視窗結束後要再讀一次電位：
+                # 放開的那一下如果剛好落在視窗內，不重讀的話 _pressed 會一直卡在 True
+                self._schedule_recheck(self._last_edge + DEBOUNCE_SEC - now)
+                return
+            self._last_edge = now
+            self._pressed = pressed
+
+            if pressed:
+                self._pressed_at = now
+                return
+
+            duration = now - self._pressed_at if self._pressed_at is not None else 0.0
+            if duration >= LONG_PRESS_SEC:
+                kind = "long_press"
+                self._last_tap_at = None
+            elif self._last_tap_at is not None and now - self._last_tap_at <= DOUBLE_TAP_SEC:
+                kind = "double_tap"
+                self._last_tap_at = None
+            else:
+                kind = "tap"
+                self._last_tap_at = now
+        self._push(kind, duration)
+
+    def _schedule_recheck(self, delay: float):
+        # 呼叫端要拿著 self._edge_lock；同時只排一個
+        if self._recheck is not None or GPIO is None or not self.started:
+            return
+        self._recheck = threading.Timer(max(0.0, delay) + 0.001, self._recheck_level)
+        self._recheck.daemon = True
+        self._recheck.start()
+
+    def _recheck_level(self):
+        with self._edge_lock:
+            self._recheck = None
+        if self.started:
+            self._on_edge()
+
+    def _push(self, kind: str, duration: float):
+        with self._cond:
+            self._seq += 1
+            event = {"seq": self._seq, "type": kind, "ts": time.time(), "duration": round(duration, 3)}
+            self._events.append(event)
+            self._cond.notify_all()
+        for fn in self._listeners:
+            try:
+                fn(event)
+            except Exception as e:
+                print(f"[TOUCH] listener error: {e}", flush=True)
+
+    @property
+    def pressed(self) -> bool:
+        return self._pressed
+
+    @property
+    def cursor(self) -> int:
+        return self._seq
+
+    def events_since(self, cursor: int, wait: float = 0.0) -> dict:
+        """回傳 seq > cursor 的事件；wait>0 時沒有新事件會等到有或逾時（long-poll）。
+
+        dropped=True 代表 cursor 太舊，中間有事件已經被佇列擠掉了。
+        """
+        with self._cond:
+            if wait > 0 and self._seq <= cursor:
+                self._cond.wait_for(lambda: self._seq > cursor, timeout=wait)
+            events = [e for e in self._events if e["seq"] > cursor]
+            oldest = self._events[0]["seq"] if self._events else self._seq + 1
+            return {
+                "events": events,
+                "cursor": self._seq,
+                "dropped": cursor < oldest - 1,
+            }
@@ -13,13 +13,34 @@ type PlantType = "rubber" | "cactus" | "monstera" | "ivy"
 type PotType = "classic" | "modern" | "ceramic" | "terracotta"
 
 type StatusPayload = {
-  humidity: boolean // true=乾、false=濕
+  humidity: boolean // 土壤 true=乾、false=濕（後端 soil_dry；DO 腳方向由 SOIL_DRY_LEVEL 設定）
   env_humi: number | null
   temperature: number | null
   light: number
   touch: boolean
   daily_sec?: number
   last_water_at?: string | null
+  sampled_at?: Record<string, number | null>
+  stale?: string[]
+  touch_seq?: number
+  game_version?: number
+}
+
+// 後端 game.py 算好的遊戲狀態（/game 回整份，/game?since=<version> 只回變過的欄位）
+type GameState = {
+  emotion: Emotion
+  hearts: { photo: boolean; water: boolean; touch: boolean }
+  insects_called: boolean
+  can_call_insects: boolean
+  streak: number
+  best_streak: number
+  last_event: { seq: number; type: "touch" | "water" | "photo" | "insects"; ts: number } | null
+}
+
+type GameResponse = {
+  version: number
+  full: boolean
+  state: Partial<GameState>
 }
 
 export default function PlantCareGame() {
@@ -28,16 +49,13 @@ export default function PlantCareGame() {
 
   const [emotion, setEmotion] = useState<Emotion>("content")
 
-  // 後端 humidity(boolean) true=乾 false=濕
-  const [soilHumidity, setSoilHumidity] = useState<boolean>(false)
-
   const [envHumidity, setEnvHumidity] = useState<number>(0)
   const [temperature, setTemperature] = useState<number>(22)
   const [lightLevel, setLightLevel] = useState<number>(0)
 
   const [isWatering, setIsWatering] = useState<boolean>(false)
   
-  // ❤️ 愛心系統：三個每日任務（拍照、澆水、觸摸）
+  // ❤️ 愛心系統：三個每日任務（拍照、澆水、觸摸），由後端判定，這裡只負責畫
   const [hearts, setHearts] = useState<{photo: boolean, water: boolean, touch: boolean}>({
     photo: false,
     water: false,
@@ -56,11 +74,11 @@ export default function PlantCareGame() {
   // ✅ 429 cooldown 倒數（秒）
   const [cooldownLeft, setCooldownLeft] = useState<number>(0)
 
-  // edge detection refs
-  const lastTouchRef = useRef(false)
-  const lastSoilHumidityRef = useRef<boolean | undefined>(undefined)
-  // ref mirror of soilHumidity so callbacks can read latest value without changing identity
-  const soilHumidityRef = useRef<boolean>(soilHumidity)
+  // 遊戲狀態版本 / 最後處理過的事件（音效、動畫只播一次）
+  const gameVersionRef = useRef<number | undefined>(undefined)
+  const lastEventSeqRef = useRef<number | undefined>(undefined)
+  // 後端的情緒；本地暫時的 happy（按澆水）結束後回到這個
+  const serverEmotionRef = useRef<Emotion>("content")
 
   // timer refs
   const waterTimeoutRef = useRef<number | null>(null)
@@ -69,7 +87,11 @@ export default function PlantCareGame() {
   // ✅ 避免閉包問題
   const isWateringRef = useRef(false)
   const isPlayingAnimationRef = useRef(false)
-  const lastEmotionSetTimeRef = useRef(0)
+  // useEffect 裡的遊戲狀態處理，給按鈕用
+  const gameRef = useRef<{
+    applyGame: (res: GameResponse) => void
+    startWateringAnimation: () => void
+  } | null>(null)
 
   // ========== 相機狀態（方案B：預覽串流 + 拍照） ==========
   const [cameraOpen, setCameraOpen] = useState(false)
@@ -78,10 +100,10 @@ export default function PlantCareGame() {
   const [cameraBusy, setCameraBusy] = useState(false)
   const [cameraErr, setCameraErr] = useState<string | null>(null)
 
-  // 串流 URL（後端要有 /camera/stream?api_key=xxx）
+  // 串流 URL（後端 /camera/stream?mode=mjpeg 回傳 MJPEG 即時預覽）
   const cameraStreamUrl =
     API_BASE && WATER_API_KEY
-      ? `${API_BASE}/camera/stream?api_key=${encodeURIComponent(WATER_API_KEY)}`
+      ? `${API_BASE}/camera/stream?mode=mjpeg&api_key=${encodeURIComponent(WATER_API_KEY)}`
       : null
 
   // ========== 小工具 ==========
@@ -95,10 +117,6 @@ export default function PlantCareGame() {
     }
   }
 
-  const deriveEmotionFromSoil = (isDry: boolean): Emotion => {
-    return isDry ? "thirsty" : "content"
-  }
-
   // Map raw lux -> simplified light level (0..3)
   // Increased sensitivity: smaller lux changes move levels.
   const luxToLevel = (lux: number): number => {
@@ -145,12 +163,11 @@ export default function PlantCareGame() {
         return
       }
 
-      // 後端回傳 { ok: true, url: "/photos/xxx.jpg" }
-      const full = `${API_BASE}${data.url}`
-      setPhotoUrl(full)
+      // 後端回傳 { ok: true, url: "/photos/xxx.jpg", medium_url, thumb_url }；平板顯示用 medium 就夠了
+      const shown = `${API_BASE}${data.medium_url ?? data.url}`
+      setPhotoUrl(shown)
       setCameraMode("photo")
-      // ❤️ 拍照獲得愛心
-      setHearts(prev => ({ ...prev, photo: true }))
+      // ❤️ 拍照的愛心由後端記（/status 的 game_version 會變）
     } catch (e: any) {
       setCameraErr(e?.message || "capture error")
     } finally {
@@ -158,7 +175,7 @@ export default function PlantCareGame() {
     }
   }
 
-  // ========== 後端狀態輪詢 ==========
+  // ========== 後端狀態（SSE 推播，失敗時輪詢） ==========
   useEffect(() => {
     if (!API_BASE) {
       console.warn("⚠️ NEXT_PUBLIC_API_BASE is not set. Please set it in frontend .env.local")
@@ -167,80 +184,148 @@ export default function PlantCareGame() {
 
     let cancelled = false
 
-    const fetchStatus = async () => {
+    const startWateringAnimation = () => {
+      if (!isWateringRef.current) playWaterSound()
+      setIsWatering(true)
+      isWateringRef.current = true
+      setEmotion("happy")
+
+      if (waterTimeoutRef.current !== null) window.clearTimeout(waterTimeoutRef.current)
+      waterTimeoutRef.current = window.setTimeout(() => {
+        setIsWatering(false)
+        isWateringRef.current = false
+        setEmotion(serverEmotionRef.current)
+        waterTimeoutRef.current = null
+      }, 5000)
+    }
+
+    const applyGame = (res: GameResponse) => {
+      const state = res.state
+      gameVersionRef.current = res.version
+
+      if (state.emotion) {
+        serverEmotionRef.current = state.emotion
+        if (!isWateringRef.current && !isPlayingAnimationRef.current) setEmotion(state.emotion)
+      }
+      if (state.hearts) setHearts(state.hearts)
+      if (typeof state.insects_called === "boolean") setHasCalledInsectsToday(state.insects_called)
+
+      // 新事件才播音效 / 動畫；第一次載入只記下 seq（重新整理不會重播）
+      const ev = state.last_event
+      if (ev) {
+        const lastSeq = lastEventSeqRef.current
+        lastEventSeqRef.current = ev.seq
+        if (lastSeq !== undefined && ev.seq > lastSeq) {
+          if (ev.type === "water") startWateringAnimation()
+          if (ev.type === "insects" && !isPlayingAnimationRef.current) {
+            // 🦋 每一台裝置都一起播
+            setShowInsects(true)
+            setIsPlayingAnimation(true)
+            isPlayingAnimationRef.current = true
+            setEmotion("excited")
+          }
+        }
+      } else if (res.full && lastEventSeqRef.current === undefined) {
+        lastEventSeqRef.current = 0
+      }
+    }
+
+    const fetchGame = async () => {
       try {
-        const res = await fetch(`${API_BASE}/status`, { cache: "no-store" })
+        const since = gameVersionRef.current
+        const url = since === undefined ? `${API_BASE}/game` : `${API_BASE}/game?since=${since}`
+        const res = await fetch(url, { cache: "no-store" })
         if (!res.ok) return
-
-        const data: StatusPayload = await res.json()
+        const data: GameResponse = await res.json()
         if (cancelled) return
+        applyGame(data)
+      } catch {
+        // ignore
+      }
+    }
+    gameRef.current = { applyGame, startWateringAnimation }
 
+    const applyStatus = (data: StatusPayload) => {
+      try {
         // 數值更新
-        if (typeof data.humidity === "boolean") setSoilHumidity(data.humidity)
         if (typeof data.env_humi === "number") setEnvHumidity(data.env_humi)
         if (typeof data.temperature === "number") setTemperature(data.temperature)
 
         const lux = Number(data.light ?? 0)
         setLightLevel(luxToLevel(lux))
 
-        // touch edge trigger：false -> true
-        const touched = !!data.touch
-        const lastTouch = lastTouchRef.current
-
-        if (touched && !lastTouch) {
-          setEmotion("happy")
-          // ❤️ 觸摸獲得愛心
-          setHearts(prev => ({ ...prev, touch: true }))
-          window.setTimeout(() => {
-            setEmotion(prev => (prev === "happy" ? deriveEmotionFromSoil(data.humidity) : prev))
-          }, 1200)
-        }
-        lastTouchRef.current = touched
-
-        // 土壤乾->濕 edge：顯示澆水動畫提示
-        const prevSoil = lastSoilHumidityRef.current
-        const nowSoil = data.humidity
-        // ✅ 只有在 prevSoil 不是 undefined 時才檢查邊緣觸發
-        // ✅ humidity: true=乾、false=濕，所以乾→濕是 prevSoil(true) && !nowSoil(false)
-        if (prevSoil !== undefined && prevSoil && !nowSoil) {
-          playWaterSound()
-          setIsWatering(true)
-          isWateringRef.current = true
-          setEmotion("happy")
-          // ❤️ 澆水獲得愛心
-          setHearts(prev => ({ ...prev, water: true }))
-
-          if (waterTimeoutRef.current !== null) window.clearTimeout(waterTimeoutRef.current)
-          waterTimeoutRef.current = window.setTimeout(() => {
-            setIsWatering(false)
-            isWateringRef.current = false
-
-            setEmotion(deriveEmotionFromSoil(nowSoil))
-            lastEmotionSetTimeRef.current = Date.now()
-            waterTimeoutRef.current = null
-          }, 5000)
-        }
-        lastSoilHumidityRef.current = nowSoil
-
-        // 平常情緒跟著土壤（避免覆蓋剛剛 happy 或動畫中的 excited）
-        const timeSinceLastSet = Date.now() - lastEmotionSetTimeRef.current
-        if (!isWateringRef.current && !touched && !isPlayingAnimationRef.current && timeSinceLastSet > 3500) {
-          setEmotion(prev => {
-            if (prev === "happy" || prev === "excited") return prev
-            return deriveEmotionFromSoil(data.humidity)
-          })
+        // 觸控 / 乾→濕 / 情緒 / 愛心都由後端算；版本變了才去拿差異
+        if (typeof data.game_version === "number" && data.game_version !== gameVersionRef.current) {
+          fetchGame()
         }
       } catch {
         // ignore
       }
     }
 
-    fetchStatus()
-    const id = window.setInterval(fetchStatus, 800)
+    const fetchStatus = async () => {
+      try {
+        // no-cache：瀏覽器帶 If-None-Match 去驗證，沒變時後端回 304（不用重傳、也不用重新序列化）
+        const res = await fetch(`${API_BASE}/status`, { cache: "no-cache" })
+        if (!res.ok) return
+
+        const data: StatusPayload = await res.json()
+        if (cancelled) return
+        applyStatus(data)
+      } catch {
+        // ignore
+      }
+    }
+
+    // ✅ 優先用 /status/stream（SSE，有變化才推）；連不上就退回 800ms 輪詢，並定期再試 SSE
+    let pollId: number | null = null
+    let retryId: number | null = null
+    let es: EventSource | null = null
+
+    const startPolling = () => {
+      if (pollId !== null) return
+      fetchStatus()
+      pollId = window.setInterval(fetchStatus, 800)
+    }
+
+    const stopPolling = () => {
+      if (pollId !== null) window.clearInterval(pollId)
+      pollId = null
+    }
+
+    const connectStream = () => {
+      retryId = null
+      if (cancelled) return
+      if (typeof window.EventSource === "undefined") {
+        startPolling()
+        return
+      }
+
+      es = new EventSource(`${API_BASE}/status/stream`)
+      es.onopen = () => stopPolling()
+      es.addEventListener("status", ev => {
+        if (cancelled) return
+        try {
+          applyStatus(JSON.parse((ev as MessageEvent).data))
+        } catch {
+          // ignore
+        }
+      })
+      es.onerror = () => {
+        es?.close()
+        es = null
+        startPolling()
+        if (!cancelled && retryId === null) retryId = window.setTimeout(connectStream, 10000)
+      }
+    }
+
+    connectStream()
 
     return () => {
       cancelled = true
-      window.clearInterval(id)
+      es?.close()
+      stopPolling()
+      if (retryId !== null) window.clearTimeout(retryId)
     }
   }, [API_BASE])
 
@@ -249,10 +334,7 @@ export default function PlantCareGame() {
     if (!API_BASE) return
     if (cooldownLeft > 0) return
 
-    playWaterSound()
-    setIsWatering(true)
-    isWateringRef.current = true
-    setEmotion("happy")
+    gameRef.current?.startWateringAnimation()
 
     try {
       const res = await fetch(`${API_BASE}/water`, {
@@ -276,56 +358,43 @@ export default function PlantCareGame() {
         return
       }
 
-      // ❤️ 澆水獲得愛心
-      setHearts(prev => ({ ...prev, water: true }))
+      // ❤️ 澆水的愛心在幫浦真的跑完後由後端記
       startCooldown(60)
     } catch (err) {
       console.error("water error", err)
-    } finally {
-      if (waterTimeoutRef.current !== null) window.clearTimeout(waterTimeoutRef.current)
-
-      waterTimeoutRef.current = window.setTimeout(() => {
-        setIsWatering(false)
-        isWateringRef.current = false
-        setEmotion(deriveEmotionFromSoil(soilHumidity))
-        lastEmotionSetTimeRef.current = Date.now()
-        waterTimeoutRef.current = null
-      }, 5000)
     }
   }
 
   const handleTouch = () => {
+    // 只是畫面上的反應；❤️ 觸摸愛心要真的摸到植物（後端的觸控感測器）
     setEmotion("happy")
-    // ❤️ 觸摸獲得愛心（重複邏輯，此處保留以防手動觸摸按鈕）
-    setHearts(prev => ({ ...prev, touch: true }))
-    window.setTimeout(() => setEmotion(deriveEmotionFromSoil(soilHumidity)), 1200)
+    window.setTimeout(() => setEmotion(serverEmotionRef.current), 1200)
   }
 
-  const handleCallInsects = () => {
+  const handleCallInsects = async () => {
     // 防止在動畫進行中重複觸發
-    if (isPlayingAnimationRef.current) return
-    setShowInsects(true)
-    setIsPlayingAnimation(true)
-    isPlayingAnimationRef.current = true
-    setEmotion("excited")
-    lastEmotionSetTimeRef.current = Date.now()
-    // 🦋 標記今天已經招過蜂引過蝶
-    setHasCalledInsectsToday(true)
+    if (!API_BASE || isPlayingAnimationRef.current) return
+    try {
+      // 後端確認三顆愛心都有、今天還沒叫過；動畫由回傳的 last_event 觸發（其他裝置也會播）
+      const res = await fetch(`${API_BASE}/game/insects`, { method: "POST" })
+      const data: any = await res.json().catch(() => ({}))
+      if (!res.ok || data?.ok === false) {
+        console.error("insects failed:", res.status, data)
+        return
+      }
+      gameRef.current?.applyGame(data)
+    } catch (err) {
+      console.error("insects error", err)
+    }
   }
 
   // keep a stable callback identity so child animation effect doesn't restart
-  useEffect(() => {
-    soilHumidityRef.current = soilHumidity
-  }, [soilHumidity])
-
   const handleAnimationComplete = useCallback(() => {
     setShowInsects(false)
     setIsPlayingAnimation(false)
     isPlayingAnimationRef.current = false
-    // ❤️ 愛心保持滿的，不清空（一天只能解一次任務）
-    // ⏸️ 等待每日重置時再清空
-    setEmotion(deriveEmotionFromSoil(soilHumidityRef.current))
-    lastEmotionSetTimeRef.current = Date.now()
+    // ❤️ 愛心保持滿的，不清空（一天只能解一次任務），每日重置由後端做
+    setEmotion(serverEmotionRef.current)
   }, [])
 
   return (